@@ -34,9 +34,6 @@ def ctrl_c(sig, frame):
 	signal.signal(signal.SIGINT, original_SIGINT_handler)
 
 
-signal.signal(signal.SIGINT, ctrl_c)
-
-
 # Run commands from user console
 async def run_console():
 	try:
@@ -60,7 +57,7 @@ async def think():
 	for task in dc.events['on_init']:
 		await task()
 
-	# Loop runs roughly every 1 second
+	# Polls the user console, timed jobs are run by bot.scheduler
 	while console.alive:
 		frame_time = time.time()
 		await run_console()
@@ -92,10 +89,13 @@ async def think():
 	print("Exit now.")
 	loop.stop()
 
-# Login to discord
-loop = asyncio.get_event_loop()
-loop.create_task(think())
-loop.create_task(dc.start(config.cfg.DC_BOT_TOKEN))
+# Login to discord, the spawned worker processes import this module as __mp_main__ and must not
+if __name__ == "__main__":
+	signal.signal(signal.SIGINT, ctrl_c)
+
+	loop = asyncio.get_event_loop()
+	loop.create_task(think())
+	loop.create_task(dc.start(config.cfg.DC_BOT_TOKEN))
 
-log.info("Connecting to discord...")
-loop.run_forever()
+	log.info("Connecting to discord...")
+	loop.run_forever()
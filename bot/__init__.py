@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
-from .main import update_qc_lang, update_rating_system, save_state
+from .scheduler import scheduler
+from .main import update_qc_lang, update_rating_system, update_ranks, save_state
 from .main import load_state, enable_channel, disable_channel
 from .main import remove_players, expire_auto_ready
 
@@ -8,7 +9,11 @@ from .queue_channel import QueueChannel
 from .queues.pickup_queue import PickupQueue
 from .queues.common import QueueResponses as Qr
 from .match.match import Match
+from .match.registry import MatchRegistry
 from .expire import expire
+from .sticky import sticky
+from .message_editor import editor
+from .role_sync import role_sync
 from .stats import stats
 from .stats.noadds import noadds
 from .exceptions import Exceptions as Exc
@@ -22,11 +27,11 @@ bot_was_ready = False
 bot_ready = False
 queue_channels = dict()  # {channel.id: QueueChannel()}
 active_queues = []
-active_matches = []
+member_queues = dict()  # {user_id: set(PickupQueue())}
+active_matches = MatchRegistry()
 waiting_reactions = dict()  # {message.id: function}
 allow_offline = []  # [user_id]
 auto_ready = dict()  # {user.id: timestamp}
-queue_tasks = dict()  # {channel_id_queue_name: task}
 
 
 def background_context(coro):
@@ -1,16 +1,38 @@
 __all__ = [
 	'noadds', 'noadd', 'forgive', 'rating_seed', 'rating_penality', 'rating_hide',
-	'rating_reset', 'rating_snap', 'stats_reset', 'stats_reset_player', 'stats_replace_player',
-	'phrases_add', 'phrases_clear', 'undo_match'
+	'rating_reset', 'rating_snap', 'rating_replay', 'rating_simulate', 'stats_reset', 'stats_reset_player', 'stats_replace_player',
+	'stats_rebuild', 'stats_export', 'stats_import', 'season_close', 'phrases_add', 'phrases_clear', 'undo_match'
 ]
 
+import os
+import asyncio
 from time import time
 from datetime import timedelta
-from nextcord import Member
+from nextcord import Member, File, Attachment
 
-from core.utils import seconds_to_str, get_nick
+from core.utils import seconds_to_str, get_nick, discord_table
 
 import bot
+from bot.stats.replay import replay
+from bot.stats import simulate
+from bot.stats import rollups
+from bot.stats import export
+from bot.stats import importer
+from bot.stats import seasons
+
+IMPORT_MAX_SIZE = 25 * 1024 * 1024
+IMPORT_NOTICE_INTERVAL = 10  # seconds between the import progress notices
+
+
+def _rating_channel_ids(qc):
+	""" Ids of the queue channels which matches are rated in the rating channel of qc """
+	return [i.id for i in bot.queue_channels.values() if i.rating.channel_id == qc.rating.channel_id]
+
+
+def _check_no_active_matches(ctx, *channel_ids, message=None):
+	""" Stats rebuilds read the history and write the result later, a match registered meanwhile would be lost """
+	if any((len(bot.active_matches.by_channel(channel_id)) for channel_id in channel_ids)):
+		raise bot.Exc.ValueError(message or ctx.qc.gt("Can not do this while there are active matches."))
 
 
 async def noadds(ctx):
@@ -97,6 +119,45 @@ async def rating_snap(ctx):
 	await ctx.success(ctx.qc.gt("Done."))
 
 
+async def rating_replay(ctx):
+	ctx.check_perms(ctx.Perms.ADMIN)
+	channel_ids = _rating_channel_ids(ctx.qc)
+	_check_no_active_matches(
+		ctx, *channel_ids, message=ctx.qc.gt("Can not replay the ratings while there are active matches.")
+	)
+	result = await replay(ctx.qc.rating, channel_ids)
+	await ctx.success(ctx.qc.gt("Replayed {matches} matches of {players} players, {changed} ratings changed.").format(
+		**result
+	))
+
+
+async def rating_simulate(ctx, grid: str):
+	ctx.check_perms(ctx.Perms.ADMIN)
+	try:
+		sets = simulate.parse_grid(grid)
+	except ValueError as e:
+		raise bot.Exc.SyntaxError(str(e))
+	if not len(sets):
+		raise bot.Exc.SyntaxError(ctx.qc.gt("Specify at least one parameter, for example: rating_scale=80,100,120"))
+
+	channel_ids = _rating_channel_ids(ctx.qc)
+	_check_no_active_matches(ctx, *channel_ids)
+	results, matches = await simulate.simulate(ctx.qc, channel_ids, sets)
+	if not matches:
+		raise bot.Exc.NotFoundError(ctx.qc.gt("No ranked matches found."))
+
+	await ctx.reply(discord_table(
+		["Parameters", "Log-loss", "Spread", "P10/50/90", "Ranks"],
+		[[
+			" ".join((f"{k[7:]}={v}" for k, v in params.items())),
+			"{:.4f}".format(r['log_loss']) if r['log_loss'] is not None else "-",
+			int(r['spread']),
+			"/".join((str(i) for i in r['percentiles'])),
+			" ".join((f"{name}{count}" for name, count in r['ranks'].items()))
+		] for params, r in results]
+	))
+
+
 async def stats_reset(ctx):
 	ctx.check_perms(ctx.Perms.ADMIN)
 	await bot.stats.reset_channel(ctx.qc.id)
@@ -118,11 +179,85 @@ async def stats_replace_player(ctx, player1: str, player2: str):
 		raise bot.Exc.SyntaxError(f"Specified member not found on the server.")
 	if (player2 := await ctx.get_member(player2)) is None:
 		raise bot.Exc.SyntaxError(f"Specified member not found on the server.")
+	_check_no_active_matches(ctx, ctx.qc.id)
 
 	await bot.stats.replace_player(ctx.qc.id, player1.id, player2.id, get_nick(player2))
 	await ctx.success(ctx.qc.gt("Done."))
 
 
+async def stats_rebuild(ctx):
+	ctx.check_perms(ctx.Perms.ADMIN)
+	_check_no_active_matches(ctx, ctx.qc.id)
+	count = await rollups.rebuild(ctx.qc.id)
+	await ctx.success(ctx.qc.gt("Recounted stats of {count} matches.").format(count=count))
+
+
+async def stats_export(ctx, table: str, fmt: str = 'csv'):
+	ctx.check_perms(ctx.Perms.ADMIN)
+	if table not in export.TABLES.keys():
+		raise bot.Exc.SyntaxError(ctx.qc.gt("Table must be one of: {tables}.").format(tables=", ".join(export.TABLES.keys())))
+	if fmt not in export.FORMATS:
+		raise bot.Exc.SyntaxError(ctx.qc.gt("Format must be one of: {formats}.").format(formats=", ".join(export.FORMATS)))
+
+	channel_id = ctx.qc.rating.channel_id if table == 'rating_history' else ctx.qc.id
+	path, rows = await export.export(table, channel_id, fmt)
+	try:
+		if os.path.getsize(path) > ctx.channel.guild.filesize_limit:
+			raise bot.Exc.ValueError(ctx.qc.gt("The export file is too big to be uploaded."))
+		await ctx.reply(
+			content=ctx.qc.gt("Exported {rows} rows.").format(rows=rows),
+			file=File(path, filename=f"{table}-{channel_id}.{fmt}.gz")
+		)
+	finally:
+		os.remove(path)
+
+
+async def stats_import(ctx, attachment: Attachment):
+	ctx.check_perms(ctx.Perms.ADMIN)
+	if attachment.size > IMPORT_MAX_SIZE:
+		raise bot.Exc.ValueError(ctx.qc.gt("The import file is too big."))
+	_check_no_active_matches(
+		ctx, *_rating_channel_ids(ctx.qc), message=ctx.qc.gt("Can not import matches while there are active matches.")
+	)
+
+	data = await attachment.read()
+	queues = {q.name.lower(): q for q in ctx.qc.queues}
+	try:
+		matches = await asyncio.get_running_loop().run_in_executor(
+			None, importer.parse, data, attachment.filename, queues
+		)
+	except ValueError as e:
+		raise bot.Exc.SyntaxError(str(e))
+
+	user_ids = {user_id for m in matches for user_id in (*m['alpha'], *m['beta'])}
+	members = (ctx.channel.guild.get_member(user_id) for user_id in user_ids)
+	nicks = {m.id: get_nick(m) for m in members if m is not None}
+
+	last_notice = time()
+
+	async def progress(done, total):
+		nonlocal last_notice
+		if done < total and time() - last_notice >= IMPORT_NOTICE_INTERVAL:
+			last_notice = time()
+			await ctx.notice(ctx.qc.gt("Imported {done}/{total} matches...").format(done=done, total=total))
+
+	count, players = await importer.Import(ctx.qc, matches, nicks).run(progress=progress)
+	await ctx.success(ctx.qc.gt("Imported {count} matches of {players} players.").format(count=count, players=players))
+
+
+async def season_close(ctx, name: str = None):
+	ctx.check_perms(ctx.Perms.ADMIN)
+	channel_ids = _rating_channel_ids(ctx.qc)
+	_check_no_active_matches(
+		ctx, *channel_ids, message=ctx.qc.gt("Can not close the season while there are active matches.")
+	)
+
+	season = await seasons.close(ctx.qc, channel_ids, name=name)
+	await ctx.success(ctx.qc.gt("Closed season {number} ({name}): {matches} matches, {players} players archived.").format(
+		**season
+	))
+
+
 async def phrases_add(ctx, player: Member, phrase: str):
 	ctx.check_perms(ctx.Perms.MODERATOR)
 	await bot.noadds.phrases_add(ctx, player, phrase)
@@ -26,6 +26,7 @@ async def delete_queue(ctx, queue: str):
 	if (q := get(ctx.qc.queues, name=queue)) is None:
 		raise bot.Exc.NotFoundError(f"Queue '{queue}' not found on the channel..")
 	await q.cfg.delete()
+	await q.reset()
 	ctx.qc.queues.remove(q)
 	await show_queues(ctx)
 
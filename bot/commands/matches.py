@@ -15,14 +15,14 @@ import bot
 def author_match(coro):
 	@wraps(coro)
 	async def wrapper(ctx, *args, **kwargs):
-		if (match := find(lambda m: m.qc == ctx.qc and ctx.author in m.players, bot.active_matches)) is None:
+		if (match := bot.active_matches.by_player(ctx.author.id)) is None or match.qc != ctx.qc:
 			raise bot.Exc.NotFoundError(ctx.qc.gt("You are not in an active match."))
 		return await coro(ctx, match, *args, **kwargs)
 	return wrapper
 
 
 async def show_matches(ctx):
-	matches = [m for m in bot.active_matches if m.qc.id == ctx.qc.id]
+	matches = bot.active_matches.by_channel(ctx.qc.id)
 	if len(matches):
 		await ctx.reply("\n".join((m.print() for m in matches)))
 	else:
@@ -47,7 +47,7 @@ async def sub_me(ctx, match: bot.Match):
 
 
 async def sub_for(ctx, player: Member):
-	if (match := find(lambda m: m.qc == ctx.qc and player in m.players, bot.active_matches)) is None:
+	if (match := bot.active_matches.by_player(player.id)) is None or match.qc != ctx.qc:
 		raise bot.Exc.NotInMatchError(ctx.qc.gt("Specified user is not in a match."))
 	await ctx.qc.check_allowed_to_add(ctx, ctx.author, queue=match.queue)
 	await match.draft.sub_for(ctx, player, ctx.author)
@@ -55,9 +55,9 @@ async def sub_for(ctx, player: Member):
 
 async def sub_force(ctx, player1: Member, player2: Member):
 	ctx.check_perms(ctx.Perms.MODERATOR)
-	if (match := find(lambda m: m.qc == ctx.qc and player1 in m.players, bot.active_matches)) is None:
+	if (match := bot.active_matches.by_player(player1.id)) is None or match.qc != ctx.qc:
 		raise bot.Exc.NotFoundError(ctx.qc.gt("Specified user is not in a match."))
-	if any((player2 in m.players for m in bot.active_matches)):
+	if bot.active_matches.by_player(player2.id) is not None:
 		raise bot.Exc.InMatchError(ctx.qc.gt("Specified user is in an active match."))
 
 	await match.draft.sub_for(ctx, player1, player2, force=True)
@@ -80,14 +80,14 @@ async def pick(ctx, match: bot.Match, players: List[Member]):
 
 async def put(ctx, match_id: int, player: Member, team_name: str):
 	ctx.check_perms(ctx.Perms.MODERATOR)
-	if (match := find(lambda m: m.qc == ctx.qc and m.id == match_id, bot.active_matches)) is None:
+	if (match := bot.active_matches.get(match_id)) is None or match.qc != ctx.qc:
 		raise bot.Exc.NotFoundError(ctx.qc.gt("Could not find match with specified id. Check `/matches`."))
 	await match.draft.put(ctx, player, team_name)
 
 
 async def report_admin(ctx, match_id: int, winner_team=None, draw=False, abort=False):
 	ctx.check_perms(ctx.Perms.MODERATOR)
-	if (match := find(lambda m: m.qc == ctx.qc and m.id == match_id, bot.active_matches)) is None:
+	if (match := bot.active_matches.get(match_id)) is None or match.qc != ctx.qc:
 		raise bot.Exc.NotFoundError(ctx.qc.gt("Could not find match with specified id. Check `/matches`."))
 	if winner_team is None and not draw and not abort:
 		raise bot.Exc.SyntaxError(ctx.qc.gt("Please specify a team name or draw."))
@@ -3,6 +3,7 @@ __all__ = ['auto_ready', 'expire', 'default_expire', 'allow_offline', 'switch_dm
 from time import time
 from datetime import timedelta
 from random import randint
+from functools import partial
 
 from core.utils import seconds_to_str, find
 from core.database import db
@@ -24,10 +25,14 @@ async def auto_ready(ctx, duration: timedelta = None):
 
 	if ctx.author.id in bot.auto_ready.keys():
 		bot.auto_ready.pop(ctx.author.id)
+		bot.scheduler.cancel(('auto_ready', ctx.author.id))
 		await ctx.success(ctx.qc.gt("Your automatic ready confirmation is now turned off."))
 		return
 
 	bot.auto_ready[ctx.author.id] = int(time()) + duration.total_seconds()
+	bot.scheduler.set(
+		('auto_ready', ctx.author.id), bot.auto_ready[ctx.author.id], partial(bot.expire_auto_ready, ctx.author.id)
+	)
 	await ctx.success(
 		ctx.qc.gt("During next {duration} your match participation will be confirmed automatically.").format(
 			duration=duration.__str__()
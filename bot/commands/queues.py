@@ -5,6 +5,7 @@ __all__ = [
 ]
 
 import time
+import traceback
 from random import choice
 from nextcord import Member, Embed, Button, ButtonStyle, ActionRow, TextChannel, NotFound, Forbidden
 from nextcord.ui import View, Button
@@ -23,31 +24,65 @@ queue_channels = {}  # Store queue channels
 queue_views = {}  # Store queue views
 queue_embeds = {}  # Store queue embeds
 global_queue_embeds = {}  # Store global queue embeds
-last_global_updates = {}  # Store timestamps of last updates for rate limiting
 
-# Rate limiting constants
-MIN_UPDATE_INTERVAL = 5  # Minimum seconds between updates for the same embed
+
+def render_queue_embed(q, queue_name, queue_channel_id=None):
+	"""Build the queue embed and its join/leave buttons view, the buttons of a global embed carry the queue channel id"""
+	embed = Embed(
+		title=f"{q.name} Queue",
+		description="Current queued players:",
+		color=0x7289DA
+	)
+	embed.add_field(
+		name="Players",
+		value="\n".join([f"• {player.display_name}" for player in q.queue]) if len(q.queue) else "No players in queue",
+		inline=False
+	)
+	embed.add_field(
+		name="Status",
+		value=f"{len(q.queue)}/{q.cfg.size} players",
+		inline=True
+	)
+	embed.set_footer(text=f"Last updated: {time.strftime('%H:%M:%S')}")
+
+	if queue_channel_id is None:
+		prefix, suffix, callbacks = "", "", (join_callback, leave_callback)
+	else:
+		prefix, suffix, callbacks = "global_", f"_{queue_channel_id}", (global_join_callback, global_leave_callback)
+
+	view = View(timeout=None)
+	join_button = Button(
+		style=ButtonStyle.green.value,
+		label="Join Queue",
+		custom_id=f"{prefix}join_{queue_name}{suffix}"
+	)
+	join_button.callback = callbacks[0]
+	view.add_item(join_button)
+	leave_button = Button(
+		style=ButtonStyle.red.value,
+		label="Leave Queue",
+		custom_id=f"{prefix}leave_{queue_name}{suffix}"
+	)
+	leave_button.callback = callbacks[1]
+	view.add_item(leave_button)
+	return embed, view
+
 
 async def update_queue_embed(ctx, queue_name: str, create_if_missing=False):
 	"""Update an existing queue embed (only creates new one if create_if_missing=True, unless the embed is critical and missing)"""
-	print("\n==================================================")
-	print("🔄 UPDATE QUEUE EMBED")
-	print("==================================================")
-	print(f"🎯 Queue: {queue_name}")
-	print(f"👤 Context type: {type(ctx)}")
-	print(f"🆕 Create if missing: {create_if_missing}")
-	
+	log.debug(f"Updating queue embed {queue_name} in #{ctx.channel.id}, create if missing: {create_if_missing}.")
+
 	try:
 		# Get the current channel's queue channel
 		current_qc = bot.queue_channels.get(ctx.channel.id)
 		if not current_qc:
-			print("❌ Current channel is not a queue channel")
+			log.debug("Current channel is not a queue channel.")
 			return
 			
 		# Find the queue in the current channel
 		q = find(lambda i: i.name.lower() == queue_name.lower(), current_qc.queues)
 		if not q:
-			print("❌ Queue not found in this channel")
+			log.debug(f"Queue {queue_name} not found in #{ctx.channel.id}.")
 			return
 		
 		# Create channel-specific key for tracking
@@ -55,265 +90,37 @@ async def update_queue_embed(ctx, queue_name: str, create_if_missing=False):
 		
 		# Check if we already have a message for this queue in this channel
 		if channel_key in current_qc.queue_embeds:
-			print(f"📝 Updating existing embed for queue: {queue_name}")
+			message = ctx.channel.get_partial_message(current_qc.queue_embeds[channel_key])
+
+			async def on_error(e):
+				# a coalesced edit failed after this call returned, post the embed again if it is still the tracked one
+				if not isinstance(e, NotFound):
+					log.error(f"Could not update queue embed {message.id}: {str(e)}")
+				elif current_qc.queue_embeds.get(channel_key) == message.id:
+					await bot.sticky.repost(current_qc, ctx.channel, queue_name)
+					save_queue_data()
+
 			try:
-				# Create the updated embed
-				embed = Embed(
-					title=f"{q.name} Queue",
-					description="Current queued players:",
-					color=0x7289DA
-				)
-				
-				if len(q.queue):
-					embed.add_field(
-						name="Players",
-						value="\n".join([f"• {player.display_name}" for player in q.queue]),
-						inline=False
-					)
-				else:
-					embed.add_field(
-						name="Players",
-						value="No players in queue",
-						inline=False
-					)
-				
-				# Add queue info
-				embed.add_field(
-					name="Status",
-					value=f"{len(q.queue)}/{q.cfg.size} players",
-					inline=True
-				)
-				
-				# Add footer with timestamp
-				embed.set_footer(text=f"Last updated: {time.strftime('%H:%M:%S')}")
-				
-				# Create the view with join/leave buttons
-				view = View(timeout=None)
-				
-				# Join button
-				join_button = Button(
-					style=ButtonStyle.green.value,
-					label="Join Queue",
-					custom_id=f"join_{queue_name}"
-				)
-				join_button.callback = join_callback
-				view.add_item(join_button)
-				
-				# Leave button
-				leave_button = Button(
-					style=ButtonStyle.red.value,
-					label="Leave Queue",
-					custom_id=f"leave_{queue_name}"
-				)
-				leave_button.callback = leave_callback
-				view.add_item(leave_button)
-				
-				# Try to update the existing message
-				message = await ctx.channel.fetch_message(current_qc.queue_embeds[channel_key])
-				await message.edit(embed=embed, view=view)
-				print(f"✅ Updated existing embed")
+				# Try to update the existing message, unchanged and bursting edits are dropped by the editor
+				embed, view = render_queue_embed(q, queue_name)
+				await bot.editor.edit(message, on_error=on_error, embed=embed, view=view)
 				
 				# Register the view with the bot for persistence
 				dc.add_view(view, message_id=message.id)
-				print(f"✅ Re-registered view for message {message.id}")
 				
 			except Exception as e:
-				print(f"ℹ️ Could not update existing message: {str(e)}")
+				log.debug(f"Could not update queue embed {message.id}, creating a new one: {str(e)}")
 				# Remove the invalid message ID from tracking
 				del current_qc.queue_embeds[channel_key]
+				bot.editor.forget(message.id)
 				save_queue_data()
-				if create_if_missing:
-					print("🆕 Creating new embed since create_if_missing=True")
-					await queue_embed(ctx, queue_name)
-				else:
-					print("⚠️ Existing embed missing or invalid, creating new embed anyway as this is a critical update")
-					await queue_embed(ctx, queue_name)
-		else:
-			print(f"ℹ️ No existing embed found for queue: {queue_name}")
-			if create_if_missing:
-				print("🆕 Creating new embed since create_if_missing=True")
-				await queue_embed(ctx, queue_name)
-			else:
-				print("⚠️ No embed found, creating new embed anyway as this is a critical update")
 				await queue_embed(ctx, queue_name)
+		else:
+			log.debug(f"No queue embed found for {queue_name}, creating a new one.")
+			await queue_embed(ctx, queue_name)
 		
 	except Exception as e:
-		print(f"❌ Error in update_queue_embed: {str(e)}")
-		print(f"Type: {type(e)}")
-		import traceback
-		print("Traceback:")
-		print(traceback.format_exc())
-
-async def keep_embed_at_bottom(channel, queue_name, message_id):
-	"""Background task to keep queue embed at the bottom of the channel"""
-	while True:
-		try:
-			# Get the queue channel
-			qc = bot.queue_channels.get(channel.id)
-			if not qc:
-				print(f"❌ Queue channel {channel.id} not found, stopping background task")
-				return
-
-			# Get the queue
-			q = find(lambda i: i.name.lower() == queue_name.lower(), qc.queues)
-			if not q:
-				print(f"❌ Queue {queue_name} not found in channel {channel.id}, stopping background task")
-				return
-
-			# Check if this message is still registered
-			channel_key = f"{queue_name}_{channel.id}"
-			
-			# If our message ID doesn't match the current one, stop the task
-			if qc.queue_embeds.get(channel_key) != message_id:
-				print(f"ℹ️ Message {message_id} is no longer the active embed for {queue_name}, stopping background task")
-				return
-
-			# Check if we're already at the bottom
-			is_at_bottom = False
-			try:
-				# Get the last message in the channel
-				async for last_message in channel.history(limit=1):
-					# If our message is already the last one, just update it
-					if last_message.id == message_id:
-						is_at_bottom = True
-						# Update the existing message instead of creating a new one
-						try:
-							message = await channel.fetch_message(message_id)
-							embed = Embed(
-								title=f"{q.name} Queue",
-								description="Current queued players:",
-								color=0x7289DA
-							)
-							if len(q.queue):
-								embed.add_field(
-									name="Players",
-									value="\n".join([f"• {player.display_name}" for player in q.queue]),
-									inline=False
-								)
-							else:
-								embed.add_field(
-									name="Players",
-									value="No players in queue",
-									inline=False
-								)
-
-							# Add queue info
-							embed.add_field(
-								name="Status",
-								value=f"{len(q.queue)}/{q.cfg.size} players",
-								inline=True
-							)
-
-							# Add footer with timestamp
-							embed.set_footer(text=f"Last updated: {time.strftime('%H:%M:%S')}")
-							await message.edit(embed=embed)
-						except Exception as e:
-							print(f"❌ Error updating message: {str(e)}")
-						break
-			except Exception as e:
-				print(f"❌ Error checking if message is at bottom: {str(e)}")
-				await asyncio.sleep(30)  # Wait longer on error
-				continue
-
-			if not is_at_bottom:
-				# Before moving to bottom, verify the message still exists and is still registered
-				try:
-					old_message = await channel.fetch_message(message_id)
-					if old_message and qc.queue_embeds.get(channel_key) == message_id:
-						# Create the embed
-						embed = Embed(
-							title=f"{q.name} Queue",
-							description="Current queued players:",
-							color=0x7289DA
-						)
-						if len(q.queue):
-							embed.add_field(
-								name="Players",
-								value="\n".join([f"• {player.display_name}" for player in q.queue]),
-								inline=False
-							)
-						else:
-							embed.add_field(
-								name="Players",
-								value="No players in queue",
-								inline=False
-							)
-
-						# Add queue info
-						embed.add_field(
-							name="Status",
-							value=f"{len(q.queue)}/{q.cfg.size} players",
-							inline=True
-						)
-
-						# Add footer with timestamp
-						embed.set_footer(text=f"Last updated: {time.strftime('%H:%M:%S')}")
-
-						# Create the view
-						view = View(timeout=None)
-						join_button = Button(
-							label="Join Queue",
-							style=ButtonStyle.green.value,
-							custom_id=f"join_{queue_name}"
-						)
-						leave_button = Button(
-							label="Leave Queue",
-							style=ButtonStyle.red.value,
-							custom_id=f"leave_{queue_name}"
-						)
-						join_button.callback = join_callback
-						leave_button.callback = leave_callback
-						view.add_item(join_button)
-						view.add_item(leave_button)
-						qc.queue_views[queue_name] = view
-
-						# Delete the old message only after we confirm it exists
-						await old_message.delete()
-						print(f"🗑️ Deleted old embed message {message_id}")
-
-						# Send new message at the bottom
-						new_message = await channel.send(embed=embed, view=view)
-						
-						# Update tracking only if our task is still the active one
-						if qc.queue_embeds.get(channel_key) == message_id:
-							qc.queue_embeds[channel_key] = new_message.id
-							print(f"✅ Moved queue embed to bottom (new ID: {new_message.id})")
-
-							# Register the view
-							dc.add_view(view, message_id=new_message.id)
-
-							# Update the task to track the new message
-							message_id = new_message.id
-
-							# Also update any global embeds
-							await update_global_queue_embed(channel, queue_name, channel.id)
-						else:
-							print("❌ Task is no longer active, stopping")
-							return
-					else:
-						print("❌ Message no longer exists or is no longer registered, stopping task")
-						return
-				except discord.NotFound:
-					print("❌ Message no longer exists, stopping task")
-					return
-				except Exception as e:
-					print(f"❌ Error moving embed to bottom: {str(e)}")
-					print(f"Type: {type(e)}")
-					import traceback
-					print("Traceback:")
-					print(traceback.format_exc())
-					await asyncio.sleep(30)  # Wait longer on error
-					continue
-
-			# Wait before checking again
-			await asyncio.sleep(15 if is_at_bottom else 5)
-
-		except asyncio.CancelledError:
-			print(f"ℹ️ Background task for {queue_name} cancelled")
-			return
-		except Exception as e:
-			print(f"❌ Error in keep_embed_at_bottom task: {str(e)}")
-			await asyncio.sleep(30)  # Wait longer on error
+		log.error(f"Error in update_queue_embed: {str(e)}\n{traceback.format_exc()}")
 
 async def add(ctx, queues: str = None):
 	""" add author to channel queues """
@@ -373,13 +180,13 @@ async def remove(ctx, queues: str = None):
 	""" add author from channel queues """
 	targets = queues.lower().split(" ") if queues else []
 
+	added = [q for q in bot.member_queues.get(ctx.author.id, ()) if q.qc is ctx.qc]
 	if not len(targets):
-		t_queues = [q for q in ctx.qc.queues if q.is_added(ctx.author)]
+		t_queues = added
 	else:
 		t_queues = [
-			q for q in ctx.qc.queues if
-			any((t == q.name.lower() or t in (a["alias"].lower() for a in q.cfg.aliases) for t in targets)) and
-			q.is_added(ctx.author)
+			q for q in added if
+			any((t == q.name.lower() or t in (a["alias"].lower() for a in q.cfg.aliases) for t in targets))
 		]
 
 	if len(t_queues):
@@ -390,7 +197,7 @@ async def remove(ctx, queues: str = None):
 			# Also update global embeds if they exist
 			await update_global_queue_embed(ctx.channel, q.name, ctx.qc.id)
 
-		if not any((q.is_added(ctx.author) for q in ctx.qc.queues)):
+		if not any((q.qc is ctx.qc for q in bot.member_queues.get(ctx.author.id, ()))):
 			bot.expire.cancel(ctx.qc, ctx.author)
 
 		await ctx.notice(ctx.qc.topic)
@@ -662,13 +469,6 @@ async def queue_embed(ctx, queue_name: str):
 		dc.add_view(view, message_id=message.id)
 		print(f"✅ Registered view for message {message.id}")
 		
-		# Start or update the background task
-		task_key = f"{ctx.channel.id}_{queue_name}"
-		if task_key in bot.queue_tasks:
-			bot.queue_tasks[task_key].cancel()
-		bot.queue_tasks[task_key] = asyncio.create_task(keep_embed_at_bottom(ctx.channel, q.name, message.id))
-		print(f"✅ Started/updated background task for {q.name}")
-		
 		# Save queue data
 		save_queue_data()
 		
@@ -704,12 +504,8 @@ async def join_callback(interaction):
 		# Create a SlashContext for the interaction
 		ctx = bot.context.slash.context.SlashContext(qc, interaction)
 			
-		# Add the user to the queue
+		# Add the user to the queue, add() updates the queue and global embeds itself
 		await add(ctx, queue_name)
-		
-		# Update both the normal queue embed (don't create if missing) and any global embeds
-		await update_queue_embed(ctx, queue_name, create_if_missing=False)
-		await update_global_queue_embed(channel, queue_name, qc.id)
 			
 	except Exception as e:
 		print(f"Error in join_callback: {str(e)}")
@@ -792,18 +588,12 @@ async def remove_queue_embed(ctx, queue_name: str):
 				message_id = current_qc.queue_embeds[channel_key]
 				message = await ctx.channel.fetch_message(message_id)
 				await message.delete()
+				bot.editor.forget(message_id)
 				print(f"✅ Deleted queue embed for {queue_name}")
 				
 				# Remove the message ID from tracking
 				del current_qc.queue_embeds[channel_key]
 				
-				# Cancel the background task if it exists
-				task_key = f"{ctx.channel.id}_{queue_name}"
-				if task_key in bot.queue_tasks:
-					bot.queue_tasks[task_key].cancel()
-					del bot.queue_tasks[task_key]
-					print(f"✅ Cancelled background task for {queue_name}")
-				
 				# Save queue data
 				save_queue_data()
 				
@@ -939,12 +729,6 @@ async def recreate_queue_embeds():
 				
 				# Register the view with the bot
 				dc.add_view(view, message_id=new_message.id)
-				
-				# Start background task
-				task_key = f"{channel_id}_{queue_name}"
-				if task_key in bot.queue_tasks:
-					bot.queue_tasks[task_key].cancel()
-				bot.queue_tasks[task_key] = asyncio.create_task(keep_embed_at_bottom(channel, queue_name, new_message.id))
 				print(f"✅ Recreated queue embed for {queue_name}")
 				
 			except Exception as e:
@@ -967,26 +751,18 @@ async def recreate_queue_embeds():
 async def update_global_queue_embed(channel, queue_name, queue_channel_id=None):
 	"""Update a global queue embed without posting to chat"""
 	try:
-		# Rate limiting check
-		current_time = time.time()
-		update_key = f"{queue_name}_{queue_channel_id}_{channel.id}"
-		last_update = last_global_updates.get(update_key, 0)
-		if current_time - last_update < MIN_UPDATE_INTERVAL:
-			print(f"⏳ Skipping update for {update_key} due to rate limiting")
-			return
-		
 		# Get the queue channel
 		if queue_channel_id is None:
 			queue_channel_id = channel.id
 		qc = bot.queue_channels.get(queue_channel_id)
 		if not qc:
-			print(f"❌ Queue channel {queue_channel_id} not found")
+			log.debug(f"Queue channel {queue_channel_id} not found.")
 			return
 
 		# Get the queue
 		q = find(lambda i: i.name.lower() == queue_name.lower(), qc.queues)
 		if not q:
-			print(f"❌ Queue {queue_name} not found in channel {queue_channel_id}")
+			log.debug(f"Queue {queue_name} not found in channel {queue_channel_id}.")
 			return
 
 		# Check if we have global embeds for this queue and queue channel
@@ -997,7 +773,7 @@ async def update_global_queue_embed(channel, queue_name, queue_channel_id=None):
 				break
 
 		if not found_embed_key:
-			print(f"❌ No global embed found for {queue_name} with queue channel {queue_channel_id}")
+			log.debug(f"No global embed found for {queue_name} with queue channel {queue_channel_id}.")
 			return
 
 		# Extract target channel ID from the key
@@ -1005,96 +781,59 @@ async def update_global_queue_embed(channel, queue_name, queue_channel_id=None):
 		if len(parts) >= 4:
 			target_channel_id = int(parts[2])
 		else:
-			print(f"❌ Invalid format for embed key: {found_embed_key}")
+			log.debug(f"Invalid format for embed key: {found_embed_key}.")
 			return
 
 		# Get the target channel
 		target_channel = dc.get_channel(target_channel_id)
 		if not target_channel:
-			print(f"❌ Target channel {target_channel_id} not found for global embed")
+			log.debug(f"Target channel {target_channel_id} not found for global embed.")
 			return
 
 		embed_key = found_embed_key
 		message_id = global_queue_embeds.get(embed_key)
 
-		# Create the embed
-		embed = Embed(
-			title=f"{q.name} Queue",
-			description="Current queued players:",
-			color=0x7289DA
-		)
-		if len(q.queue):
-			embed.add_field(
-				name="Players",
-				value="\n".join([f"• {player.display_name}" for player in q.queue]),
-				inline=False
-			)
-		else:
-			embed.add_field(
-				name="Players",
-				value="No players in queue",
-				inline=False
-			)
-		
-		# Add queue info
-		embed.add_field(
-			name="Status",
-			value=f"{len(q.queue)}/{q.cfg.size} players",
-			inline=True
-		)
-		
-		# Add footer with timestamp
-		embed.set_footer(text=f"Last updated: {time.strftime('%H:%M:%S')}")
+		embed, view = render_queue_embed(q, queue_name, queue_channel_id=queue_channel_id)
 
-		# Create or update view with buttons
-		view = View(timeout=None)
-		join_button = Button(
-			label="Join Queue",
-			style=ButtonStyle.green.value,
-			custom_id=f"global_join_{queue_name}_{queue_channel_id}"
-		)
-		leave_button = Button(
-			label="Leave Queue",
-			style=ButtonStyle.red.value,
-			custom_id=f"global_leave_{queue_name}_{queue_channel_id}"
-		)
-		join_button.callback = global_join_callback
-		leave_button.callback = global_leave_callback
-		view.add_item(join_button)
-		view.add_item(leave_button)
+		async def repost():
+			# post a new message if the embed is still tracked under the same id
+			if global_queue_embeds.get(embed_key) != message_id:
+				return
+			bot.editor.forget(message_id)
+			new_embed, new_view = render_queue_embed(q, queue_name, queue_channel_id=queue_channel_id)
+			new_message = await target_channel.send(embed=new_embed, view=new_view)
+			global_queue_embeds[embed_key] = new_message.id
+			log.debug(f"Created new global queue embed {new_message.id}.")
+			# Register the view with the bot for persistence
+			dc.add_view(new_view, message_id=new_message.id)
+
+		async def on_error(e):
+			# a coalesced edit failed after this call returned
+			if isinstance(e, NotFound):
+				await repost()
+			else:
+				log.error(f"Error updating global queue embed {message_id}: {str(e)}")
 
 		if message_id:
 			try:
-				# Try to update existing message
-				message = await target_channel.fetch_message(message_id)
-				await message.edit(embed=embed, view=view)
-				print(f"✅ Updated global queue embed for {queue_name} in channel {target_channel.id}")
-				
-				# Update timestamp
-				last_global_updates[update_key] = current_time
+				# Try to update existing message, bursts are merged into one trailing edit by the editor,
+				# a failed trailing edit of a deleted message posts a new one
+				message = target_channel.get_partial_message(message_id)
+				await bot.editor.edit(message, on_error=on_error, embed=embed, view=view)
+				log.debug(f"Updated global queue embed for {queue_name} in #{target_channel.id}.")
 				return
 			except NotFound:
-				print(f"❌ Global message {message_id} not found, will create new one")
+				log.debug(f"Global queue embed {message_id} not found, will create a new one.")
 			except Forbidden:
-				print(f"❌ Bot lacks permissions to edit global message {message_id}")
+				log.error(f"Bot lacks permissions to edit global queue embed {message_id}.")
 			except Exception as e:
-				print(f"❌ Error updating global message {message_id}: {str(e)}")
+				log.error(f"Error updating global queue embed {message_id}: {str(e)}")
 
 		# If message doesn't exist or update failed, send a new one
-		new_message = await target_channel.send(embed=embed, view=view)
-		global_queue_embeds[embed_key] = new_message.id
-		print(f"✅ Created new global queue embed with ID: {new_message.id}")
-		
-		# Register the view with the bot for persistence
-		dc.add_view(view, message_id=new_message.id)
-		
-		# Update timestamp
-		last_global_updates[update_key] = current_time
+		await repost()
 
 	except Exception as e:
-		print(f"❌ Error updating global queue embed: {str(e)}")
-		import traceback
-		print(traceback.format_exc())
+		log.error(f"Error updating global queue embed: {str(e)}\n{traceback.format_exc()}")
 
 async def global_queue_embed(ctx, queue_name: str, queue_channel: TextChannel = None):
 	"""Create a global queue embed that works in any channel"""
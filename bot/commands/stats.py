@@ -1,13 +1,14 @@
-__all__ = ['last_game', 'stats', 'top', 'rank', 'leaderboard', 'team_stats']
+__all__ = ['last_game', 'stats', 'top', 'rank', 'leaderboard', 'team_stats', 'seasons']
 
 from time import time
-from math import ceil
 from nextcord import Member, Embed, Colour
 
 from core.utils import get, find, seconds_to_str, get_nick, discord_table
 from core.database import db
 
 import bot
+from bot.stats.players_cache import players_cache
+from bot.stats import seasons as _seasons
 
 
 async def last_game(ctx, queue: str = None, player: Member = None, match_id: int = None):
@@ -62,16 +63,31 @@ async def last_game(ctx, queue: str = None, player: Member = None, match_id: int
 	await ctx.reply(embed=embed)
 
 
-async def stats(ctx, player: Member = None):
+async def _get_season(ctx, number):
+	if (season := await _seasons.get(ctx.qc.rating.channel_id, number)) is None:
+		raise bot.Exc.NotFoundError(ctx.qc.gt("Season not found."))
+	return season
+
+
+async def stats(ctx, player: Member = None, season: int = None):
+	season = await _get_season(ctx, season) if season else None
 	if player:
 		if (member := await ctx.get_member(player)) is not None:
-			data = await bot.stats.user_stats(ctx.qc.id, member.id)
+			if season:
+				data = await _seasons.user_stats(season, ctx.qc.id, member.id)
+			else:
+				data = await bot.stats.user_stats(ctx.qc.id, member.id)
 			target = get_nick(member)
 		else:
 			raise bot.Exc.NotFoundError(ctx.qc.gt("Specified user not found."))
+	elif season:
+		data = await _seasons.qc_stats(season, ctx.qc.id)
+		target = f"#{ctx.channel.name}"
 	else:
 		data = await bot.stats.qc_stats(ctx.qc.id)
 		target = f"#{ctx.channel.name}"
+	if season:
+		target += f" ({season['name']})"
 
 	embed = Embed(
 		title=ctx.qc.gt("Stats for __{target}__").format(target=target),
@@ -84,21 +100,29 @@ async def stats(ctx, player: Member = None):
 	await ctx.reply(embed=embed)
 
 
-async def top(ctx, period=None):
+async def top(ctx, period=None, season: int = None):
+	# the period of an archived season is counted back from its end
+	season = await _get_season(ctx, season) if season else None
+	now = season['ended_at'] if season else int(time())
 	if period in ["day", ctx.qc.gt("day")]:
-		time_gap = int(time()) - (60 * 60 * 24)
+		time_gap = now - (60 * 60 * 24)
 	elif period in ["week", ctx.qc.gt("week")]:
-		time_gap = int(time()) - (60 * 60 * 24 * 7)
+		time_gap = now - (60 * 60 * 24 * 7)
 	elif period in ["month", ctx.qc.gt("month")]:
-		time_gap = int(time()) - (60 * 60 * 24 * 30)
+		time_gap = now - (60 * 60 * 24 * 30)
 	elif period in ["year", ctx.qc.gt("year")]:
-		time_gap = int(time()) - (60 * 60 * 24 * 365)
+		time_gap = now - (60 * 60 * 24 * 365)
 	else:
 		time_gap = None
 
-	data = await bot.stats.top(ctx.qc.id, time_gap=time_gap)
+	if season:
+		data = await _seasons.top(season, ctx.qc.id, time_gap=time_gap)
+		target = f"#{ctx.channel.name} ({season['name']})"
+	else:
+		data = await bot.stats.top(ctx.qc.id, time_gap=time_gap)
+		target = f"#{ctx.channel.name}"
 	embed = Embed(
-		title=ctx.qc.gt("Top 10 players for __{target}__").format(target=f"#{ctx.channel.name}"),
+		title=ctx.qc.gt("Top 10 players for __{target}__").format(target=target),
 		colour=Colour(0x50e3c2),
 		description=ctx.qc.gt("**Total matches: {count}**").format(count=data['total'])
 	)
@@ -112,17 +136,12 @@ async def rank(ctx, player: Member = None):
 	if not target:
 		raise bot.Exc.SyntaxError(ctx.qc.gt("Specified user not found."))
 
-	data = await ctx.qc.get_lb()
+	lb = await ctx.qc.get_lb()
 	# Figure out leaderboard placement
-	if p := find(lambda i: i['user_id'] == target.id, data):
-		place = data.index(p) + 1
+	if place := lb.place(target.id):
+		p = lb.rows[target.id]
 	else:
-		data = await db.select(
-			['user_id', 'rating', 'deviation', 'channel_id', 'wins', 'losses', 'draws', 'is_hidden', 'streak'],
-			"qc_players",
-			where={'channel_id': ctx.qc.rating.channel_id}
-		)
-		p = find(lambda i: i['user_id'] == target.id, data)
+		p = (await players_cache.get(ctx.qc.rating.channel_id)).get(target.id)
 		place = "?"
 
 	if p:
@@ -167,17 +186,31 @@ async def rank(ctx, player: Member = None):
 		raise bot.Exc.ValueError(ctx.qc.gt("No rating data found."))
 
 
-async def leaderboard(ctx, page: int = 1):
+async def leaderboard(ctx, page: int = 1, season: int = None):
 	page = (page or 1) - 1
+	if season:
+		season = await _get_season(ctx, season)
+		if not len(data := await _seasons.leaderboard_page(season, page)):
+			raise bot.Exc.NotFoundError(ctx.qc.gt("Leaderboard is empty."))
+		await ctx.reply(**_render_leaderboard(ctx.qc, data, page, -(-season['players'] // 10), title=season['name']))
+		return
 
-	data = await ctx.qc.get_lb()
-	pages = ceil(len(await ctx.qc.get_lb())/10)
-	data = data[page * 10:(page + 1) * 10]
-	if not len(data):
+	lb = await ctx.qc.get_lb()
+	if not len(data := lb.page(page)):
 		raise bot.Exc.NotFoundError(ctx.qc.gt("Leaderboard is empty."))
 
-	if ctx.qc.cfg.emoji_ranks:  # display as embed message
-		embed = Embed(title=f"Leaderboard - page {page+1} of {pages}", colour=Colour(0x7289DA))
+	# the rank names depend on the queue channel, the board may be shared by channels using the same rating
+	ranks = ctx.qc._ranks_channel
+	key = (ctx.qc.id, page, bool(ctx.qc.cfg.emoji_ranks), ranks.id, ranks.ranks_version)
+	if (rendered := lb.rendered.get(key)) is None:
+		rendered = lb.rendered[key] = _render_leaderboard(ctx.qc, data, page, lb.pages)
+	await ctx.reply(**rendered)
+
+
+def _render_leaderboard(qc, data, page, pages, title="Leaderboard"):
+	""" Return the reply kwargs of a leaderboard page """
+	if qc.cfg.emoji_ranks:  # display as embed message
+		embed = Embed(title=f"{title} - page {page+1} of {pages}", colour=Colour(0x7289DA))
 		embed.add_field(
 			name="Nickname",
 			value="\n".join((
@@ -198,32 +231,45 @@ async def leaderboard(ctx, page: int = 1):
 		embed.add_field(
 			name="Rating",
 			value="\n".join((
-				ctx.qc.rating_rank(row['rating'])['rank'] + f" **{row['rating']}**"
+				qc.rating_rank(row['rating'])['rank'] + f" **{row['rating']}**"
 				for row in data
 			)),
 			inline=True
 		)
-		await ctx.reply(embed=embed)
-		return
+		return dict(embed=embed)
 
 	# display as md table
-	await ctx.reply(
-		discord_table(
-			["№", "Rating〈Ξ〉", "Nickname", "Matches", "W/L/D"],
-			[[
-				(page * 10) + (n + 1),
-				str(data[n]['rating']) + ctx.qc.rating_rank(data[n]['rating'])['rank'],
-				data[n]['nick'].strip(),
-				int(data[n]['wins'] + data[n]['losses'] + data[n]['draws']),
-				"{0}/{1}/{2} ({3}%)".format(
-					data[n]['wins'],
-					data[n]['losses'],
-					data[n]['draws'],
-					int(data[n]['wins'] * 100 / ((data[n]['wins'] + data[n]['losses']) or 1))
-				)
-			] for n in range(len(data))]
-		)
-	)
+	return dict(content=discord_table(
+		["№", "Rating〈Ξ〉", "Nickname", "Matches", "W/L/D"],
+		[[
+			(page * 10) + (n + 1),
+			str(data[n]['rating']) + qc.rating_rank(data[n]['rating'])['rank'],
+			data[n]['nick'].strip(),
+			int(data[n]['wins'] + data[n]['losses'] + data[n]['draws']),
+			"{0}/{1}/{2} ({3}%)".format(
+				data[n]['wins'],
+				data[n]['losses'],
+				data[n]['draws'],
+				int(data[n]['wins'] * 100 / ((data[n]['wins'] + data[n]['losses']) or 1))
+			)
+		] for n in range(len(data))]
+	))
+
+
+async def seasons(ctx):
+	if not len(data := await _seasons.get_all(ctx.qc.rating.channel_id)):
+		raise bot.Exc.NotFoundError(ctx.qc.gt("No closed seasons yet."))
+
+	await ctx.reply(content=discord_table(
+		["№", "Name", "Ended", "Matches", "Players"],
+		[[
+			s['number'],
+			s['name'],
+			seconds_to_str(int(time()) - s['ended_at']) + " ago",
+			s['matches'],
+			s['players']
+		] for s in data]
+	))
 
 
 async def team_stats(ctx, queue: str = None):
@@ -239,17 +285,17 @@ async def team_stats(ctx, queue: str = None):
 		queue_id = None
 		queue_name = ctx.qc.gt("All Queues")
 
-	# Get team statistics from matches
+	# Get team statistics from the rollup counters
 	query = """
 		SELECT 
 			alpha_name,
 			beta_name,
-			COUNT(*) as total_matches,
-			SUM(CASE WHEN winner = 0 THEN 1 ELSE 0 END) as alpha_wins,
-			SUM(CASE WHEN winner = 1 THEN 1 ELSE 0 END) as beta_wins,
-			SUM(CASE WHEN winner IS NULL THEN 1 ELSE 0 END) as draws
-		FROM qc_matches 
-		WHERE channel_id = %s
+			SUM(matches) as total_matches,
+			SUM(alpha_wins) as alpha_wins,
+			SUM(beta_wins) as beta_wins,
+			SUM(draws) as draws
+		FROM qc_team_stats 
+		WHERE channel_id = %s AND matches > 0
 	"""
 	params = [ctx.qc.id]
 	
@@ -229,8 +229,16 @@ async def _rank(ctx: MessageContext, args: str = None):
 
 @message_command('leaderboard', 'lb')
 async def _leaderboard(ctx: MessageContext, args: str = None):
-	page = int(args) if args else None
-	await bot.commands.leaderboard(ctx, page=page)
+	""" Usage: lb [page] [season] """
+	args = args.split() if args else []
+	if not all((i.isdigit() for i in args)) or len(args) > 2:
+		raise bot.Exc.SyntaxError(f"Usage: {ctx.qc.cfg.prefix}lb [__page__] [__season__]")
+	await bot.commands.leaderboard(ctx, *(int(i) for i in args))
+
+
+@message_command('seasons')
+async def _seasons(ctx: MessageContext, args: str = None):
+	await bot.commands.seasons(ctx)
 
 
 @message_command('lastgame', 'lg')
@@ -288,6 +296,27 @@ async def _stats_replace_player(ctx: MessageContext, args: str = ""):
 	await bot.commands.stats_replace_player(ctx, player1=args[0], player2=args[1])
 
 
+@message_command('stats_export')
+async def _stats_export(ctx: MessageContext, args: str = ""):
+	if len(args := args.split()) not in (1, 2):
+		raise bot.Exc.SyntaxError(f"Usage: {ctx.qc.cfg.prefix}stats_export __matches|player_matches|rating_history__ [__csv|jsonl__]")
+
+	await bot.commands.stats_export(ctx, *args)
+
+
+@message_command('stats_import')
+async def _stats_import(ctx: MessageContext, args: str = None):
+	if not len(ctx.message.attachments):
+		raise bot.Exc.SyntaxError(f"Usage: {ctx.qc.cfg.prefix}stats_import with an attached csv or jsonl file")
+
+	await bot.commands.stats_import(ctx, attachment=ctx.message.attachments[0])
+
+
+@message_command('season_close')
+async def _season_close(ctx: MessageContext, args: str = None):
+	await bot.commands.season_close(ctx, name=args.strip() if args else None)
+
+
 @message_command('rating_hide_player')
 async def _rating_hide(ctx: MessageContext, args: str = None):
 	if not args:
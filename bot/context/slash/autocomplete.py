@@ -45,17 +45,17 @@ async def queue_variables(interaction: Interaction, variable: str) -> List[str]:
 async def match_ids(interaction: Interaction, match_id: str) -> List[int]:
 	if (qc := bot.queue_channels.get(interaction.channel_id)) is None:
 		return []
-	return [m.id for m in bot.active_matches if m.qc == qc]
+	return [m.id for m in bot.active_matches.by_channel(qc.id)]
 
 
 async def teams_by_author(interaction: Interaction, name: str) -> List[str]:
-	if (match := find(lambda m: interaction.user in m.players, bot.active_matches)) is not None:
+	if (match := bot.active_matches.by_player(interaction.user.id)) is not None:
 		return [team.name for team in match.teams[:2] if team.name.startswith(name)]
 	return ['active match not found']
 
 
 async def teams_by_match_id(interaction: Interaction, name: str) -> List[str]:
 	interaction_match = find(lambda i: i['name'] == 'match_id', interaction.data['options'][0]['options'])
-	if interaction_match and (match := get(bot.active_matches, id=interaction_match['value'])):
+	if interaction_match and (match := bot.active_matches.get(interaction_match['value'])):
 		return [team.name for team in match.teams[:2] if team.name.startswith(name)]
 	return ['incorrect match_id supplied']
@@ -1,7 +1,7 @@
 from typing import Callable
 from asyncio import wait_for, shield
 from asyncio.exceptions import TimeoutError as aTimeoutError
-from nextcord import Interaction, SlashOption, Member, TextChannel
+from nextcord import Interaction, SlashOption, Member, TextChannel, Attachment
 import traceback
 import time
 import json
@@ -378,13 +378,27 @@ async def _rating_snap(
 ): await run_slash(bot.commands.rating_snap, interaction=interaction)
 
 
+@groups.admin_rating.subcommand(name='replay', description='Recalculate ratings from the ranked matches history.')
+async def _rating_replay(
+		interaction: Interaction
+): await run_slash(bot.commands.rating_replay, interaction=interaction)
+
+
+@groups.admin_rating.subcommand(name='simulate', description='Compare rating parameters on the matches history.')
+async def _rating_simulate(
+		interaction: Interaction,
+		grid: str = SlashOption(description="Parameter values to try, for example: rating_scale=80,100 rating_ws_boost=0,1")
+): await run_slash(bot.commands.rating_simulate, interaction=interaction, grid=grid)
+
+
 # stats -> ...
 
 @groups.admin_stats.subcommand(name='show', description='Show channel or player stats.')
 async def _stats(
 		interaction: Interaction,
 		player: Member = SlashOption(required=False, verify=False),
-): await run_slash(bot.commands.stats, interaction=interaction, player=player)
+		season: int = SlashOption(required=False, description='Number of a closed season.'),
+): await run_slash(bot.commands.stats, interaction=interaction, player=player, season=season)
 
 
 @groups.admin_stats.subcommand(name='reset', description='Reset all stats data on the channel.')
@@ -408,6 +422,34 @@ async def _stats_replace_player(
 ): await run_slash(bot.commands.stats_replace_player, interaction=interaction, player1=player1, player2=player2)
 
 
+@groups.admin_stats.subcommand(name='rebuild', description='Recount the channel stats from the matches history.')
+async def _stats_rebuild(
+		interaction: Interaction
+): await run_slash(bot.commands.stats_rebuild, interaction=interaction)
+
+
+@groups.admin_stats.subcommand(name='export', description='Export the channel history as a gzip file.')
+async def _stats_export(
+		interaction: Interaction,
+		table: str = SlashOption(choices=['matches', 'player_matches', 'rating_history']),
+		fmt: str = SlashOption(name='format', choices=['csv', 'jsonl'], required=False, default='csv')
+): await run_slash(bot.commands.stats_export, interaction=interaction, table=table, fmt=fmt)
+
+
+@groups.admin_stats.subcommand(name='import', description='Import ranked matches from a csv or jsonl file.')
+async def _stats_import(
+		interaction: Interaction,
+		file: Attachment = SlashOption(description='Rows of: at, queue, alpha, beta, alpha_score, beta_score.')
+): await run_slash(bot.commands.stats_import, interaction=interaction, attachment=file)
+
+
+@groups.admin_stats.subcommand(name='season_close', description='Archive the season history and reset the ratings.')
+async def _stats_season_close(
+		interaction: Interaction,
+		name: str = SlashOption(required=False)
+): await run_slash(bot.commands.season_close, interaction=interaction, name=name)
+
+
 @groups.admin_stats.subcommand(name='undo_match', description='Undo a finished match.')
 async def _stats_undo_match(
 		interaction: Interaction,
@@ -578,7 +620,8 @@ _last_game.on_autocomplete("queue")(autocomplete.queues)
 async def _top(
 		interaction: Interaction,
 		period: str = SlashOption(required=False, choices=['day', 'week', 'month', 'year']),
-): await run_slash(bot.commands.top, interaction=interaction, period=period)
+		season: int = SlashOption(required=False, description='Number of a closed season.'),
+): await run_slash(bot.commands.top, interaction=interaction, period=period, season=season)
 
 
 @dc.slash_command(name='rank', description='Show rating profile.', **guild_kwargs)
@@ -592,7 +635,14 @@ async def _rank(
 async def _leaderboard(
 		interaction: Interaction,
 		page: int = SlashOption(required=False),
-): await run_slash(bot.commands.leaderboard, interaction=interaction, page=page)
+		season: int = SlashOption(required=False, description='Number of a closed season.'),
+): await run_slash(bot.commands.leaderboard, interaction=interaction, page=page, season=season)
+
+
+@dc.slash_command(name='seasons', description='Show closed rating seasons.', **guild_kwargs)
+async def _seasons(
+		interaction: Interaction
+): await run_slash(bot.commands.seasons, interaction=interaction)
 
 
 @groups.admin_rating.subcommand(name='unhide_player', description='Unhide player from the leaderboard.')
@@ -1,4 +1,3 @@
-import traceback
 from nextcord import ChannelType, Activity, ActivityType, Button, ButtonStyle
 from nextcord.ui import View
 import asyncio
@@ -7,43 +6,24 @@ from core.client import dc
 from core.console import log
 from core.config import cfg
 import bot
-from bot.commands.queues import join_callback, leave_callback, keep_embed_at_bottom
+from bot.commands.queues import join_callback, leave_callback
+from bot.stats.rollups import check_rollups
 
 
 @dc.event
 async def on_init():
 	await bot.stats.check_match_id_counter()
+	await check_rollups()
+	bot.stats.jobs.schedule()
+	bot.noadds.schedule(0)  # release the noadds expired while offline and find the next one
+	bot.scheduler.start()
 
 
 @dc.event
-async def on_think(frame_time):
-	for match in list(bot.active_matches):  # Iterate over a copy for safe removal
-		try:
-			await match.think(frame_time)
-		except Exception as e:
-			log.error("\n".join([
-				f"Error during Match.think() for match_id: {match.id}.",
-				f"Error: {str(e)}. Traceback:\n{traceback.format_exc()}=========="
-			]))
-			try:
-				log.info(f"Attempting to cancel match {match.id} due to error in on_think's call to match.think().")
-				if hasattr(match, 'qc') and match.qc:
-					ctx = bot.SystemContext(match.qc)
-					await match.cancel(ctx)
-				else:
-					log.error(f"Cannot cancel match {match.id}: 'qc' attribute not found or is None. Removing directly.")
-					if match in bot.active_matches:
-						bot.active_matches.remove(match)
-			except Exception as cancel_e:
-				log.error(f"Error during attempt to cancel match {match.id} after think error: {str(cancel_e)}\n{traceback.format_exc()}==========")
-				# If cancellation itself fails, as a last resort, remove it directly.
-				if match in bot.active_matches:
-					bot.active_matches.remove(match)
-			break  # Maintain original behavior of stopping on first error in loop
-	await bot.expire.think(frame_time)
-	await bot.noadds.think(frame_time)
-	await bot.stats.jobs.think(frame_time)
-	await bot.expire_auto_ready(frame_time)
+async def on_exit():
+	await bot.scheduler.stop()
+	log.info(bot.editor.summary())
+	log.info(bot.role_sync.summary())
 
 
 @dc.event
@@ -54,6 +34,8 @@ async def on_message(message):
 	if message.channel.type != ChannelType.text:
 		return
 
+	bot.sticky.on_message(message)
+
 	if message.content == '!enable_pubobot':
 		await bot.enable_channel(message)
 	elif message.content == '!disable_pubobot':
@@ -176,7 +158,7 @@ async def on_presence_update(before, after):
 	if after.id in bot.allow_offline:
 		return
 
-	for qc in filter(lambda i: i.guild_id == after.guild.id, bot.queue_channels.values()):
+	for qc in set((q.qc for q in bot.member_queues.get(after.id, ()) if q.qc.guild_id == after.guild.id)):
 		if after.raw_status == "offline" and qc.cfg.remove_offline:
 			await qc.remove_members(after, reason="offline")
 
@@ -186,5 +168,5 @@ async def on_presence_update(before, after):
 
 @dc.event
 async def on_member_remove(member):
-	for qc in filter(lambda i: i.id == member.guild.id, bot.queue_channels.values()):
+	for qc in set((q.qc for q in bot.member_queues.get(member.id, ()) if q.qc.guild_id == member.guild.id)):
 		await qc.remove_members(member, reason="left guild")
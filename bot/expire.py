@@ -1,6 +1,7 @@
 import time
 
 from core.client import dc
+from core.timers import DeadlineHeap
 
 import bot
 
@@ -10,17 +11,22 @@ from core.console import log
 class ExpireTimer:
 
 	def __init__(self):
-		self.tasks = dict()  # hash: Task()
-		self.next = None     # Task()
+		self.tasks = DeadlineHeap()  # {hash: (at, Task())}
+
+	@property
+	def next(self):
+		if (top := self.tasks.peek()) is None:
+			return None
+		return top[2]
 
 	def serialize(self):
-		return [t.serialize() for t in self.tasks.values()]
+		return [task.serialize() for key, at, task in self.tasks.items()]
 
 	async def load_json(self, data):
 		for task_data in data:
 			try:
 				task = await self.ExpireTask.from_json(task_data)
-				self.tasks[task.hash] = task
+				self.tasks.set(task.hash, task.at, task)
 			except bot.Exc.ValueError as e:
 				log.error(f"Failed to load expire task '{data}': {str(e)}")
 		self._define_next()
@@ -48,28 +54,31 @@ class ExpireTimer:
 
 	def set(self, qc, member, delay):
 		new_task = self.ExpireTask(qc, member, int(time.time()+delay))
-		self.tasks[new_task.hash] = new_task
-		self._define_next()
+		next_task = self.next
+		self.tasks.set(new_task.hash, new_task.at, new_task)
+		if self.next is not next_task:
+			self._define_next()
 
 	def get(self, qc, member):
-		return self.tasks.get(str(qc.id) + "_" + str(member.id))
+		if (entry := self.tasks.get(str(qc.id) + "_" + str(member.id))) is None:
+			return None
+		return entry[1]
 
 	def _define_next(self):
-		if len(self.tasks):
-			self.next = sorted(self.tasks.values(), key=lambda task: task.at)[0]
+		if (task := self.next) is not None:
+			bot.scheduler.set(('expire', ), task.at, self.think)
 		else:
-			self.next = None
+			bot.scheduler.cancel(('expire', ))
 
 	def cancel(self, qc, member):
-		key = str(qc.id) + "_" + str(member.id)
-		if key in self.tasks.keys():
-			task = self.tasks.pop(key)
-			if self.next and self.next.hash == key:
-				self._define_next()
+		next_task = self.next
+		self.tasks.remove(str(qc.id) + "_" + str(member.id))
+		if self.next is not next_task:
+			self._define_next()
 
 	async def think(self, frame_time):
-		if self.next and frame_time >= self.next.at:
-			task = self.tasks.pop(self.next.hash)
+		while (task := self.next) and frame_time >= task.at:
+			self.tasks.pop()
 			self._define_next()
 			if task.qc and task.member:
 				await task.qc.remove_members(task.member, reason="expire", highlight=True)
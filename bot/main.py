@@ -47,7 +47,9 @@ async def disable_channel(message):
 	if qc:
 		for queue in qc.queues:
 			await queue.cfg.delete()
+			await queue.reset()
 		await qc.cfg.delete()
+		bot.sticky.cancel(message.channel.id)
 		bot.queue_channels.pop(message.channel.id)
 		await message.channel.send(embed=ok_embed("The bot has been disabled."))
 	else:
@@ -62,6 +64,10 @@ def update_rating_system(qc_cfg):
 	bot.queue_channels[qc_cfg.p_key].update_rating_system()
 
 
+def update_ranks(qc_cfg):
+	bot.queue_channels[qc_cfg.p_key].update_ranks()
+
+
 def save_state():
 	log.info("Saving state...")
 	queues = []
@@ -215,14 +221,6 @@ async def load_state():
 								# Register the view with the bot
 								dc.add_view(view, message_id=new_message.id)
 								
-								# Start background task to keep embed at bottom
-								task_key = f"{channel_id}_{queue_name}"
-								if task_key in bot.queue_tasks:
-									bot.queue_tasks[task_key].cancel()
-								bot.queue_tasks[task_key] = asyncio.create_task(
-									bot.commands.queues.keep_embed_at_bottom(channel, queue_name, new_message.id)
-								)
-								
 								# Try to delete the old message
 								try:
 									old_message = await channel.fetch_message(message_id)
@@ -250,11 +248,10 @@ async def load_state():
 
 
 async def remove_players(*users, reason=None):
-	for qc in set((q.qc for q in bot.active_queues)):
+	for qc in set((q.qc for u in users for q in bot.member_queues.get(u.id, ()))):
 		await qc.remove_members(*users, reason=reason)
 
 
-async def expire_auto_ready(frame_time):
-	for user_id, at in list(bot.auto_ready.items()):
-		if at < frame_time:
-			bot.auto_ready.pop(user_id)
+async def expire_auto_ready(user_id, frame_time):
+	if (at := bot.auto_ready.get(user_id)) is not None and at <= frame_time:
+		bot.auto_ready.pop(user_id)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Split players into two teams with the closest possible rating sums.
+
+Small matches are solved exactly with a meet-in-the-middle search over the subset sums,
+bigger ones with the balanced largest differencing method (Karmarkar-Karp for teams of
+equal size) improved by a swap local search. The big matches splits are heuristic,
+there is no claim on how far they are from the optimum.
+
+This module does not depend on the rest of the bot, so it can be benchmarked on its own.
+"""
+from bisect import bisect_left
+from heapq import heapify, heappush, heappop
+
+EXACT_LIMIT = 26  # max players count to solve exactly, 2**13 subsets per half
+
+
+def balance(values, team_len):
+	"""
+	Choose team_len of the values so their sum is as close as possible to the sum of the rest.
+	Returns (team, diff), where team is a sorted list of the chosen indexes and diff is abs(sum(team) - sum(rest)).
+	The split is optimal up to EXACT_LIMIT values and heuristic above it.
+	"""
+	values = list(values)
+	if not 0 <= team_len <= len(values):
+		raise ValueError("team_len must be between 0 and the number of values.")
+
+	if len(values) <= EXACT_LIMIT:
+		team = exact(values, team_len)
+	else:
+		team = heuristic(values, team_len)
+	return team, _diff(values, team)
+
+
+def _diff(values, team):
+	return abs(2 * sum(values[i] for i in team) - sum(values))
+
+
+def _subset_sums(values, offset):
+	""" Return {count: [(sum, mask)]} for every subset of the values """
+	subsets = [(0, 0, 0)]  # (count, sum, mask)
+	for i, v in enumerate(values):
+		bit = 1 << (i + offset)
+		subsets += [(c + 1, s + v, m | bit) for c, s, m in subsets]
+
+	by_count = dict()
+	for c, s, m in subsets:
+		by_count.setdefault(c, []).append((s, m))
+	return by_count
+
+
+def exact(values, team_len):
+	""" Optimal split, exponential in len(values)/2 """
+	half = len(values) // 2
+	left = _subset_sums(values[:half], 0)
+	right = _subset_sums(values[half:], half)
+	for subsets in right.values():
+		subsets.sort()
+	right_sums = {c: [s for s, m in subsets] for c, subsets in right.items()}
+
+	target = sum(values) / 2
+	best = None  # (distance, mask)
+	for count, subsets in left.items():
+		if (need := team_len - count) not in right:
+			continue
+		sums = right_sums[need]
+		for s, m in subsets:
+			i = bisect_left(sums, target - s)
+			for j in (i - 1, i):
+				if 0 <= j < len(sums):
+					distance = abs(s + sums[j] - target)
+					if best is None or distance < best[0]:
+						best = (distance, m | right[need][j][1])
+			if best[0] == 0:
+				break
+
+	return [i for i in range(len(values)) if best[1] >> i & 1]
+
+
+def heuristic(values, team_len):
+	""" Good split in O(n log n) per local search pass, with no optimality guarantee """
+	n = len(values)
+	if team_len in (n // 2, (n + 1) // 2):
+		team = _bldm(values, team_len)
+	else:
+		team = _greedy(values, team_len)
+	return _local_search(values, team)
+
+
+def _bldm(values, team_len):
+	""" Balanced largest differencing method, teams of equal (+-1) size """
+	items = list(range(len(values)))
+	dummy = None
+	if len(items) % 2:
+		# pad with a zero player, the team containing it gets the smaller size
+		dummy = len(values)
+		items.append(dummy)
+	rating = (lambda i: 0 if i == dummy else values[i])
+	items.sort(key=rating, reverse=True)
+
+	# each pair of neighbours goes to opposite teams, then the partial splits are merged by largest difference
+	heap = []
+	for n in range(0, len(items), 2):
+		a, b = items[n], items[n + 1]
+		heap.append((-(rating(a) - rating(b)), n, [a], [b]))
+	heapify(heap)
+	while len(heap) > 1:
+		d1, n, big1, small1 = heappop(heap)
+		d2, _, big2, small2 = heappop(heap)
+		heappush(heap, (d1 - d2, n, big1 + small2, small1 + big2))
+
+	_, _, team, rest = heap[0]
+	if dummy is not None:
+		if dummy in rest:
+			team, rest = rest, team
+		team.remove(dummy)
+		if len(team) != team_len:
+			team, rest = rest, team
+	elif len(team) != team_len:
+		team, rest = rest, team
+	return team
+
+
+def _greedy(values, team_len):
+	""" Give the next highest rated player to the weaker side while it has free slots """
+	team, rest = [], []
+	team_sum = rest_sum = 0
+	rest_len = len(values) - team_len
+	for i in sorted(range(len(values)), key=lambda i: values[i], reverse=True):
+		if len(rest) == rest_len or (len(team) < team_len and team_sum <= rest_sum):
+			team.append(i)
+			team_sum += values[i]
+		else:
+			rest.append(i)
+			rest_sum += values[i]
+	return team
+
+
+def _local_search(values, team):
+	""" Apply the best single player swap between the sides until none of them improves the diff """
+	chosen = set(team)
+	team = list(chosen)
+	rest = [i for i in range(len(values)) if i not in chosen]
+	diff = 2 * sum(values[i] for i in team) - sum(values)
+
+	while diff and team and rest:
+		rest.sort(key=lambda i: values[i])
+		rest_values = [values[i] for i in rest]
+		best = None  # (new_diff, team_pos, rest_pos)
+		for ti, t in enumerate(team):
+			# swapping t with r changes the diff by 2*(r-t), so the ideal r is t - diff/2
+			ri = bisect_left(rest_values, values[t] - diff / 2)
+			for rj in (ri - 1, ri):
+				if 0 <= rj < len(rest):
+					new_diff = diff + 2 * (rest_values[rj] - values[t])
+					if abs(new_diff) < abs(diff) and (best is None or abs(new_diff) < abs(best[0])):
+						best = (new_diff, ti, rj)
+		if best is None:
+			break
+		diff, ti, rj = best
+		team[ti], rest[rj] = rest[rj], team[ti]
+
+	return sorted(team)
@@ -29,7 +29,7 @@ class CheckIn:
 			self.m.states.append(self.m.READY_CHECK)
 
 	async def think(self, frame_time):
-		if frame_time > self.m.start_time + self.timeout:
+		if frame_time >= self.m.start_time + self.timeout:
 			ctx = bot.SystemContext(self.m.qc)
 			if self.allow_discard:
 				await self.abort_timeout(ctx)
@@ -55,6 +55,7 @@ class CheckIn:
 		if len(self.discarded_players) and len(self.discarded_players) == len(not_ready):
 			if self.message:
 				bot.waiting_reactions.pop(self.message.id, None)
+				bot.editor.forget(self.message.id)
 				try:
 					await self.message.delete()
 				except DiscordException:
@@ -68,7 +69,7 @@ class CheckIn:
 				self.m.gt("Reverting {queue} to the gathering stage...").format(queue=f"**{self.m.queue.name}**")
 			)))
 
-			bot.active_matches.remove(self.m)
+			bot.active_matches.discard(self.m)
 			await self.m.queue.revert(
 				ctx,
 				list(self.discarded_players),
@@ -78,7 +79,7 @@ class CheckIn:
 
 		if len(not_ready):
 			try:
-				await self.message.edit(content=None, embed=self.m.embeds.check_in(not_ready))
+				await bot.editor.edit(self.message, content=None, embed=self.m.embeds.check_in(not_ready))
 			except DiscordException:
 				pass
 		else:
@@ -86,6 +87,7 @@ class CheckIn:
 
 	async def finish(self, ctx):
 		bot.waiting_reactions.pop(self.message.id)
+		bot.editor.forget(self.message.id)
 		self.ready_players = set()
 		await self.message.delete()
 
@@ -132,25 +134,27 @@ class CheckIn:
 
 	async def abort_member(self, ctx, member):
 		bot.waiting_reactions.pop(self.message.id)
+		bot.editor.forget(self.message.id)
 		await self.message.delete()
 		await ctx.notice("\n".join((
 			self.m.gt("{member} has aborted the check-in.").format(member=f"<@{member.id}>"),
 			self.m.gt("Reverting {queue} to the gathering stage...").format(queue=f"**{self.m.queue.name}**")
 		)))
 
-		bot.active_matches.remove(self.m)
+		bot.active_matches.discard(self.m)
 		await self.m.queue.revert(ctx, [member], [m for m in self.m.players if m != member])
 
 	async def abort_timeout(self, ctx):
 		not_ready = [m for m in self.m.players if m not in self.ready_players]
 		if self.message:
 			bot.waiting_reactions.pop(self.message.id, None)
+			bot.editor.forget(self.message.id)
 			try:
 				await self.message.delete()
 			except DiscordException:
 				pass
 
-		bot.active_matches.remove(self.m)
+		bot.active_matches.discard(self.m)
 
 		await ctx.notice("\n".join((
 			self.m.gt("{members} was not ready in time.").format(members=join_and([m.mention for m in not_ready])),
@@ -22,6 +22,7 @@ class Draft:
 		self.pick_order = [self.pick_steps[i] for i in pick_order] if pick_order else []
 		self.captains_role_id = captains_role_id
 		self.message = None
+		self.printed = None  # payload hash of the last printed draft embed
 		self.sub_queue = []
 		# Get draft timeout from match config, default to 30 seconds if not set
 		self.timeout = self.m.cfg.get('draft_timeout', 30)
@@ -43,8 +44,14 @@ class Draft:
 		await self.refresh(ctx)
 
 	async def print(self, ctx):
+		embed = self.m.embeds.draft()
+		# background refreshes (auto-pick) would repeat the embed which was just printed
+		payload = bot.editor.payload_hash(embed=embed)
+		if isinstance(ctx, bot.SystemContext) and payload == self.printed:
+			return
+		self.printed = payload
 		try:
-			await ctx.notice(embed=self.m.embeds.draft())
+			await ctx.notice(embed=embed)
 		except DiscordException:
 			pass
 
@@ -86,6 +93,13 @@ class Draft:
 		team.insert(0, author)
 		await self.print(ctx)
 
+	def next_think_at(self):
+		if not len(self.m.teams[2]) or len(self.m.teams[0]) + len(self.m.teams[1]) - 2 >= len(self.pick_order):
+			return 0
+		if not self.auto_pick_warning_sent:
+			return self.last_pick_time + self.timeout - self.warning_time
+		return self.last_pick_time + self.timeout
+
 	async def think(self, frame_time):
 		if self.m.state != self.m.DRAFT:
 			logger.debug(f"Match {self.m.id} not in draft state, skipping draft think")
@@ -272,6 +286,7 @@ class Draft:
 		# Reset timers
 		self.last_pick_time = int(time.time())
 		self.auto_pick_warning_sent = False
+		self.m.schedule()
 		
 		# Log final team states
 		logger.info(f"Final team states after pick:")
@@ -291,6 +306,7 @@ class Draft:
 			old_team.remove(player)
 		else:
 			self.m.players.append(player)
+			bot.active_matches.update_players(self.m)
 			self.m.ratings = {
 				p['user_id']: p['rating'] for p in await self.m.qc.rating.get_players((p.id for p in self.m.players))
 			}
@@ -320,6 +336,7 @@ class Draft:
 		team[team.index(player1)] = player2
 		self.m.players.remove(player1)
 		self.m.players.append(player2)
+		bot.active_matches.update_players(self.m)
 		if player1 in self.sub_queue:
 			self.sub_queue.remove(player1)
 		self.m.ratings = {
@@ -329,9 +346,9 @@ class Draft:
 		await bot.remove_players(player2, reason="pickup started")
 
 		if self.m.state == self.m.READY_CHECK:
-			await self.m.check_in.refresh()
+			await self.m.check_in.refresh(ctx)
 		elif self.m.state == self.m.MAP_VOTE:
-			await self.m.map_vote.refresh()
+			await self.m.map_vote.refresh(ctx)
 		elif self.m.state == self.m.WAITING_REPORT:
 			await ctx.notice(embed=self.m.embeds.final_message())
 		else:
@@ -60,7 +60,7 @@ class MapVote:
 
 	async def refresh(self, ctx):
 		try:
-			await self.message.edit(content=None, embed=self.m.embeds.map_vote(self.maps, self.map_votes))
+			await bot.editor.edit(self.message, content=None, embed=self.m.embeds.map_vote(self.maps, self.map_votes))
 		except DiscordException:
 			pass
 
@@ -88,6 +88,7 @@ class MapVote:
 		
 		# Clean up the message
 		if self.message:
+			bot.editor.forget(self.message.id)
 			try:
 				await self.message.delete()
 			except DiscordException:
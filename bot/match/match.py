@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 from time import time
-from itertools import combinations
 import random
 from nextcord import DiscordException
 import traceback
@@ -19,6 +18,7 @@ from .check_in import CheckIn
 from .draft import Draft
 from .embeds import Embeds
 from .map_vote import MapVote
+from .balance import balance
 
 
 class Match:
@@ -88,6 +88,7 @@ class Match:
 		match.states = new_states
 
 		bot.active_matches.append(match)
+		match.schedule()
 
 	@classmethod
 	async def fake_ranked_match(cls, ctx, queue, qc, winners, losers, draw=False, **kwargs):
@@ -140,7 +141,10 @@ class Match:
 
 		# Create the Match object
 		ratings = {p['user_id']: p['rating'] for p in await qc.rating.get_players((p.id for p in data['players']))}
-		match_id = await bot.stats.next_match()
+		# keep the id the match was announced with, states saved by older versions may have none
+		match_id = data.get('match_id')
+		if match_id is None:
+			match_id = await bot.stats.next_match()
 		match = cls(match_id, queue, qc, data['players'], ratings, **data['cfg'])
 
 		# Set state data
@@ -155,6 +159,7 @@ class Match:
 			await match.check_in.start(ctx)  # Spawn a new check_in message
 
 		bot.active_matches.append(match)
+		match.schedule()
 
 	def __init__(self, match_id, queue, qc, players, ratings, **cfg):
 
@@ -236,11 +241,9 @@ class Match:
 			self.teams[2].set([p for p in self.players if p not in self.captains])
 		elif pick_teams == "matchmaking":
 			team_len = min(self.cfg['team_size'], int(len(self.players)/2))
-			best_rating = sum(self.ratings.values())/2
-			best_team = min(
-				combinations(self.players, team_len),
-				key=lambda team: abs(sum([self.ratings[m.id] for m in team])-best_rating)
-			)
+			team, diff = balance([self.ratings[p.id] for p in self.players], team_len)
+			best_team = [self.players[i] for i in team]
+			logger.debug(f"Match {self.id} teams balanced with rating difference {diff}")
 			self.teams[0].set(self.sort_players(
 				best_team[:self.cfg['team_size']]
 			))
@@ -253,6 +256,44 @@ class Match:
 			self.teams[1].set([p for p in self.players if p not in self.teams[0]][:self.cfg['team_size']])
 			self.teams[2].set([p for p in self.players if p not in [*self.teams[0], *self.teams[1]]])
 
+	def next_think_at(self):
+		""" Return the time the current state needs think() to run next """
+		if self.state == self.INIT:
+			return 0
+		elif self.state == self.READY_CHECK:
+			return self.start_time + self.check_in.timeout
+		elif self.state == self.MAP_VOTE:
+			return self.map_vote.start_time + self.map_vote.timeout
+		elif self.state == self.DRAFT:
+			return self.draft.next_think_at()
+		return self.start_time + self.lifetime
+
+	def schedule(self, not_before=0):
+		if self in bot.active_matches:
+			bot.scheduler.set(('match', self.id), max(self.next_think_at(), not_before), self.scheduled_think)
+
+	async def scheduled_think(self, frame_time):
+		if self not in bot.active_matches:
+			return
+
+		try:
+			await self.think(frame_time)
+		except Exception as e:
+			log.error("\n".join([
+				f"Error during Match.think() for match_id: {self.id}.",
+				f"Error: {str(e)}. Traceback:\n{traceback.format_exc()}=========="
+			]))
+			try:
+				log.info(f"Attempting to cancel match {self.id} due to error in its scheduled think().")
+				await self.cancel(bot.SystemContext(self.qc))
+			except Exception as cancel_e:
+				log.error(f"Error during attempt to cancel match {self.id} after think error: {str(cancel_e)}\n{traceback.format_exc()}==========")
+				# If cancellation itself fails, as a last resort, remove it directly.
+				bot.active_matches.discard(self)
+
+		# think() may leave the state as it is, do not come back more often than once a second then
+		self.schedule(not_before=frame_time + 1)
+
 	async def think(self, frame_time):
 		try:
 			logger.debug(f"Match {self.id} thinking in state {self.state}")
@@ -268,7 +309,7 @@ class Match:
 			elif self.state == self.DRAFT:
 				logger.debug(f"Match {self.id} in DRAFT state")
 				await self.draft.think(frame_time)
-			elif frame_time > self.lifetime + self.start_time:
+			elif frame_time >= self.lifetime + self.start_time:
 				logger.warning(f"Match {self.id} has timed out")
 				ctx = bot.SystemContext(self.qc)
 				try:
@@ -336,6 +377,7 @@ class Match:
 			elif self.state == self.WAITING_REPORT:
 				logger.debug(f"Match {self.id} starting waiting report")
 				await self.start_waiting_report(ctx)
+			self.schedule()
 			
 		except Exception as e:
 			logger.error(f"Error during state transition in match {self.id}: {str(e)}\n{traceback.format_exc()}")
@@ -349,6 +391,7 @@ class Match:
 		if len(self.teams[2]):
 			for p in self.teams[2]:
 				self.players.remove(p)
+			bot.active_matches.update_players(self)
 			await ctx.notice(self.gt("{players} were removed from the match.").format(
 				players=join_and([m.mention for m in self.teams[2]])
 			))
@@ -479,8 +522,7 @@ class Match:
 
 	async def finish_match(self, ctx):
 		# Match is finished, so remove from active matches
-		if self in bot.active_matches: 
-			bot.active_matches.remove(self)
+		bot.active_matches.discard(self)
 
 		self.queue.last_maps += self.maps
 		self.queue.last_maps = self.queue.last_maps[-len(self.maps)*self.queue.cfg.map_cooldown:]
@@ -526,8 +568,7 @@ class Match:
 				pass
 
 			# Remove from active matches
-			if self in bot.active_matches:
-				bot.active_matches.remove(self)
+			bot.active_matches.discard(self)
 
 			# Clean up any remaining references
 			self.check_in = None
@@ -538,11 +579,9 @@ class Match:
 		except Exception as e:
 			log.error(f"Error during match {self.id} cancellation: {str(e)}\n{traceback.format_exc()}")
 			# Ensure match is removed from active matches even if cleanup fails
-			if self in bot.active_matches:
-				bot.active_matches.remove(self)
+			bot.active_matches.discard(self)
 
 	async def add_member(self, ctx, member):
-		for match in bot.active_matches:
-			if member in match.players:
-				return bot.Qr.Duplicate
+		if bot.active_matches.by_player(member.id) is not None:
+			return bot.Qr.Duplicate
 		# ...rest of your add_member logic...
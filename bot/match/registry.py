@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+
+class MatchRegistry:
+	"""
+	Active matches indexed by match id, player and queue channel.
+	Iterates like the plain list it replaces, in the order the matches were added.
+	Call update_players() after changing the players of a registered match.
+	"""
+
+	def __init__(self):
+		self._matches = dict()  # {match_id: Match()}
+		self._players = dict()  # {user_id: Match()}
+		self._channels = dict()  # {channel_id: {match_id: Match()}}
+		self._indexed = dict()  # {match_id: set(user_id)}
+
+	def __iter__(self):
+		return iter(list(self._matches.values()))
+
+	def __len__(self):
+		return len(self._matches)
+
+	def __contains__(self, match):
+		return self._matches.get(match.id) is match
+
+	def append(self, match):
+		self._matches[match.id] = match
+		self._channels.setdefault(match.qc.id, dict())[match.id] = match
+		self._indexed[match.id] = set()
+		self.update_players(match)
+
+	def remove(self, match):
+		if match not in self:
+			raise ValueError("Match is not registered.")
+
+		self._matches.pop(match.id)
+		for user_id in self._indexed.pop(match.id):
+			if self._players.get(user_id) is match:
+				self._players.pop(user_id)
+		channel = self._channels[match.qc.id]
+		channel.pop(match.id)
+		if not len(channel):
+			self._channels.pop(match.qc.id)
+
+	def discard(self, match):
+		if match in self:
+			self.remove(match)
+
+	def update_players(self, match):
+		if match not in self:
+			return
+
+		players = set((p.id for p in match.players))
+		indexed = self._indexed[match.id]
+		for user_id in indexed - players:
+			if self._players.get(user_id) is match:
+				self._players.pop(user_id)
+		for user_id in players:
+			self._players[user_id] = match
+		self._indexed[match.id] = players
+
+	def get(self, match_id):
+		return self._matches.get(match_id)
+
+	def by_player(self, user_id):
+		return self._players.get(user_id)
+
+	def by_channel(self, channel_id):
+		return list(self._channels.get(channel_id, dict()).values())
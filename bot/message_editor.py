@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import time
+import json
+import asyncio
+import traceback
+
+from nextcord import NotFound
+from core.console import log
+
+
+class MessageEditor:
+	"""
+	Shared layer for editing the frequently refreshed messages (queue embeds, check-in, map vote).
+	Remembers the hash of the last payload sent to each message and drops the identical edits.
+	The first edit goes out immediately, the following ones within WINDOW seconds
+	are merged into a single trailing edit with the latest payload.
+	"""
+
+	WINDOW = 1.5  # seconds
+
+	def __init__(self):
+		self.hashes = dict()  # {message_id: payload hash}
+		self.last_edit = dict()  # {message_id: time of the last sent edit}
+		self.pending = dict()  # {message_id: (message, kwargs, hash, on_error)}
+		self.tasks = dict()  # {message_id: Task()}
+		self.stats = dict(requested=0, sent=0, unchanged=0, coalesced=0, failed=0)
+
+	@staticmethod
+	def payload_hash(**kwargs):
+		""" Hash the edit arguments, the embed footer is ignored as it only carries the 'last updated' time """
+		payload = dict()
+		for key, value in kwargs.items():
+			if key == 'embed' and value is not None:
+				value = {k: v for k, v in value.to_dict().items() if k not in ('footer', 'timestamp')}
+			elif key == 'view' and value is not None:
+				value = value.to_components()
+			payload[key] = value
+		return hash(json.dumps(payload, sort_keys=True, default=str))
+
+	async def edit(self, message, on_error=None, **kwargs):
+		"""
+		Edit the message unless it already shows the payload, errors of the immediate edits are raised.
+		The coalesced trailing edit runs after the caller returned, its error is passed to on_error(exception).
+		"""
+		self.stats['requested'] += 1
+		h = self.payload_hash(**kwargs)
+
+		if message.id in self.pending:
+			self.stats['coalesced'] += 1
+			self.pending[message.id] = (message, kwargs, h, on_error)
+			return
+		if self.hashes.get(message.id) == h:
+			self.stats['unchanged'] += 1
+			return
+
+		delay = self.last_edit.get(message.id, 0) + self.WINDOW - time.time()
+		if delay > 0:
+			self.pending[message.id] = (message, kwargs, h, on_error)
+			self.tasks[message.id] = asyncio.create_task(self._trailing_edit(message.id, delay))
+			return
+
+		await self._send(message, kwargs, h)
+
+	async def _send(self, message, kwargs, h):
+		self.last_edit[message.id] = time.time()
+		try:
+			await message.edit(**kwargs)
+		except Exception as e:
+			self.stats['failed'] += 1
+			self.hashes.pop(message.id, None)
+			if isinstance(e, NotFound):  # a deleted message, the caller posts a new one
+				self.last_edit.pop(message.id, None)
+			raise
+		self.stats['sent'] += 1
+		self.hashes[message.id] = h
+
+	async def _trailing_edit(self, message_id, delay):
+		on_error = None
+		try:
+			await asyncio.sleep(delay)
+			message, kwargs, h, on_error = self.pending.pop(message_id)
+			if self.hashes.get(message_id) == h:
+				self.stats['unchanged'] += 1
+			else:
+				await self._send(message, kwargs, h)
+		except asyncio.CancelledError:
+			pass
+		except Exception as e:
+			# the handler may forget() the message, which must not cancel this task
+			self.tasks.pop(message_id, None)
+			if on_error is None:
+				log.error(f"Failed to edit message {message_id}: {str(e)}\n{traceback.format_exc()}")
+			else:
+				try:
+					await on_error(e)
+				except Exception as e:
+					log.error(f"Failed to handle edit error of message {message_id}: {str(e)}\n{traceback.format_exc()}")
+		finally:
+			self.tasks.pop(message_id, None)
+
+	def forget(self, message_id):
+		""" Drop everything known about a deleted message """
+		if (task := self.tasks.pop(message_id, None)) is not None:
+			task.cancel()
+		self.pending.pop(message_id, None)
+		self.hashes.pop(message_id, None)
+		self.last_edit.pop(message_id, None)
+
+	def summary(self):
+		saved = self.stats['unchanged'] + self.stats['coalesced']
+		return "Message edits: {requested} requested, {sent} sent, {saved} saved ({unchanged} unchanged, {coalesced} coalesced), {failed} failed.".format(
+			saved=saved, **self.stats
+		)
+
+
+editor = MessageEditor()
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import re
 import asyncio
+import itertools
 from enum import Enum
 from nextcord import Forbidden
 
@@ -10,7 +11,10 @@ from core.utils import join_and, seconds_to_str, get_nick
 from core.database import db
 
 import bot
-from bot.stats.rating import FlatRating, Glicko2Rating, TrueSkillRating
+from bot.stats.rating import FlatRating, Glicko2Rating, TrueSkillRating, SCORE_MODES
+from bot.stats.leaderboard import leaderboards
+
+_ranks_versions = itertools.count()  # unique across the channel objects, a re-enabled channel never reuses a version
 
 MAX_EXPIRE_TIME = 12*60*60
 MAX_PROMOTION_DELAY = 12*60*60
@@ -239,6 +243,20 @@ class QueueChannel:
 				default=0,
 				on_change=bot.update_rating_system
 			),
+			Variables.OptionVar(
+				"rating_score_mode",
+				display="Rating score mode",
+				section="Rating",
+				description="\n".join([
+					"How match scores are rated.",
+					"points: every scored point is rated as a separate win (legacy).",
+					"margin: the match is rated once, scaled by log2(1 + score difference)."
+				]),
+				options=SCORE_MODES,
+				default="points",
+				notnull=True,
+				on_change=bot.update_rating_system
+			),
 			Variables.IntVar(
 				"rating_decay",
 				display="Rating decay",
@@ -283,6 +301,7 @@ class QueueChannel:
 			),
 			VariableTable(
 				'ranks', display="Rating ranks", section="Leaderboard",
+				on_change=bot.update_ranks,
 				variables=[
 					Variables.StrVar("rank", default="〈E〉"),
 					Variables.IntVar("rating", default=1200, description="The rank will be given on this rating or higher."),
@@ -331,12 +350,14 @@ class QueueChannel:
 			win_scale=self.cfg.rating_win_scale,
 			draw_bonus=self.cfg.rating_draw_bonus,
 			ws_boost=self.cfg.rating_ws_boost,
-			ls_boost=self.cfg.rating_ls_boost
+			ls_boost=self.cfg.rating_ls_boost,
+			score_mode=self.cfg.rating_score_mode
 		)
 		self.queues = []
 		self.last_promote = 0
 		self.queue_views = {}  # Dictionary to store views for each queue
 		self.queue_embeds = {}  # Dictionary to store message IDs for each queue
+		self.ranks_version = next(_ranks_versions)  # changes with the ranks, rendered leaderboard pages are keyed on it
 
 	async def update_info(self, text_channel):
 		self.cfg.cfg_info['channel_name'] = text_channel.name
@@ -348,6 +369,9 @@ class QueueChannel:
 	def update_lang(self):
 		self.gt = locales[self.cfg.lang]
 
+	def update_ranks(self):
+		self.ranks_version = next(_ranks_versions)
+
 	def update_rating_system(self):
 		self.rating = self.rating_names[self.cfg.rating_system](
 			channel_id=(self.cfg.rating_channel or self).id,
@@ -359,7 +383,8 @@ class QueueChannel:
 			win_scale=self.cfg.rating_win_scale,
 			draw_bonus=self.cfg.rating_draw_bonus,
 			ws_boost=self.cfg.rating_ws_boost,
-			ls_boost=self.cfg.rating_ls_boost
+			ls_boost=self.cfg.rating_ls_boost,
+			score_mode=self.cfg.rating_score_mode
 		)
 
 	async def apply_rating_decay(self):
@@ -367,11 +392,15 @@ class QueueChannel:
 			await self.rating.apply_decay(self.cfg.rating_decay or 0, self.cfg.rating_deviation_decay or 0, self._ranks_table)
 
 	@property
-	def _ranks_table(self):
+	def _ranks_channel(self):
+		""" The queue channel which ranks are used, the rating channel if it is set """
 		if self.cfg.rating_channel:
-			return (bot.queue_channels.get(self.cfg.rating_channel.id) or self).cfg.ranks
-		else:
-			return self.cfg.ranks
+			return bot.queue_channels.get(self.cfg.rating_channel.id) or self
+		return self
+
+	@property
+	def _ranks_table(self):
+		return self._ranks_channel.cfg.ranks
 
 	async def new_queue(self, ctx, name, size, kind):
 		kind.validate_name(name)
@@ -396,7 +425,8 @@ class QueueChannel:
 
 	async def remove_members(self, *members, ctx=None, reason=None, highlight=False, silent=False):
 		affected = set()
-		for q in (q for q in self.queues if q.length):
+		queues = set((q for m in members for q in bot.member_queues.get(m.id, ()) if q.qc is self))
+		for q in queues:
 			affected.update(q.pop_members(*members))
 
 		if len(affected):
@@ -451,19 +481,23 @@ class QueueChannel:
 		return below[0]
 
 	async def get_lb(self):
-		data = await db.select(
-			['user_id', 'nick', 'rating', 'deviation', 'wins', 'losses', 'draws', 'streak', 'is_hidden'], 'qc_players',
-			where={'channel_id': self.rating.channel_id}, order_by="rating"
-		)
-		return [
-			i for i in data
-			if i['rating'] is not None
-			and not i['is_hidden']
-			and not (self.cfg.lb_min_matches and self.cfg.lb_min_matches > sum((i['wins'], i['losses'], i['draws'])))
-		]
+		""" Return the Leaderboard of the rating channel, kept up to date by the players cache """
+		return await leaderboards.get(self.rating.channel_id, self.cfg.lb_min_matches)
 
 	async def update_rating_roles(self, *members):
-		asyncio.create_task(self._update_rating_roles(*members))
+		""" Queue the rank roles and rating nicks of the members, see RoleSync """
+		data = await self.rating.get_players((i.id for i in members))
+		ratings = {i['user_id']: i['rating'] for i in data}
+		all_roles = [i['role'] for i in self._ranks_table if i is not None]
+
+		for member in members:
+			nick = None
+			if self.cfg.rating_nicks:
+				if member.nick and (x := re.match(r"^\[\d+\] (.+)", member.nick)):
+					nick = f"[{ratings[member.id]}] " + x.group(1)
+				else:
+					nick = f"[{ratings[member.id]}] " + (member.nick or member.name)
+			bot.role_sync.submit(member, self.rating_rank(ratings[member.id])['role'], all_roles, nick)
 
 	async def update_expire(self, member):
 		""" update expire timer on !add command """
@@ -474,30 +508,6 @@ class QueueChannel:
 		elif self.cfg.expire_time and personal_expire is None:
 			bot.expire.set(self, member, self.cfg.expire_time)
 
-	async def _update_rating_roles(self, *members):
-		table = self._ranks_table
-		data = await self.rating.get_players((i.id for i in members))
-		roles = {i['user_id']: self.rating_rank(i['rating'])['role'] for i in data}
-		ratings = {i['user_id']: i['rating'] for i in data}
-		all_roles = [i['role'] for i in table if i is not None]
-
-		for member in members:
-			to_delete = [role for role in all_roles if role != roles[member.id] and role in member.roles]
-			try:
-				if len(to_delete):
-					await member.remove_roles(*to_delete, reason="Rank update.")
-				if roles[member.id] is not None and roles[member.id] not in member.roles:
-					await member.add_roles(roles[member.id], reason="Rank update.")
-				if self.cfg.rating_nicks:
-					if member.nick and (x := re.match(r"^\[\d+\] (.+)", member.nick)):
-						await member.edit(nick=f"[{ratings[member.id]}] " + x.group(1))
-					else:
-						await member.edit(nick=f"[{ratings[member.id]}] " + (member.nick or member.name))
-			except Forbidden:
-				pass
-
-			await asyncio.sleep(1)
-
 	async def queue_started(self, ctx, members, message=None, silent=False):
 		await self.remove_members(*members, ctx=ctx, silent=silent)
 
@@ -531,7 +541,7 @@ class QueueChannel:
 				duration=seconds_to_str(ban_left)
 			))
 
-		if any((member in m.players for m in bot.active_matches)):
+		if bot.active_matches.by_player(member.id) is not None:
 			raise bot.Exc.InMatchError(self.gt("You are already in an active match."))
 
 		if queue:
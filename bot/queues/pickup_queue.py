@@ -323,7 +323,7 @@ class PickupQueue:
 		if None in players:
 			raise bot.Exc.ValueError(f"Error fetching guild members.")
 
-		q.queue = players
+		q._set_queue(players)
 		if q.length and q not in bot.active_queues:
 			bot.active_queues.append(q)
 
@@ -383,8 +383,22 @@ class PickupQueue:
 			await ctx.ignore(ctx.qc.gt("Sending **{queue}** promotion...").format(queue=self.name))
 			await ctx.notice(promotion_msg)
 
+	def _set_queue(self, players):
+		""" Replace the queue players keeping the bot.member_queues index up to date """
+		for m in self.queue:
+			self._unindex(m)
+		self.queue = list(players)
+		for m in self.queue:
+			bot.member_queues.setdefault(m.id, set()).add(self)
+
+	def _unindex(self, member):
+		if (queues := bot.member_queues.get(member.id)) is not None:
+			queues.discard(self)
+			if not len(queues):
+				bot.member_queues.pop(member.id)
+
 	async def reset(self):
-		self.queue = []
+		self._set_queue([])
 		if self in bot.active_queues:
 			bot.active_queues.remove(self)
 
@@ -407,8 +421,9 @@ class PickupQueue:
 		if len(self.queue) >= self.cfg.size:
 			return bot.Qr.QueueFull
 
-		if member not in self.queue:
+		if not self.is_added(member):
 			self.queue.append(member)
+			bot.member_queues.setdefault(member.id, set()).add(self)
 
 			if self not in bot.active_queues:
 				bot.active_queues.append(self)
@@ -422,13 +437,16 @@ class PickupQueue:
 			return bot.Qr.Duplicate
 
 	def is_added(self, member):
-		return member in self.queue
+		return self in bot.member_queues.get(member.id, ())
 
 	def pop_members(self, *members):
-		ids = [m.id for m in members]
+		ids = [m.id for m in members if self.is_added(m)]
+		if not len(ids):
+			return []
 		members = [member for member in self.queue if member.id in ids]
 		for m in members:
 			self.queue.remove(m)
+			self._unindex(m)
 		return members
 
 	async def start(self, ctx, silent=False):
@@ -490,18 +508,19 @@ class PickupQueue:
 
 	async def revert(self, ctx, not_ready, ready):
 		old_players = list(self.queue)
-		self.queue = list(ready)
+		self._set_queue(ready)
 		if self.cfg.autostart:
 			while len(self.queue) < self.cfg.size and len(old_players):
 				self.queue.append(old_players.pop(0))
+			self._set_queue(self.queue)
 			if len(self.queue) >= self.cfg.size:
 				await self.start(ctx)
-				self.queue = list(old_players)
+				self._set_queue(old_players)
 			else:
 				for p in ready:
 					await self.qc.update_expire(p)
 		else:
-			self.queue = list(ready) + old_players
+			self._set_queue(list(ready) + old_players)
 			for p in ready:
 				await self.qc.update_expire(p)
 
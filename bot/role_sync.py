@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import traceback
+from nextcord import Forbidden, HTTPException, NotFound
+
+from core.console import log
+
+
+class RoleSync:
+	"""
+	Applies the rank roles and rating nicks with a single worker per guild.
+	Only the latest desired state of each member is kept, so updates queued for a member before
+	the worker gets to it are merged, and members already having the desired roles and nick are skipped.
+	The discord client waits on the rate limit buckets itself, when a request still
+	gets a 429 response the worker sleeps for its Retry-After and tries again.
+	"""
+
+	MAX_RETRIES = 3
+
+	def __init__(self):
+		self.pending = dict()  # {guild_id: {member_id: (member, role, remove_roles, nick)}}
+		self.workers = dict()  # {guild_id: Task()}
+		self.stats = dict(requested=0, applied=0, unchanged=0, coalesced=0, failed=0, rate_limited=0)
+
+	def submit(self, member, role, remove_roles, nick=None):
+		"""
+		Queue the desired state of the member: the rank role to have (or None), other rank roles to
+		remove and the nick to set (None keeps the current one).
+		"""
+		self.stats['requested'] += 1
+		pending = self.pending.setdefault(member.guild.id, dict())
+		if member.id in pending:
+			self.stats['coalesced'] += 1
+		pending[member.id] = (member, role, [r for r in remove_roles if r is not None and r != role], nick)
+
+		if member.guild.id not in self.workers:
+			self.workers[member.guild.id] = asyncio.create_task(self._worker(member.guild.id))
+
+	async def _worker(self, guild_id):
+		try:
+			while len(pending := self.pending.get(guild_id, {})):
+				member_id = next(iter(pending))
+				await self._apply(*pending.pop(member_id))
+		finally:
+			self.workers.pop(guild_id, None)
+			if guild_id in self.pending and not len(self.pending[guild_id]):
+				self.pending.pop(guild_id)
+
+	@staticmethod
+	def retry_after(exc):
+		try:
+			return float(exc.response.headers.get('Retry-After', 1))
+		except (AttributeError, TypeError, ValueError):
+			return 1.0
+
+	async def _apply(self, member, role, remove_roles, nick):
+		for attempt in range(self.MAX_RETRIES):
+			# the cached member has the roles and nick as of the latest gateway events
+			member = member.guild.get_member(member.id) or member
+			to_remove = [r for r in remove_roles if r in member.roles]
+			to_add = role is not None and role not in member.roles
+			to_rename = nick is not None and nick != member.nick
+			if not (len(to_remove) or to_add or to_rename):
+				if attempt == 0:
+					self.stats['unchanged'] += 1
+				return
+
+			try:
+				if len(to_remove):
+					await member.remove_roles(*to_remove, reason="Rank update.")
+				if to_add:
+					await member.add_roles(role, reason="Rank update.")
+				if to_rename:
+					await member.edit(nick=nick)
+			except (Forbidden, NotFound):
+				self.stats['failed'] += 1
+				return
+			except HTTPException as e:
+				if e.status != 429 or attempt == self.MAX_RETRIES - 1:
+					self.stats['failed'] += 1
+					log.error(f"Failed to update rank of member {member.id}: {str(e)}")
+					return
+				self.stats['rate_limited'] += 1
+				await asyncio.sleep(self.retry_after(e))
+			except Exception as e:
+				self.stats['failed'] += 1
+				log.error(f"Failed to update rank of member {member.id}: {str(e)}\n{traceback.format_exc()}")
+				return
+			else:
+				self.stats['applied'] += 1
+				return
+
+	def summary(self):
+		return "Rank updates: {requested} requested, {applied} applied, {unchanged} unchanged, {coalesced} coalesced, {failed} failed, {rate_limited} rate limited.".format(
+			**self.stats
+		)
+
+
+role_sync = RoleSync()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import time
+import asyncio
+import traceback
+
+from core.console import log
+from core.timers import DeadlineHeap
+
+
+class Scheduler:
+	"""
+	Runs background jobs at their deadlines instead of polling them every second.
+	A job is a coroutine function taking frame_time, registered under a unique key,
+	setting the same key again moves the deadline.
+	"""
+
+	def __init__(self):
+		self.deadlines = DeadlineHeap()  # {key: (at, func)}
+		self.wakeup = asyncio.Event()
+		self.task = None
+
+	def set(self, key, at, func):
+		if self.deadlines.set(key, at, func):
+			self.wakeup.set()  # the runner may be sleeping until a later deadline
+
+	def cancel(self, key):
+		self.deadlines.remove(key)
+
+	def get(self, key):
+		""" Return the deadline of the key or None """
+		if (entry := self.deadlines.get(key)) is None:
+			return None
+		return entry[0]
+
+	def start(self):
+		if self.task is None:
+			self.task = asyncio.create_task(self.run())
+
+	async def stop(self):
+		if self.task is not None:
+			self.task.cancel()
+			try:
+				await self.task
+			except asyncio.CancelledError:
+				pass
+			self.task = None
+
+	async def run(self):
+		while True:
+			self.wakeup.clear()
+			frame_time = time.time()
+			# one job at a time, so a job cancelling or moving another due job is seen by peek()
+			while (top := self.deadlines.peek()) is not None and top[0] <= frame_time:
+				at, key, func = self.deadlines.pop()
+				try:
+					await func(frame_time)
+				except Exception as e:
+					log.error('Error running scheduled job {}: {}\n{}'.format(key, str(e), traceback.format_exc()))
+
+			if (top := self.deadlines.peek()) is None:
+				await self.wakeup.wait()
+			else:
+				try:
+					await asyncio.wait_for(self.wakeup.wait(), timeout=max(0, top[0] - time.time()))
+				except asyncio.TimeoutError:
+					pass
+
+
+scheduler = Scheduler()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import csv
+import gzip
+import json
+import asyncio
+import tempfile
+
+from core.database import db
+from core.DBAdapters.common import build_select
+
+FORMATS = ('csv', 'jsonl')
+CHUNK = 2000
+
+# {name: (table, columns, ordering column)}, the rows are filtered by channel_id
+TABLES = dict(
+	matches=('qc_matches', (
+		'match_id', 'channel_id', 'queue_id', 'queue_name', 'at', 'alpha_name', 'beta_name',
+		'ranked', 'winner', 'alpha_score', 'beta_score', 'maps'
+	), 'match_id'),
+	player_matches=('qc_player_matches', ('match_id', 'channel_id', 'user_id', 'nick', 'team'), 'match_id'),
+	rating_history=('qc_rating_history', (
+		'id', 'channel_id', 'user_id', 'at', 'rating_before', 'rating_change',
+		'deviation_before', 'deviation_change', 'match_id', 'reason'
+	), 'id')
+)
+
+
+class Writer:
+	""" Gzip file writer, encoding and compression of a chunk runs in a thread off the event loop """
+
+	def __init__(self, fp, fmt, columns):
+		self.gz = gzip.GzipFile(fileobj=fp, mode='wb')
+		self.fmt = fmt
+		self.columns = columns
+		self.rows = 0
+		if fmt == 'csv':
+			self._write_csv([], header=True)
+
+	def _write_csv(self, rows, header=False):
+		buf = io.StringIO()
+		writer = csv.DictWriter(buf, fieldnames=self.columns, lineterminator="\n")
+		if header:
+			writer.writeheader()
+		writer.writerows(rows)
+		self.gz.write(buf.getvalue().encode('utf-8'))
+
+	def _write_jsonl(self, rows):
+		self.gz.write("".join((json.dumps(row, ensure_ascii=False) + "\n" for row in rows)).encode('utf-8'))
+
+	def write(self, rows):
+		if self.fmt == 'csv':
+			self._write_csv(rows)
+		else:
+			self._write_jsonl(rows)
+		self.rows += len(rows)
+
+	def close(self):
+		self.gz.close()
+
+
+async def export(name, channel_id, fmt='csv'):
+	"""
+	Write the channel rows of the table to a gzip temp file, the chunks are read from a streaming cursor,
+	so the memory use does not depend on the table size. Return (path, rows), the caller removes the file.
+	"""
+	table, columns, order = TABLES[name]
+	request, args = build_select(columns, table, where=dict(channel_id=channel_id), order_by=[(order, True)])
+	loop = asyncio.get_running_loop()
+
+	fd, path = tempfile.mkstemp(prefix=f"{name}-", suffix=f".{fmt}.gz")
+	try:
+		with os.fdopen(fd, 'wb') as fp:
+			writer = Writer(fp, fmt, columns)
+			async for rows in db.stream(request, args, size=CHUNK):
+				await loop.run_in_executor(None, writer.write, rows)
+			await loop.run_in_executor(None, writer.close)
+	except BaseException:
+		os.remove(path)
+		raise
+	return path, writer.rows
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+import io
+import csv
+import gzip
+import json
+import asyncio
+
+import bot
+from core.database import db
+from core.DBAdapters.common import build_where
+
+from bot.stats import stats
+from bot.stats import rollups
+from bot.stats.players_cache import players_cache
+
+FORMATS = ('csv', 'jsonl')
+FIELDS = ('at', 'queue', 'alpha', 'beta', 'alpha_score', 'beta_score')
+CHUNK = 1000
+MAX_ROWS = 100000
+MAX_ERRORS = 5  # bad rows listed in the error message
+
+
+def _read(data, filename):
+	""" Return the rows of a csv or jsonl file, optionally gzipped, as dicts """
+	name = filename.lower()
+	if name.endswith('.gz'):
+		data, name = gzip.decompress(data), name[:-3]
+	text = data.decode('utf-8-sig')
+	if name.endswith('.csv'):
+		return list(csv.DictReader(io.StringIO(text)))
+	elif name.endswith('.jsonl'):
+		return [json.loads(line) for line in text.splitlines() if line.strip()]
+	raise ValueError(f"Unsupported file type, expected one of: {', '.join(FORMATS)} (optionally gzipped).")
+
+
+def _team(value):
+	""" User ids of a team, a list or a string of ids separated by spaces """
+	if isinstance(value, str):
+		value = value.split()
+	return [int(i) for i in value]
+
+
+def parse(data, filename, queues):
+	"""
+	Parse and validate an import file, queues are {lower name: queue} of the channel.
+	Every row has the FIELDS: at is a unix time, alpha and beta are the teams user ids
+	and the winner is the team with more points, equal scores are a draw.
+	Return the matches sorted by time, raise ValueError listing the bad rows.
+	"""
+	try:
+		rows = _read(data, filename)
+	except (UnicodeDecodeError, OSError, json.JSONDecodeError) as e:
+		raise ValueError(f"Failed to read the file: {e}")
+	if not len(rows):
+		raise ValueError("The file has no rows.")
+	if len(rows) > MAX_ROWS:
+		raise ValueError(f"Too many rows ({len(rows)}), the limit is {MAX_ROWS}.")
+
+	matches, errors = [], []
+	for n, row in enumerate(rows, start=1):
+		try:
+			if not isinstance(row, dict) or any((row.get(f) in (None, "") for f in FIELDS)):
+				raise ValueError(f"expected the fields {', '.join(FIELDS)}")
+			if (queue := queues.get(str(row['queue']).lower())) is None:
+				raise ValueError(f"queue '{row['queue']}' not found")
+			at, alpha_score, beta_score = int(row['at']), int(row['alpha_score']), int(row['beta_score'])
+			alpha, beta = _team(row['alpha']), _team(row['beta'])
+			if at <= 0 or alpha_score < 0 or beta_score < 0:
+				raise ValueError("time and scores can not be negative")
+			if not len(alpha) or not len(beta):
+				raise ValueError("teams can not be empty")
+			if len(set(alpha + beta)) != len(alpha + beta):
+				raise ValueError("teams can not contain duplicate players")
+		except (ValueError, TypeError) as e:
+			errors.append(f"row {n}: {e}")
+			continue
+
+		if alpha_score == beta_score:
+			winner = None
+		else:
+			winner = 0 if alpha_score > beta_score else 1
+		matches.append(dict(
+			at=at, queue=queue, alpha=alpha, beta=beta, winner=winner, scores=(alpha_score, beta_score)
+		))
+
+	if len(errors):
+		raise ValueError(f"{len(errors)} bad rows, " + "; ".join(errors[:MAX_ERRORS]) + ".")
+	matches.sort(key=lambda m: m['at'])
+	return matches
+
+
+class Import:
+	"""
+	Imports a history of ranked matches to a queue channel.
+	The ratings are computed in memory one chunk of CHUNK matches at a time, going through
+	rate_match() in time order from the current players ratings, then the chunk is written
+	with batched inserts in a single transaction, so an interrupted import leaves whole matches only.
+	"""
+
+	def __init__(self, qc, matches, nicks):
+		self.qc = qc
+		self.rating = qc.rating
+		self.matches = matches
+		self.nicks = nicks  # {user_id: nick} of the guild members
+		self.state = dict()  # {user_id: players row}
+		self.first_id = None
+
+	async def load(self):
+		user_ids = {user_id for m in self.matches for user_id in (*m['alpha'], *m['beta'])}
+		cached = await players_cache.get(self.rating.channel_id)
+		for p in await self.rating.get_players(user_ids):
+			self.state[p['user_id']] = p
+			if (nick := self.nicks.get(p['user_id'])) is None:
+				nick = cached[p['user_id']]['nick'] if p['user_id'] in cached else str(p['user_id'])
+			p['nick'] = nick
+		self.first_id = await stats.match_ids.block(len(self.matches))
+
+	def _team_name(self, queue, idx):
+		team_names = queue.cfg.team_names.split(" ") if queue.cfg.team_names else bot.Match.default_cfg['team_names']
+		return team_names[idx]
+
+	def rate(self, start, end):
+		""" Rate the matches [start, end) and return their rows to write """
+		matches, player_matches, history, rollup = [], [], [], []
+		for n in range(start, end):
+			m = self.matches[n]
+			match_id = self.first_id + n
+			queue = m['queue']
+			before = [[self.state[i].copy() for i in m['alpha']], [self.state[i].copy() for i in m['beta']]]
+			after = self.rating.rate_match(*before, m['winner'], m['scores'])
+
+			match = dict(
+				match_id=match_id, channel_id=self.qc.id, queue_id=queue.cfg.p_key, queue_name=queue.name,
+				alpha_name=self._team_name(queue, 0), beta_name=self._team_name(queue, 1),
+				at=m['at'], ranked=1, winner=m['winner'],
+				alpha_score=m['scores'][0], beta_score=m['scores'][1], maps=""
+			)
+			matches.append(match)
+			rollup.append((match, m['alpha'] + m['beta']))
+
+			for team, (team_before, team_after) in enumerate(zip(before, after)):
+				for old, new in zip(team_before, team_after):
+					user_id = old['user_id']
+					self.state[user_id] = {**new, 'nick': old['nick']}
+					player_matches.append(dict(
+						match_id=match_id, channel_id=self.qc.id, user_id=user_id, nick=old['nick'], team=team
+					))
+					history.append(dict(
+						channel_id=self.rating.channel_id, user_id=user_id, at=m['at'],
+						rating_before=old['rating'], rating_change=new['rating'] - old['rating'],
+						deviation_before=old['deviation'], deviation_change=new['deviation'] - old['deviation'],
+						match_id=match_id, reason=queue.name
+					))
+		return matches, player_matches, history, rollup
+
+	async def save(self, matches, player_matches, history, rollup):
+		user_ids = list({p['user_id'] for p in player_matches})
+		players = [self.state[user_id] for user_id in user_ids]
+
+		async with db.transaction() as tx:
+			await tx.insert_many('qc_matches', matches)
+			for channel_id in {self.qc.id, self.rating.channel_id}:
+				await tx.insert_many('qc_players', (
+					dict(channel_id=channel_id, user_id=p['user_id'], nick=p['nick']) for p in players
+				), on_dublicate="ignore")
+			await tx.update_many('qc_players', (dict(
+				nick=p['nick'], rating=p['rating'], deviation=p['deviation'],
+				wins=p['wins'], losses=p['losses'], draws=p['draws'], streak=p['streak'],
+				channel_id=self.rating.channel_id, user_id=p['user_id']
+			) for p in players), keys=('channel_id', 'user_id'))
+			await tx.insert_many('qc_player_matches', player_matches)
+			await tx.insert_many('qc_rating_history', history)
+			await rollups.add_matches(tx, rollup)
+			where, args = build_where(dict(channel_id=self.rating.channel_id, user_id__in=user_ids))
+			await tx.execute(f"UPDATE `qc_players` SET `last_ranked_at`={stats.LAST_RANKED_AT}" + where, args)
+
+		players_cache.update(self.rating.channel_id, players)
+
+	async def run(self, progress=None):
+		""" Import the matches, progress(done, total) is awaited after every chunk """
+		await self.load()
+		loop = asyncio.get_running_loop()
+		for start in range(0, len(self.matches), CHUNK):
+			end = min(start + CHUNK, len(self.matches))
+			# rating big chunks may take a while, keep the event loop responsive
+			rows = await loop.run_in_executor(None, self.rate, start, end)
+			await self.save(*rows)
+			if progress is not None:
+				await progress(end, len(self.matches))
+		return len(self.matches), len(self.state)
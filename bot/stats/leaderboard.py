@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from bisect import bisect_left, insort
+
+from bot.stats.players_cache import players_cache
+
+
+class Leaderboard:
+	"""
+	Leaderboard of a rating channel for one lb_min_matches value.
+	Players are kept sorted by (-rating, user_id), so the place of a player is a binary search
+	and a page is a slice. Rendered pages are kept until the next change of the board.
+	"""
+
+	PAGE_SIZE = 10
+
+	def __init__(self, min_matches):
+		self.min_matches = min_matches or 0
+		self.keys = []  # [(-rating, user_id)]
+		self.rows = dict()  # {user_id: row} of the players on the board
+		self.rendered = dict()  # {key: rendered page}
+
+	def __len__(self):
+		return len(self.keys)
+
+	@property
+	def pages(self):
+		return -(-len(self.keys) // self.PAGE_SIZE)
+
+	@staticmethod
+	def key(row):
+		return -row['rating'], row['user_id']
+
+	def eligible(self, row):
+		return (
+			row['rating'] is not None
+			and not row.get('is_hidden')
+			and self.min_matches <= row['wins'] + row['losses'] + row['draws']
+		)
+
+	def fill(self, rows):
+		self.rows = {user_id: row for user_id, row in rows.items() if self.eligible(row)}
+		self.keys = sorted((self.key(row) for row in self.rows.values()))
+		self.rendered.clear()
+
+	def update(self, user_id, row):
+		""" Move the player to the place of the new row, None removes the player """
+		if (old := self.rows.pop(user_id, None)) is not None:
+			del self.keys[bisect_left(self.keys, self.key(old))]
+		if row is not None and self.eligible(row):
+			self.rows[user_id] = row
+			insort(self.keys, self.key(row))
+		self.rendered.clear()
+
+	def place(self, user_id):
+		""" Return 1-based place of the player or None if the player is not on the board """
+		if (row := self.rows.get(user_id)) is None:
+			return None
+		return bisect_left(self.keys, self.key(row)) + 1
+
+	def page(self, page):
+		return [self.rows[user_id] for rating, user_id in self.keys[page * self.PAGE_SIZE:(page + 1) * self.PAGE_SIZE]]
+
+
+class Leaderboards:
+	"""
+	Leaderboards by (rating channel, lb_min_matches), built from the players cache
+	and updated incrementally on every rating write going through it.
+	"""
+
+	def __init__(self):
+		self.boards = dict()  # {(channel_id, min_matches): Leaderboard()}
+		players_cache.subscribe(self.on_change)
+
+	async def get(self, channel_id, min_matches=0):
+		rows = await players_cache.get(channel_id)
+		if (board := self.boards.get((channel_id, min_matches or 0))) is None:
+			board = Leaderboard(min_matches)
+			board.fill(rows)
+			self.boards[(channel_id, min_matches or 0)] = board
+		return board
+
+	def on_change(self, channel_id, rows, user_ids=None):
+		"""
+		Called by the players cache after a write, rows is {user_id: row} of the channel or None if it was dropped.
+		user_ids are the changed players, None means all of them.
+		"""
+		for key in [key for key in self.boards.keys() if key[0] == channel_id]:
+			if rows is None:
+				self.boards.pop(key)
+			elif user_ids is None:
+				self.boards[key].fill(rows)
+			else:
+				for user_id in user_ids:
+					self.boards[key].update(user_id, rows.get(user_id))
+
+
+leaderboards = Leaderboards()
@@ -4,6 +4,8 @@ from random import choice
 from core.database import db
 from core.utils import get_nick
 
+from bot.scheduler import scheduler
+
 db.ensure_table(dict(
 	tname="noadds",
 	columns=[
@@ -18,7 +20,10 @@ db.ensure_table(dict(
 		dict(cname="by", ctype=db.types.str),
 		dict(cname="released_by", ctype=db.types.str)
 	],
-	primary_keys=["id"]
+	primary_keys=["id"],
+	indexes=[
+		dict(columns=["guild_id", "user_id", "is_active"])
+	]
 ))
 
 db.ensure_table(dict(
@@ -27,15 +32,15 @@ db.ensure_table(dict(
 		dict(cname="channel_id", ctype=db.types.int),
 		dict(cname="user_id", ctype=db.types.int),
 		dict(cname="phrase", ctype=db.types.text),
+	],
+	indexes=[
+		dict(columns=["channel_id", "user_id"])
 	]
 ))
 
 
 class NoAdds:
 
-	def __init__(self):
-		self.next_tick = 0
-
 	@staticmethod
 	async def get_user(ctx, member):
 		""" returns [ban_left, phrase]"""
@@ -66,15 +71,17 @@ class NoAdds:
 			dict(is_active=0, released_by="another noadd"),
 			keys=dict(guild_id=ctx.channel.guild.id, user_id=member.id, is_active=1)
 		)
+		now = int(time.time())
 		await db.insert('noadds', dict(
 			guild_id=ctx.channel.guild.id,
 			user_id=member.id,
 			name=get_nick(member),
-			at=int(time.time()),
+			at=now,
 			duration=duration,
 			reason=reason,
 			by=get_nick(moderator)
 		))
+		NoAdds.schedule(now + duration + 1)
 
 	@staticmethod
 	async def forgive(ctx, member, moderator):
@@ -94,10 +101,20 @@ class NoAdds:
 	async def get_noadds(ctx):
 		return await db.select(['*'], 'noadds', where=dict(guild_id=ctx.channel.guild.id, is_active=1))
 
-	async def think(self, frame_time):
-		if frame_time > self.next_tick:
-			await db.execute("UPDATE `noadds` SET is_active=0, released_by='time' WHERE (`at`+`duration`)<%s", (frame_time, ))
-			self.next_tick = frame_time + 60
+	@staticmethod
+	def schedule(at):
+		""" Make sure the expiration job runs no later than at """
+		if (next_at := scheduler.get(('noadds', ))) is None or at < next_at:
+			scheduler.set(('noadds', ), at, NoAdds.expire)
+
+	@staticmethod
+	async def expire(frame_time):
+		""" Release the expired noadds and schedule the job for the next one """
+		await db.execute("UPDATE `noadds` SET is_active=0, released_by='time' WHERE (`at`+`duration`)<%s", (frame_time, ))
+		data = await db.fetchone("SELECT MIN(`at`+`duration`) AS next_at FROM `noadds` WHERE is_active=1")
+		if data and data['next_at'] is not None:
+			# the released ones must be strictly expired, see the query above
+			NoAdds.schedule(max(data['next_at'] + 1, frame_time + 1))
 
 
 noadds = NoAdds()
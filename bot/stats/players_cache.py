@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from core.database import db
+
+
+class PlayersCache:
+	"""
+	In-memory copy of the qc_players rating columns, per rating channel.
+	A channel is loaded with a single query on first access and is kept up to date
+	by writing through every rating change, so lookups never hit the database.
+	"""
+
+	table = "qc_players"
+	columns = ('channel_id', 'user_id', 'nick', 'rating', 'deviation', 'wins', 'losses', 'draws', 'streak', 'is_hidden')
+
+	def __init__(self):
+		self.channels = dict()  # {channel_id: {user_id: row}}
+		self._loading = dict()  # {channel_id: Task()}
+		self._pending = dict()  # {channel_id: [func(rows)]} writes made while the channel is loading
+		self._subscribers = []  # [func(channel_id, rows, user_ids)]
+
+	def subscribe(self, func):
+		""" func(channel_id, rows, user_ids) is called after each write to a loaded channel, see Leaderboards.on_change() """
+		self._subscribers.append(func)
+
+	def _notify(self, channel_id, rows, user_ids=None):
+		for func in self._subscribers:
+			func(channel_id, rows, user_ids)
+
+	async def get(self, channel_id):
+		""" Return {user_id: row} for the channel, loading it if necessary """
+		if (rows := self.channels.get(channel_id)) is not None:
+			return rows
+
+		if (task := self._loading.get(channel_id)) is None:
+			pending = self._pending[channel_id] = []
+			task = self._loading[channel_id] = asyncio.create_task(self._load(channel_id, pending))
+		return await asyncio.shield(task)
+
+	async def _load(self, channel_id, pending):
+		try:
+			data = await db.select(self.columns, self.table, where=dict(channel_id=channel_id))
+		finally:
+			current = self._loading.get(channel_id) is asyncio.current_task()
+			if current:
+				self._loading.pop(channel_id)
+				self._pending.pop(channel_id)
+
+		rows = {row['user_id']: row for row in data}
+		# the writes are absolute values, so replaying the ones the select has already seen is harmless
+		for func in pending:
+			func(rows)
+
+		if current:  # not invalidated while loading
+			self.channels[channel_id] = rows
+		return rows
+
+	def _apply(self, channel_id, func, user_ids=None):
+		if (rows := self.channels.get(channel_id)) is not None:
+			func(rows)
+			self._notify(channel_id, rows, user_ids)
+		if (pending := self._pending.get(channel_id)) is not None:
+			pending.append(func)
+
+	def update(self, channel_id, players):
+		""" Write through changed rows, each one must have user_id and any of the cached columns """
+		players = [{k: v for k, v in p.items() if k in self.columns} for p in players]
+
+		def func(rows):
+			for p in players:
+				rows[p['user_id']] = {
+					**dict(
+						channel_id=channel_id, nick=None, rating=None, deviation=None,
+						wins=0, losses=0, draws=0, streak=0, is_hidden=0
+					),
+					**rows.get(p['user_id'], {}),
+					**p
+				}
+
+		self._apply(channel_id, func, [p['user_id'] for p in players])
+
+	def update_all(self, channel_id, **values):
+		""" Write through a change applied to every player of the channel """
+		def func(rows):
+			for row in rows.values():
+				row.update(values)
+
+		self._apply(channel_id, func)
+
+	def remove(self, channel_id, user_id):
+		self._apply(channel_id, lambda rows: rows.pop(user_id, None), [user_id])
+
+	def invalidate(self, channel_id):
+		""" Drop the channel, it will be reloaded from the database on next access """
+		self.channels.pop(channel_id, None)
+		self._loading.pop(channel_id, None)
+		self._pending.pop(channel_id, None)
+		self._notify(channel_id, None)
+
+
+players_cache = PlayersCache()
@@ -2,11 +2,19 @@
 import glicko2
 import trueskill
 import time
+import numpy as np
+from math import log2
 
 from core.database import db
-from core.utils import find, get_nick
+from core.utils import get_nick
 
 from bot.stats import stats
+from bot.stats.players_cache import players_cache
+from bot.stats import two_team_trueskill
+
+
+# 'points' rates every scored point as a separate win, 'margin' rates the match once by the score difference
+SCORE_MODES = ('points', 'margin')
 
 
 class BaseRating:
@@ -15,7 +23,7 @@ class BaseRating:
 
 	def __init__(
 			self, channel_id, init_rp=1500, init_deviation=300, min_deviation=None, scale=100,
-			loss_scale=100, win_scale=100, draw_bonus=0, ws_boost=False, ls_boost=False
+			loss_scale=100, win_scale=100, draw_bonus=0, ws_boost=False, ls_boost=False, score_mode='points'
 	):
 		self.channel_id = channel_id
 		self.init_rp = init_rp
@@ -27,6 +35,7 @@ class BaseRating:
 		self.draw_bonus = (draw_bonus or 0)/100.0
 		self.ws_boost = ws_boost
 		self.ls_boost = ls_boost
+		self.score_mode = score_mode or 'points'
 
 	def _scale_win(self, r_change):
 		return r_change * self.win_scale
@@ -37,8 +46,15 @@ class BaseRating:
 	def _scale_draw(self, r_change):
 		return r_change + (abs(r_change) * self.draw_bonus)
 
-	def _scale_changes(self, player, r_change, d_change, score):
+	@staticmethod
+	def margin_weight(margin):
+		""" Rating change multiplier of a win by the margin of points, 1 for a single point """
+		return log2(1 + max(1, margin))
+
+	def _scale_changes(self, player, r_change, d_change, score, margin=1):
 		p = player.copy()
+		if margin != 1:
+			r_change = r_change * self.margin_weight(margin)
 
 		if score == -1:
 			r_change = self._scale_loss(r_change) * self.scale
@@ -61,15 +77,38 @@ class BaseRating:
 		p['deviation'] = max(self.min_deviation, round(p['deviation'] + d_change))
 		return p
 
+	def rate(self, winners, losers, draw=False, margin=1):
+		raise NotImplementedError()
+
+	def rate_match(self, team0, team1, winner, scores):
+		"""
+		Rate a finished match, winner is the team index or None for a draw and scores are (alpha, beta).
+		Return the new [team0, team1] players rows.
+		"""
+		if winner is None:
+			return self.rate(winners=team0, losers=team1, draw=True)
+
+		if self.score_mode == 'margin':
+			margin = abs((scores[0] or 0) - (scores[1] or 0))
+			if winner == 0:
+				return self.rate(winners=team0, losers=team1, margin=margin)
+			return self.rate(winners=team1, losers=team0, margin=margin)[::-1]
+
+		result = [team0, team1]
+		for n in range(max(scores[0] or 0, scores[1] or 0)):
+			if n < (scores[0] or 0):
+				result = self.rate(winners=result[0], losers=result[1])
+			if n < (scores[1] or 0):
+				result = self.rate(winners=result[1], losers=result[0])[::-1]
+		return result
+
 	async def get_players(self, user_ids):
 		""" Return rating or initial rating for each member """
-		data = await db.select(
-			['user_id', 'rating', 'deviation', 'channel_id', 'wins', 'losses', 'draws', 'streak'], self.table,
-			where={'channel_id': self.channel_id}
-		)
+		data = await players_cache.get(self.channel_id)
 		results = []
 		for user_id in user_ids:
-			if d := find(lambda p: p['user_id'] == user_id, data):
+			if d := data.get(user_id):
+				d = d.copy()
 				if d['rating'] is None:
 					d['rating'] = self.init_rp
 					d['deviation'] = self.init_deviation
@@ -78,7 +117,7 @@ class BaseRating:
 			else:
 				d = dict(
 					channel_id=self.channel_id, user_id=user_id, rating=self.init_rp,
-					deviation=self.init_deviation, wins=0, losses=0, draws=0
+					deviation=self.init_deviation, wins=0, losses=0, draws=0, streak=0
 				)
 			results.append(d)
 		return results
@@ -89,12 +128,14 @@ class BaseRating:
 			where=dict(channel_id=self.channel_id, user_id=member.id)
 		)
 
+		row = dict(user_id=member.id)
 		if not old:
 			rating = max(1, rating - penality if rating else self.init_rp - penality)
+			row['nick'] = get_nick(member)
 			await db.insert(
 				self.table,
 				dict(
-					channel_id=self.channel_id, nick=get_nick(member), user_id=member.id,
+					channel_id=self.channel_id, nick=row['nick'], user_id=member.id,
 					rating=rating, deviation=deviation or self.init_deviation
 				)
 			)
@@ -108,6 +149,7 @@ class BaseRating:
 					dict(rating=rating, deviation=deviation or old['deviation']),
 					keys=dict(channel_id=self.channel_id, user_id=member.id)
 				)
+		players_cache.update(self.channel_id, [dict(**row, rating=rating, deviation=deviation or old['deviation'])])
 
 		await db.insert(
 			"qc_rating_history",
@@ -121,6 +163,7 @@ class BaseRating:
 
 	async def hide_player(self, user_id, hide=True):
 		await db.update(self.table, dict(is_hidden=hide), keys=dict(channel_id=self.channel_id, user_id=user_id))
+		players_cache.update(self.channel_id, [dict(user_id=user_id, is_hidden=hide)])
 
 	async def snap_ratings(self, ranks_table):
 		ranks = [i['rating'] for i in ranks_table if i['rating'] != 0]
@@ -143,47 +186,62 @@ class BaseRating:
 			))
 			p['rating'] = new_rating
 		await db.insert_many(self.table, data, on_dublicate='replace')
+		players_cache.update(self.channel_id, data)
 		await db.insert_many('qc_rating_history', history)
 
 	async def apply_decay(self, rating, deviation, ranks_table):
-		""" Apply weekly rating and deviation decay """
+		""" Apply weekly rating and deviation decay, computed for all the channel players at once """
 		now = int(time.time())
-		ranks = [i['rating'] for i in ranks_table if i['rating'] != 0]
-		data = await stats.last_games(self.channel_id)
-		history = []
-		to_update = []
-		for p in data:
-			if None in (p['rating'], p['deviation'], p['at']):
-				continue
+		data = [
+			p for p in await stats.last_games(self.channel_id)
+			if None not in (p['rating'], p['deviation'], p['last_ranked_at'])
+		]
+		if not len(data):
+			return
 
-			new_deviation = min((self.init_deviation, p['deviation'] + deviation))
+		ratings = np.array([p['rating'] for p in data], dtype=np.int64)
+		deviations = np.array([p['deviation'] for p in data], dtype=np.int64)
+		last_at = np.array([p['last_ranked_at'] for p in data], dtype=np.int64)
 
-			min_rating = max([i for i in ranks if i <= p['rating']]+[0])
-			if min_rating != 0 and p['at'] < (now-(60*60*24*7)):
-				new_rating = max((min_rating, p['rating']-rating))
-			else:
-				new_rating = p['rating']
+		new_deviations = np.minimum(self.init_deviation, deviations + deviation)
 
-			if new_rating != p['rating'] or new_deviation != p['deviation']:
-				history.append(dict(
-					user_id=p['user_id'],
-					channel_id=self.channel_id,
-					at=now,
-					rating_before=p['rating'],
-					rating_change=new_rating-p['rating'],
-					deviation_before=p['deviation'],
-					deviation_change=new_deviation-p['deviation'],
-					match_id=None,
-					reason="inactivity rating decay"
-				))
-				p.pop('at')
-				p['deviation'] = new_deviation
-				p['rating'] = new_rating
-				to_update.append(p)
+		# rating decays down to the nearest rank below the player, but only if there is one
+		ranks = np.array(sorted(i['rating'] for i in ranks_table if i['rating'] != 0), dtype=np.int64)
+		if len(ranks):
+			places = np.searchsorted(ranks, ratings, side='right') - 1
+			min_ratings = np.where(places >= 0, ranks[np.maximum(places, 0)], 0)
+		else:
+			min_ratings = np.zeros_like(ratings)
+		inactive = (min_ratings != 0) & (last_at < now - 60*60*24*7)
+		new_ratings = np.where(inactive, np.maximum(min_ratings, ratings - rating), ratings)
+
+		changed = np.flatnonzero((new_ratings != ratings) | (new_deviations != deviations))
+		if not len(changed):
+			return
+
+		history, to_update = [], []
+		for i in changed.tolist():
+			p = data[i]
+			new_rating, new_deviation = int(new_ratings[i]), int(new_deviations[i])
+			history.append(dict(
+				user_id=p['user_id'],
+				channel_id=self.channel_id,
+				at=now,
+				rating_before=p['rating'],
+				rating_change=new_rating-p['rating'],
+				deviation_before=p['deviation'],
+				deviation_change=new_deviation-p['deviation'],
+				match_id=None,
+				reason="inactivity rating decay"
+			))
+			to_update.append(dict(
+				rating=new_rating, deviation=new_deviation, channel_id=self.channel_id, user_id=p['user_id']
+			))
 
-		if len(history):
-			await db.insert_many('qc_rating_history', history)
-			await db.insert_many(self.table, to_update, on_dublicate='replace')
+		async with db.transaction() as tx:
+			await tx.insert_many('qc_rating_history', history)
+			await tx.update_many(self.table, to_update, keys=('channel_id', 'user_id'))
+		players_cache.update(self.channel_id, to_update)
 
 	async def reset(self):
 		data = await db.select(('user_id', 'rating', 'deviation'), self.table, where=dict(channel_id=self.channel_id))
@@ -207,6 +265,7 @@ class BaseRating:
 		await db.update(
 			self.table, dict(rating=None, deviation=None), keys=dict(channel_id=self.channel_id)
 		)
+		players_cache.update_all(self.channel_id, rating=None, deviation=None)
 		if len(history):
 			await db.insert_many('qc_rating_history', history)
 
@@ -219,15 +278,15 @@ class FlatRating(BaseRating):
 	def _scale_draw(self, r_change):
 		return 10 * self.draw_bonus
 
-	def rate(self, winners, losers, draw=False):
+	def rate(self, winners, losers, draw=False, margin=1):
 		r1, r2 = [], []
 		if not draw:
 			for p in winners:
-				new = self._scale_changes(p, 10, 0, 1)
+				new = self._scale_changes(p, 10, 0, 1, margin)
 				r1.append(new)
 
 			for p in losers:
-				new = self._scale_changes(p, -10, 0, -1)
+				new = self._scale_changes(p, -10, 0, -1, margin)
 				r2.append(new)
 		else:
 			r1 = [self._scale_changes(p, 0, 0, 0) for p in winners]
@@ -241,12 +300,10 @@ class Glicko2Rating(BaseRating):
 	def __init__(self, **kwargs):
 		super().__init__(**kwargs)
 
-	def rate(self, winners, losers, draw=False):
+	def rate(self, winners, losers, draw=False, margin=1):
 		score_w = 0.5 if draw else 1
 		score_l = 0.5 if draw else 0
 		r1, r2 = [], []
-		print("Scores:")
-		print(score_l, score_w)
 
 		avg_w = [
 			[int(sum((p['rating'] for p in winners)) / len(winners))],  # average rating
@@ -264,14 +321,14 @@ class Glicko2Rating(BaseRating):
 			po.setRating(avg_w[0][0])
 			po.setRd(p['deviation'])
 			po.update_player(*avg_l)
-			new = self._scale_changes(p, po.getRating() - avg_w[0][0], po.getRd() - p['deviation'], 0 if draw else 1)
+			new = self._scale_changes(p, po.getRating() - avg_w[0][0], po.getRd() - p['deviation'], 0 if draw else 1, margin)
 			r1.append(new)
 
 		for p in losers:
 			po.setRating(avg_l[0][0])
 			po.setRd(p['deviation'])
 			po.update_player(*avg_w)
-			new = self._scale_changes(p, po.getRating() - avg_l[0][0], po.getRd() - p['deviation'], 0 if draw else -1)
+			new = self._scale_changes(p, po.getRating() - avg_l[0][0], po.getRd() - p['deviation'], 0 if draw else -1, margin)
 			r2.append(new)
 
 		return [r1, r2]
@@ -286,22 +343,32 @@ class TrueSkillRating(BaseRating):
 			beta=int(self.init_deviation/2), tau=int(self.init_deviation/100)
 		)
 
-	def rate(self, winners, losers, draw=False):
+	def _rate_library(self, winners, losers, draw):
 		g1 = [self.ts.create_rating(mu=p['rating'], sigma=p['deviation']) for p in winners]
 		g2 = [self.ts.create_rating(mu=p['rating'], sigma=p['deviation']) for p in losers]
+		ranks = [0, 0] if draw else [0, 1]
+		g1, g2 = self.ts.rate((g1, g2), ranks=ranks)
+		return [[r.mu for r in g1], [r.sigma for r in g1]], [[r.mu for r in g2], [r.sigma for r in g2]]
+
+	def rate(self, winners, losers, draw=False, margin=1):
 		r1, r2 = [], []
 
-		ranks = [0, 0] if draw else [0, 1]
-		g1, g2 = (list(i) for i in self.ts.rate((g1, g2), ranks=ranks))
+		try:
+			(mu1, sigma1), (mu2, sigma2) = two_team_trueskill.rate(
+				[(p['rating'], p['deviation']) for p in winners],
+				[(p['rating'], p['deviation']) for p in losers],
+				beta=self.ts.beta, tau=self.ts.tau, draw_probability=self.ts.draw_probability, draw=draw
+			)
+		except FloatingPointError:
+			# extreme rating gaps, let the library deal with them
+			(mu1, sigma1), (mu2, sigma2) = self._rate_library(winners, losers, draw)
 
-		for p in winners:
-			res = g1.pop(0)
-			new = self._scale_changes(p, res.mu - p['rating'], res.sigma - p['deviation'], 0 if draw else 1)
+		for p, mu, sigma in zip(winners, mu1, sigma1):
+			new = self._scale_changes(p, float(mu) - p['rating'], float(sigma) - p['deviation'], 0 if draw else 1, margin)
 			r1.append(new)
 
-		for p in losers:
-			res = g2.pop(0)
-			new = self._scale_changes(p, res.mu - p['rating'], res.sigma - p['deviation'], 0 if draw else -1)
+		for p, mu, sigma in zip(losers, mu2, sigma2):
+			new = self._scale_changes(p, float(mu) - p['rating'], float(sigma) - p['deviation'], 0 if draw else -1, margin)
 			r2.append(new)
 
 		return [r1, r2]
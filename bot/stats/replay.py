@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+import time
+import asyncio
+import numpy as np
+
+from core.database import db
+from core.DBAdapters.common import build_where
+
+from bot.stats import stats
+from bot.stats.rating import FlatRating
+from bot.stats.players_cache import players_cache
+
+
+class Replay:
+	"""
+	Recomputes the ratings of a rating channel from its ranked match history.
+	Matches are read in pages of CHUNK ordered by match_id, the rating state is kept in arrays indexed
+	by player and the result is written back in a single transaction.
+	Only the match results are replayed, manual rating changes, penalties and decay are not.
+	"""
+
+	CHUNK = 10000
+
+	def __init__(self, rating, channel_ids):
+		self.rating = rating
+		self.channel_ids = list(channel_ids)  # queue channels which matches are rated in the rating channel
+		self.index = dict()  # {user_id: player index}
+		self.user_ids = []
+		self.nicks = []
+		# [(team0 indexes, team1 indexes, (alpha_score, beta_score), winner)]
+		self.matches = []
+
+	def _player(self, user_id, nick):
+		if (idx := self.index.get(user_id)) is None:
+			idx = self.index[user_id] = len(self.user_ids)
+			self.user_ids.append(user_id)
+			self.nicks.append(nick)
+		else:
+			self.nicks[idx] = nick
+		return idx
+
+	@staticmethod
+	def rounds(winner, alpha_score, beta_score):
+		""" Winner teams of the rate() calls BaseRating.rate_match() does in the 'points' mode, None for a draw """
+		if winner is None:
+			return [None]
+		rounds = []
+		for n in range(max(alpha_score or 0, beta_score or 0)):
+			if n < (alpha_score or 0):
+				rounds.append(0)
+			if n < (beta_score or 0):
+				rounds.append(1)
+		return rounds
+
+	async def load(self):
+		after = None
+		while len(page := await db.select(
+			('match_id', 'winner', 'alpha_score', 'beta_score'), 'qc_matches',
+			where=dict(channel_id__in=self.channel_ids, ranked=1),
+			order_by=[('match_id', True)], limit=self.CHUNK, after=after
+		)):
+			after = (page[-1]['match_id'], )
+			teams = {m['match_id']: ([], []) for m in page}
+			for p in await db.select(
+				('match_id', 'user_id', 'nick', 'team'), 'qc_player_matches',
+				where=dict(
+					channel_id__in=self.channel_ids, match_id__between=(page[0]['match_id'], page[-1]['match_id'])
+				),
+				order_by=[('match_id', True)]
+			):
+				if p['match_id'] in teams and p['team'] in (0, 1):
+					teams[p['match_id']][p['team']].append(self._player(p['user_id'], p['nick']))
+
+			for m in page:
+				team0, team1 = teams[m['match_id']]
+				if len(team0) and len(team1):
+					self.matches.append((team0, team1, (m['alpha_score'], m['beta_score']), m['winner']))
+
+	def run(self):
+		""" Return the state arrays (rating, deviation, wins, losses, draws, streak) """
+		if type(self.rating) is FlatRating and self.rating.score_mode == 'points':
+			return self._run_flat()
+		return self._run_generic()
+
+	def _state(self):
+		n = len(self.user_ids)
+		return (
+			np.full(n, self.rating.init_rp, dtype=np.float64),
+			np.full(n, self.rating.init_deviation, dtype=np.float64),
+			np.zeros(n, dtype=np.int64),
+			np.zeros(n, dtype=np.int64),
+			np.zeros(n, dtype=np.int64),
+			np.zeros(n, dtype=np.int64)
+		)
+
+	def _run_flat(self):
+		"""
+		Flat rating changes depend only on the player's own results, so all players are advanced at once:
+		step k applies the k-th result of every player which has one.
+		"""
+		r = self.rating
+		rating, deviation, wins, losses, draws, streak = self._state()
+
+		players, scores = [], []
+		for team0, team1, match_scores, match_winner in self.matches:
+			for winner in self.rounds(match_winner, *match_scores):
+				players.extend(team0)
+				players.extend(team1)
+				if winner is None:
+					scores.extend([0] * (len(team0) + len(team1)))
+				else:
+					scores.extend([1 if winner == 0 else -1] * len(team0))
+					scores.extend([1 if winner == 1 else -1] * len(team1))
+		if not len(players):
+			return rating, deviation, wins, losses, draws, streak
+
+		players = np.array(players, dtype=np.int64)
+		scores = np.array(scores, dtype=np.int8)
+
+		# number each player's results, then order them by (result number, player)
+		order = np.argsort(players, kind='stable')
+		grouped = players[order]
+		ordinal = np.empty_like(players)
+		ordinal[order] = np.arange(len(players)) - np.searchsorted(grouped, grouped, side='left')
+		steps = np.lexsort((players, ordinal))
+		players, scores, ordinal = players[steps], scores[steps], ordinal[steps]
+		bounds = np.searchsorted(ordinal, np.arange(ordinal[-1] + 2))
+
+		# same expressions as BaseRating._scale_changes() so the floats round the same way
+		win_change = r._scale_win(10) * r.scale
+		loss_change = r._scale_loss(-10) * r.scale
+		draw_change = r._scale_draw(0) * r.scale
+
+		for k in range(len(bounds) - 1):
+			p = players[bounds[k]:bounds[k + 1]]
+			s = scores[bounds[k]:bounds[k + 1]]
+			win, loss = s == 1, s == -1
+			st = streak[p]
+			st = np.where(win, np.where(st <= 0, 1, st + 1), np.where(loss, np.where(st >= 0, -1, st - 1), 0))
+			change = np.where(win, win_change, np.where(loss, loss_change, draw_change))
+			if r.ws_boost:
+				change = np.where(win & (st > 2), change * (np.minimum(st, 6) / 2), change)
+			if r.ls_boost:
+				change = np.where(loss & (st < -2), change * (np.minimum(np.abs(st), 6) / 2), change)
+
+			rating[p] = np.maximum(0, np.round(rating[p] + change))
+			streak[p] = st
+			wins[p] += win
+			losses[p] += loss
+			draws[p] += ~(win | loss)
+
+		# flat deviation never changes, it only gets rounded and clamped on every result
+		deviation[(wins + losses + draws) > 0] = max(r.min_deviation, round(r.init_deviation))
+		return rating, deviation, wins, losses, draws, streak
+
+	def _run_generic(self, observe=None):
+		"""
+		Glicko2 and TrueSkill changes depend on the opponents, so the matches go through rate_match() one by one.
+		observe(team0, team1, winner) is called with the players rows before each match.
+		"""
+		r = self.rating
+		rating, deviation, wins, losses, draws, streak = self._state()
+
+		def get_players(team):
+			# the same values BaseRating.get_players() would return
+			return [dict(
+				user_id=idx, rating=int(rating[idx]), deviation=min(r.init_deviation, int(deviation[idx])),
+				wins=int(wins[idx]), losses=int(losses[idx]), draws=int(draws[idx]), streak=int(streak[idx])
+			) for idx in team]
+
+		for team0, team1, scores, match_winner in self.matches:
+			result = [get_players(team0), get_players(team1)]
+			if observe is not None:
+				observe(*result, match_winner)
+			result = r.rate_match(*result, match_winner, scores)
+
+			for p in (*result[0], *result[1]):
+				idx = p['user_id']
+				rating[idx], deviation[idx] = p['rating'], p['deviation']
+				wins[idx], losses[idx], draws[idx], streak[idx] = p['wins'], p['losses'], p['draws'], p['streak']
+
+		return rating, deviation, wins, losses, draws, streak
+
+	async def save(self, state):
+		rating, deviation, wins, losses, draws, streak = state
+		channel_id = self.rating.channel_id
+		current = await players_cache.get(channel_id)
+		now = int(time.time())
+
+		rows, history = [], []
+		for idx, user_id in enumerate(self.user_ids):
+			played = bool(wins[idx] + losses[idx] + draws[idx])
+			row = dict(
+				rating=int(rating[idx]) if played else None,
+				deviation=int(deviation[idx]) if played else None,
+				wins=int(wins[idx]), losses=int(losses[idx]), draws=int(draws[idx]), streak=int(streak[idx]),
+				channel_id=channel_id, user_id=user_id
+			)
+			rows.append(row)
+
+			old = current.get(user_id, {})
+			before = old.get('rating') if old.get('rating') is not None else self.rating.init_rp
+			before_deviation = old.get('deviation') if old.get('deviation') is not None else self.rating.init_deviation
+			if played and (row['rating'] != before or row['deviation'] != before_deviation):
+				history.append(dict(
+					channel_id=channel_id, user_id=user_id, at=now,
+					rating_before=before, rating_change=row['rating'] - before,
+					deviation_before=before_deviation, deviation_change=row['deviation'] - before_deviation,
+					match_id=None, reason="replay"
+				))
+
+		async with db.transaction() as tx:
+			await tx.update(
+				'qc_players', dict(rating=None, deviation=None, wins=0, losses=0, draws=0, streak=0),
+				keys=dict(channel_id=channel_id)
+			)
+			if len(rows):
+				await tx.insert_many('qc_players', (
+					dict(channel_id=channel_id, user_id=user_id, nick=self.nicks[idx])
+					for idx, user_id in enumerate(self.user_ids)
+				), on_dublicate='ignore')
+				await tx.update_many('qc_players', rows, keys=('channel_id', 'user_id'))
+			if len(history):
+				await tx.insert_many('qc_rating_history', history)
+			where, args = build_where(dict(channel_id=channel_id))
+			await tx.execute(f"UPDATE `qc_players` SET `last_ranked_at`={stats.LAST_RANKED_AT}" + where, args)
+
+		players_cache.invalidate(channel_id)
+		return len(history)
+
+
+async def replay(rating, channel_ids):
+	""" Replay the rating channel history and save the result, return a summary dict """
+	at = time.perf_counter()
+	r = Replay(rating, channel_ids)
+	await r.load()
+	loaded = time.perf_counter()
+	# the computation may take a while on big channels, keep the event loop responsive
+	state = await asyncio.get_running_loop().run_in_executor(None, r.run)
+	computed = time.perf_counter()
+	changed = await r.save(state)
+	return dict(
+		matches=len(r.matches), players=len(r.user_ids), changed=changed,
+		load_time=loaded - at, run_time=computed - loaded, save_time=time.perf_counter() - computed
+	)
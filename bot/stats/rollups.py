@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+from core.console import log
+from core.database import db
+
+DAY = 60*60*24
+CHUNK = 10000
+
+db.ensure_table(dict(
+	tname="qc_queue_stats",
+	columns=[
+		dict(cname="channel_id", ctype=db.types.int),
+		dict(cname="queue_name", ctype=db.types.str),
+		dict(cname="matches", ctype=db.types.int, notnull=True, default=0)
+	],
+	primary_keys=["channel_id", "queue_name"]
+))
+
+db.ensure_table(dict(
+	tname="qc_player_queue_stats",
+	columns=[
+		dict(cname="channel_id", ctype=db.types.int),
+		dict(cname="user_id", ctype=db.types.int),
+		dict(cname="queue_name", ctype=db.types.str),
+		dict(cname="matches", ctype=db.types.int, notnull=True, default=0)
+	],
+	primary_keys=["channel_id", "user_id", "queue_name"]
+))
+
+db.ensure_table(dict(
+	tname="qc_team_stats",
+	columns=[
+		dict(cname="channel_id", ctype=db.types.int),
+		dict(cname="queue_id", ctype=db.types.int),
+		dict(cname="alpha_name", ctype=db.types.str),
+		dict(cname="beta_name", ctype=db.types.str),
+		dict(cname="matches", ctype=db.types.int, notnull=True, default=0),
+		dict(cname="alpha_wins", ctype=db.types.int, notnull=True, default=0),
+		dict(cname="beta_wins", ctype=db.types.int, notnull=True, default=0),
+		dict(cname="draws", ctype=db.types.int, notnull=True, default=0)
+	],
+	primary_keys=["channel_id", "queue_id", "alpha_name", "beta_name"]
+))
+
+db.ensure_table(dict(
+	tname="qc_daily_stats",
+	columns=[
+		dict(cname="channel_id", ctype=db.types.int),
+		dict(cname="day", ctype=db.types.int),
+		dict(cname="matches", ctype=db.types.int, notnull=True, default=0)
+	],
+	primary_keys=["channel_id", "day"]
+))
+
+db.ensure_table(dict(
+	tname="qc_player_daily_stats",
+	columns=[
+		dict(cname="channel_id", ctype=db.types.int),
+		dict(cname="user_id", ctype=db.types.int),
+		dict(cname="day", ctype=db.types.int),
+		dict(cname="matches", ctype=db.types.int, notnull=True, default=0)
+	],
+	primary_keys=["channel_id", "user_id", "day"],
+	indexes=[
+		dict(columns=["channel_id", "day"])
+	]
+))
+
+# {table: key columns}
+ROLLUPS = dict(
+	qc_queue_stats=("channel_id", "queue_name"),
+	qc_player_queue_stats=("channel_id", "user_id", "queue_name"),
+	qc_team_stats=("channel_id", "queue_id", "alpha_name", "beta_name"),
+	qc_daily_stats=("channel_id", "day"),
+	qc_player_daily_stats=("channel_id", "user_id", "day")
+)
+
+MATCH_COLUMNS = ('match_id', 'channel_id', 'queue_id', 'queue_name', 'alpha_name', 'beta_name', 'winner', 'at')
+
+
+def _rows(match, user_ids, step):
+	""" Rollup rows of a qc_matches row and its players, step is 1 for a new match and -1 for an undone one """
+	channel_id, day = match['channel_id'], match['at'] // DAY
+	queue_name = match['queue_name'] or ""
+	return dict(
+		qc_queue_stats=[dict(channel_id=channel_id, queue_name=queue_name, matches=step)],
+		qc_player_queue_stats=[
+			dict(channel_id=channel_id, user_id=user_id, queue_name=queue_name, matches=step) for user_id in user_ids
+		],
+		qc_team_stats=[dict(
+			channel_id=channel_id, queue_id=match['queue_id'],
+			alpha_name=match['alpha_name'] or "", beta_name=match['beta_name'] or "",
+			matches=step,
+			alpha_wins=step if match['winner'] == 0 else 0,
+			beta_wins=step if match['winner'] == 1 else 0,
+			draws=step if match['winner'] is None else 0
+		)],
+		qc_daily_stats=[dict(channel_id=channel_id, day=day, matches=step)],
+		qc_player_daily_stats=[dict(channel_id=channel_id, user_id=user_id, day=day, matches=step) for user_id in user_ids]
+	)
+
+
+def _accumulate(totals, match, user_ids):
+	""" Sum the rollup rows of the match into totals {table: {key: row}} """
+	for table, rows in _rows(match, user_ids, 1).items():
+		keys = ROLLUPS[table]
+		for row in rows:
+			key = tuple((row[k] for k in keys))
+			if (total := totals[table].get(key)) is None:
+				totals[table][key] = row
+			else:
+				for column, value in row.items():
+					if column not in keys:
+						total[column] += value
+
+
+async def add_match(tx, match, user_ids):
+	""" Count a registered match in the rollups, tx is the transaction registering the match """
+	for table, rows in _rows(match, user_ids, 1).items():
+		await tx.add_many(table, rows, keys=ROLLUPS[table])
+
+
+async def add_matches(tx, matches):
+	""" Count a batch of registered matches, matches are (match, user_ids), rows with the same keys are summed first """
+	totals = {table: dict() for table in ROLLUPS.keys()}
+	for match, user_ids in matches:
+		_accumulate(totals, match, user_ids)
+	for table, rows in totals.items():
+		await tx.add_many(table, rows.values(), keys=ROLLUPS[table])
+
+
+async def remove_match(tx, match, user_ids):
+	""" Subtract an undone match from the rollups and drop the rows left empty """
+	for table, rows in _rows(match, user_ids, -1).items():
+		await tx.add_many(table, rows, keys=ROLLUPS[table])
+		for row in rows:
+			await tx.delete(table, where={**{k: row[k] for k in ROLLUPS[table]}, 'matches__lte': 0})
+
+
+async def rebuild(channel_id):
+	"""
+	Recount the rollups of the channel from its match history, return the number of matches.
+	The history is read before the rollups are replaced, so no match may be registered on the channel meanwhile:
+	it runs before the bot goes ready on startup, the commands refuse to run while the channel has active matches.
+	"""
+	totals = {table: dict() for table in ROLLUPS.keys()}  # {table: {key: row}}
+	count = 0
+
+	after = None
+	while len(page := await db.select(
+		MATCH_COLUMNS, 'qc_matches', where=dict(channel_id=channel_id),
+		order_by=[('match_id', True)], limit=CHUNK, after=after
+	)):
+		after = (page[-1]['match_id'], )
+		players = {m['match_id']: [] for m in page}
+		for p in await db.select(
+			('match_id', 'user_id'), 'qc_player_matches',
+			where=dict(channel_id=channel_id, match_id__between=(page[0]['match_id'], page[-1]['match_id']))
+		):
+			if p['match_id'] in players:
+				players[p['match_id']].append(p['user_id'])
+
+		for m in page:
+			_accumulate(totals, m, players[m['match_id']])
+		count += len(page)
+
+	async with db.transaction() as tx:
+		for table, rows in totals.items():
+			await tx.delete(table, where=dict(channel_id=channel_id))
+			await tx.insert_many(table, rows.values())
+	return count
+
+
+async def reset(channel_id, user_id=None, tx=db):
+	""" Drop the rollups of the channel or only the player ones of the user, optionally as a part of the transaction tx """
+	for table, keys in ROLLUPS.items():
+		if user_id is None:
+			await tx.delete(table, where=dict(channel_id=channel_id))
+		elif 'user_id' in keys:
+			await tx.delete(table, where=dict(channel_id=channel_id, user_id=user_id))
+
+
+async def check_rollups():
+	""" Fill the rollups from the match history if they have never been built """
+	if await db.select_one(('channel_id', ), 'qc_queue_stats', limit=1):
+		return
+	channels = await db.fetchall("SELECT DISTINCT `channel_id` FROM `qc_matches`")
+	if not len(channels):
+		return
+
+	log.info(f"Building stats rollups for {len(channels)} channels...")
+	for row in channels:
+		await rebuild(row['channel_id'])
+	log.info("Done.")
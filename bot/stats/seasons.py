@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+import time
+import asyncio
+
+from core.database import db
+from core.DBAdapters.common import build_where
+
+from bot.stats import rollups
+from bot.stats.players_cache import players_cache
+from bot.stats.leaderboard import leaderboards
+
+CHUNK = 5000
+
+db.ensure_table(dict(
+	tname="qc_seasons",
+	columns=[
+		dict(cname="season_id", ctype=db.types.int, autoincrement=True),
+		dict(cname="channel_id", ctype=db.types.int),
+		dict(cname="number", ctype=db.types.int),
+		dict(cname="name", ctype=db.types.str),
+		dict(cname="started_at", ctype=db.types.int),
+		dict(cname="ended_at", ctype=db.types.int),
+		dict(cname="matches", ctype=db.types.int, notnull=True, default=0),
+		dict(cname="players", ctype=db.types.int, notnull=True, default=0),
+		dict(cname="closing", ctype=db.types.bool, notnull=True, default=0)  # set until the archiving is done
+	],
+	primary_keys=["season_id"],
+	indexes=[
+		dict(columns=["channel_id", "number"], unique=True)
+	]
+))
+
+db.ensure_table(dict(
+	tname="qc_season_leaderboards",
+	columns=[
+		dict(cname="season_id", ctype=db.types.int),
+		dict(cname="user_id", ctype=db.types.int),
+		dict(cname="place", ctype=db.types.int),
+		dict(cname="nick", ctype=db.types.str),
+		dict(cname="rating", ctype=db.types.int),
+		dict(cname="deviation", ctype=db.types.int),
+		dict(cname="wins", ctype=db.types.int, notnull=True, default=0),
+		dict(cname="losses", ctype=db.types.int, notnull=True, default=0),
+		dict(cname="draws", ctype=db.types.int, notnull=True, default=0)
+	],
+	primary_keys=["season_id", "user_id"],
+	indexes=[
+		dict(columns=["season_id", "place"])
+	]
+))
+
+db.ensure_table(dict(
+	tname="qc_matches_archive",
+	columns=[
+		dict(cname="season_id", ctype=db.types.int),
+		dict(cname="match_id", ctype=db.types.int),
+		dict(cname="channel_id", ctype=db.types.int),
+		dict(cname="queue_id", ctype=db.types.int),
+		dict(cname="queue_name", ctype=db.types.str),
+		dict(cname="at", ctype=db.types.int),
+		dict(cname="alpha_name", ctype=db.types.str),
+		dict(cname="beta_name", ctype=db.types.str),
+		dict(cname="ranked", ctype=db.types.bool),
+		dict(cname="winner", ctype=db.types.bool),
+		dict(cname="alpha_score", ctype=db.types.int),
+		dict(cname="beta_score", ctype=db.types.int),
+		dict(cname="maps", ctype=db.types.str)
+	],
+	primary_keys=["match_id"],
+	indexes=[
+		dict(columns=["season_id", "channel_id", "at"])
+	]
+))
+
+db.ensure_table(dict(
+	tname="qc_player_matches_archive",
+	columns=[
+		dict(cname="season_id", ctype=db.types.int),
+		dict(cname="match_id", ctype=db.types.int),
+		dict(cname="channel_id", ctype=db.types.int),
+		dict(cname="user_id", ctype=db.types.int),
+		dict(cname="nick", ctype=db.types.str),
+		dict(cname="team", ctype=db.types.bool)
+	],
+	primary_keys=["match_id", "user_id"],
+	indexes=[
+		dict(columns=["season_id", "channel_id", "user_id"])
+	]
+))
+
+db.ensure_table(dict(
+	tname="qc_rating_history_archive",
+	columns=[
+		dict(cname="season_id", ctype=db.types.int),
+		dict(cname="id", ctype=db.types.int),
+		dict(cname="channel_id", ctype=db.types.int),
+		dict(cname="user_id", ctype=db.types.int),
+		dict(cname="at", ctype=db.types.int),
+		dict(cname="rating_before", ctype=db.types.int),
+		dict(cname="rating_change", ctype=db.types.int),
+		dict(cname="deviation_before", ctype=db.types.int),
+		dict(cname="deviation_change", ctype=db.types.int),
+		dict(cname="match_id", ctype=db.types.int),
+		dict(cname="reason", ctype=db.types.str)
+	],
+	primary_keys=["id"],
+	indexes=[
+		dict(columns=["season_id", "channel_id", "user_id"])
+	]
+))
+
+# {hot table: (archived columns, chunk ordering column)}
+ARCHIVES = dict(
+	qc_matches=((
+		'match_id', 'channel_id', 'queue_id', 'queue_name', 'at', 'alpha_name', 'beta_name',
+		'ranked', 'winner', 'alpha_score', 'beta_score', 'maps'
+	), 'match_id'),
+	qc_player_matches=(('match_id', 'channel_id', 'user_id', 'nick', 'team'), 'match_id'),
+	qc_rating_history=((
+		'id', 'channel_id', 'user_id', 'at', 'rating_before', 'rating_change',
+		'deviation_before', 'deviation_change', 'match_id', 'reason'
+	), 'id')
+)
+
+
+async def get(channel_id, number):
+	""" Return the closed season of the rating channel by its number or None """
+	return await db.select_one(('*', ), 'qc_seasons', where=dict(channel_id=channel_id, number=number, closing=0))
+
+
+async def get_all(channel_id):
+	""" Return the closed seasons of the rating channel, oldest first """
+	return await db.select(
+		('*', ), 'qc_seasons', where=dict(channel_id=channel_id, closing=0), order_by='number', order_asc=True
+	)
+
+
+async def _archive(season_id, table, where):
+	"""
+	Move the rows of the table matching where into its archive table, in chunks of about CHUNK rows.
+	Every chunk is copied and deleted in its own transaction, so the other queries are never blocked for long.
+	"""
+	columns, order = ARCHIVES[table]
+	columns = ", ".join((f"`{c}`" for c in columns))
+	while len(page := await db.select((order, ), table, where=where, order_by=[(order, True)], limit=CHUNK)):
+		conditions, args = build_where({**where, f"{order}__lte": page[-1][order]})
+		async with db.transaction() as tx:
+			await tx.execute(
+				f"INSERT INTO `{table}_archive` (`season_id`, {columns}) SELECT %s, {columns} FROM `{table}`" + conditions,
+				[season_id] + args
+			)
+			await tx.execute(f"DELETE FROM `{table}`" + conditions, args)
+		await asyncio.sleep(0)
+
+
+async def _open(qc, channel_ids, name):
+	""" Write the new season row in the closing state together with its leaderboard snapshot, return the row """
+	channel_id = qc.rating.channel_id
+	last = await db.select_one(('number', 'ended_at'), 'qc_seasons', where=dict(channel_id=channel_id), order_by='number')
+	number = last['number'] + 1 if last else 1
+	if last:
+		started_at = last['ended_at']
+	else:
+		first = await db.select_one(
+			('at', ), 'qc_matches', where=dict(channel_id__in=channel_ids), order_by='match_id', order_asc=True
+		)
+		started_at = first['at'] if first else None
+
+	where, args = build_where(dict(channel_id__in=channel_ids))
+	matches = await db.fetchone("SELECT COUNT(*) AS count FROM `qc_matches`" + where, args)
+	board = await leaderboards.get(channel_id, qc.cfg.lb_min_matches)
+	snapshot = [board.rows[user_id] for rating, user_id in board.keys]
+
+	season = dict(
+		channel_id=channel_id, number=number, name=name or f"Season {number}", started_at=started_at,
+		ended_at=int(time.time()), matches=matches['count'], players=len(snapshot), closing=1
+	)
+	async with db.transaction() as tx:
+		season['season_id'] = season_id = await tx.insert('qc_seasons', season)
+		await tx.insert_many('qc_season_leaderboards', (dict(
+			season_id=season_id, user_id=row['user_id'], place=place, nick=row['nick'], rating=row['rating'],
+			deviation=row['deviation'], wins=row['wins'], losses=row['losses'], draws=row['draws']
+		) for place, row in enumerate(snapshot, start=1)))
+	return season
+
+
+async def close(qc, channel_ids, name=None):
+	"""
+	Close the current season of the rating channel of qc: snapshot the leaderboard, move the matches
+	of the channel_ids and the rating history to the archive tables and reset the rating state.
+	The season is closing until the reset is committed, if an earlier close() failed midway
+	it is resumed instead of opening a new season. Return the qc_seasons row.
+	"""
+	channel_id = qc.rating.channel_id
+	season = await db.select_one(('*', ), 'qc_seasons', where=dict(channel_id=channel_id, closing=1))
+	if season is None:
+		season = await _open(qc, channel_ids, name)
+	season_id = season['season_id']
+
+	await _archive(season_id, 'qc_matches', dict(channel_id__in=channel_ids))
+	await _archive(season_id, 'qc_player_matches', dict(channel_id__in=channel_ids))
+	await _archive(season_id, 'qc_rating_history', dict(channel_id=channel_id))
+
+	async with db.transaction() as tx:
+		await tx.update(
+			'qc_players', dict(rating=None, deviation=None, wins=0, losses=0, draws=0, streak=0, last_ranked_at=None),
+			keys=dict(channel_id=channel_id)
+		)
+		for cid in channel_ids:
+			await rollups.reset(cid, tx=tx)
+		await tx.update('qc_seasons', dict(closing=0), keys=dict(season_id=season_id))
+	players_cache.invalidate(channel_id)
+	season['closing'] = 0
+	return season
+
+
+async def leaderboard_page(season, page, page_size=10):
+	""" Return a page of the final leaderboard snapshot of the season """
+	return await db.select(
+		('nick', 'rating', 'deviation', 'wins', 'losses', 'draws'), 'qc_season_leaderboards',
+		where=dict(season_id=season['season_id'], place__between=(page * page_size + 1, (page + 1) * page_size)),
+		order_by='place', order_asc=True
+	)
+
+
+async def qc_stats(season, channel_id):
+	data = await db.fetchall(
+		"SELECT `queue_name`, COUNT(*) as count FROM `qc_matches_archive` WHERE `season_id`=%s AND `channel_id`=%s " +
+		"GROUP BY `queue_name` ORDER BY count DESC",
+		(season['season_id'], channel_id)
+	)
+	stats = dict(total=sum((i['count'] for i in data)))
+	stats['queues'] = data
+	return stats
+
+
+async def user_stats(season, channel_id, user_id):
+	data = await db.fetchall(
+		"SELECT `queue_name`, COUNT(*) as count FROM `qc_player_matches_archive` AS pm " +
+		"JOIN `qc_matches_archive` AS m ON pm.match_id=m.match_id " +
+		"WHERE pm.season_id=%s AND pm.channel_id=%s AND pm.user_id=%s " +
+		"GROUP BY m.queue_name ORDER BY count DESC",
+		(season['season_id'], channel_id, user_id)
+	)
+	stats = dict(total=sum((i['count'] for i in data)))
+	stats['queues'] = data
+	return stats
+
+
+async def top(season, channel_id, time_gap=None):
+	"""
+	Most active players of the archived season, same as stats.top but counted from the archive tables.
+	time_gap is an absolute time, the callers count the period back from the season ended_at.
+	"""
+	where, args = build_where({'m.season_id': season['season_id'], 'm.channel_id': channel_id, 'm.at__gte': time_gap or 0})
+	total = await db.fetchone("SELECT COUNT(*) as count FROM `qc_matches_archive` AS m" + where, args)
+	data = await db.fetchall(
+		"SELECT MAX(pm.nick) as nick, COUNT(*) as count FROM `qc_player_matches_archive` AS pm " +
+		"JOIN `qc_matches_archive` AS m ON pm.match_id=m.match_id" + where +
+		" GROUP BY pm.user_id ORDER BY count DESC LIMIT 10",
+		args
+	)
+	stats = dict(total=int(total['count'] or 0))
+	stats['players'] = [dict(nick=i['nick'], count=int(i['count'])) for i in data]
+	return stats
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import os
+import math
+import asyncio
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from bot.stats.replay import Replay
+from bot.stats.rating import SCORE_MODES
+
+# grid keys are the queue channel variable names
+PARAMS = dict(
+	rating_initial='init_rp',
+	rating_deviation='init_deviation',
+	rating_min_deviation='min_deviation',
+	rating_scale='scale',
+	rating_loss_scale='loss_scale',
+	rating_win_scale='win_scale',
+	rating_draw_bonus='draw_bonus',
+	rating_ws_boost='ws_boost',
+	rating_ls_boost='ls_boost',
+	rating_score_mode='score_mode'
+)
+BOOLEANS = ('rating_ws_boost', 'rating_ls_boost')
+OPTIONS = dict(rating_score_mode=SCORE_MODES)
+MAX_SETS = 16
+
+def parse_grid(string):
+	"""
+	Parse 'rating_scale=80,100,120 rating_ws_boost=0,1' into the list of all the parameter combinations.
+	"""
+	axes = []
+	for item in string.split():
+		key, _, values = item.partition('=')
+		if key not in PARAMS.keys() or not len(values):
+			raise ValueError(f"Bad grid parameter '{item}', expected one of {', '.join(PARAMS.keys())}.")
+		try:
+			if key in BOOLEANS:
+				values = [v.lower() in ('1', 'true', 'yes', 'on') for v in values.split(',')]
+			elif key in OPTIONS.keys():
+				values = values.lower().split(',')
+				if any((v not in OPTIONS[key] for v in values)):
+					raise ValueError
+			else:
+				values = [int(v) for v in values.split(',')]
+		except ValueError:
+			raise ValueError(f"Bad values of the grid parameter '{key}'.")
+		axes.append([(key, v) for v in values])
+
+	sets = [dict(combination) for combination in itertools.product(*axes)]
+	if len(sets) > MAX_SETS:
+		raise ValueError(f"Too many parameter sets ({len(sets)}), the limit is {MAX_SETS}.")
+	return sets
+
+
+def base_params(qc_cfg):
+	""" Rating kwargs of the queue channel, the same ones QueueChannel.update_rating_system() uses """
+	return {key: getattr(qc_cfg, var) for var, key in PARAMS.items()}
+
+
+def _simulate(user_ids, matches, rating_cls, kwargs, ranks):
+	"""
+	Runs in a worker process: replay the loaded history with the parameters and measure the result.
+	Only plain data is sent to the workers, ranks are (rating, rank name) pairs as the ranks table holds guild roles.
+	"""
+	replay = Replay(rating_cls(channel_id=0, **kwargs), [])
+	replay.user_ids, replay.matches = user_ids, matches
+
+	losses = []
+
+	def observe(team0, team1, winner):
+		# chance of team0 winning by the Elo curve of the team average ratings
+		diff = sum((p['rating'] for p in team1)) / len(team1) - sum((p['rating'] for p in team0)) / len(team0)
+		p = min(max(1 / (1 + 10 ** (diff / 400)), 1e-6), 1 - 1e-6)
+		y = 0.5 if winner is None else (1.0 if winner == 0 else 0.0)
+		losses.append(-(y * math.log(p) + (1 - y) * math.log(1 - p)))
+
+	rating, deviation, wins, played_losses, draws, streak = replay._run_generic(observe)
+	final = rating[(wins + played_losses + draws) > 0]
+
+	thresholds = sorted(ranks)
+	distribution = dict()
+	if len(final) and len(thresholds):
+		places = np.searchsorted([r[0] for r in thresholds], final, side='right') - 1
+		for place, count in zip(*np.unique(places, return_counts=True)):
+			name = thresholds[place][1] if place >= 0 else '〈?〉'
+			distribution[name] = int(count)
+
+	return dict(
+		log_loss=sum(losses) / len(losses) if len(losses) else None,
+		spread=float(final.std()) if len(final) else 0.0,
+		percentiles=[int(i) for i in np.percentile(final, (10, 50, 90))] if len(final) else [],
+		ranks=distribution
+	)
+
+
+async def simulate(qc, channel_ids, sets):
+	"""
+	Replay the rating history of the queue channel once per parameter set on a process pool.
+	The workers are spawned rather than forked, so they do not inherit the bot's db connections and threads.
+	Nothing is written to the database, return ([(parameters, result)], number of replayed matches).
+	"""
+	history = Replay(qc.rating, channel_ids)
+	await history.load()
+
+	rating_cls = type(qc.rating)
+	base = base_params(qc.cfg)
+	ranks = [(r['rating'], r['rank']) for r in qc._ranks_table]
+	loop = asyncio.get_running_loop()
+
+	with ProcessPoolExecutor(
+		max_workers=max(1, min(len(sets), os.cpu_count() or 1)), mp_context=multiprocessing.get_context('spawn')
+	) as pool:
+		results = await asyncio.gather(*(loop.run_in_executor(
+			pool, _simulate, history.user_ids, history.matches, rating_cls,
+			{**base, **{PARAMS[k]: v for k, v in params.items()}}, ranks
+		) for params in sets))
+
+	return list(zip(sets, results)), len(history.matches)
@@ -5,8 +5,12 @@ import asyncio
 import bot
 from core.console import log
 from core.database import db
+from core.DBAdapters.common import build_where
 from core.utils import iter_to_dict, find, get_nick
 
+from bot.stats.players_cache import players_cache
+from bot.stats import rollups
+
 db.ensure_table(dict(
 	tname="players",
 	columns=[
@@ -18,7 +22,7 @@ db.ensure_table(dict(
 	primary_keys=["user_id"]
 ))
 
-db.ensure_table(dict(
+qc_players_added = db.ensure_table(dict(
 	tname="qc_players",
 	columns=[
 		dict(cname="channel_id", ctype=db.types.int),
@@ -30,7 +34,8 @@ db.ensure_table(dict(
 		dict(cname="wins", ctype=db.types.int, notnull=True, default=0),
 		dict(cname="losses", ctype=db.types.int, notnull=True, default=0),
 		dict(cname="draws", ctype=db.types.int, notnull=True, default=0),
-		dict(cname="streak", ctype=db.types.int, notnull=True, default=0)
+		dict(cname="streak", ctype=db.types.int, notnull=True, default=0),
+		dict(cname="last_ranked_at", ctype=db.types.int)
 	],
 	primary_keys=["user_id", "channel_id"]
 ))
@@ -49,9 +54,22 @@ db.ensure_table(dict(
 		dict(cname="match_id", ctype=db.types.int),
 		dict(cname="reason", ctype=db.types.str)
 	],
-	primary_keys=["id"]
+	primary_keys=["id"],
+	indexes=[
+		dict(columns=["user_id", "channel_id", "id"]),
+		dict(columns=["match_id"])
+	]
 ))
 
+# time of the last ranked match of the qc_players row, from its rating history
+LAST_RANKED_AT = (
+	"(SELECT MAX(h.at) FROM `qc_rating_history` AS h " +
+	"WHERE h.channel_id=`qc_players`.`channel_id` AND h.user_id=`qc_players`.`user_id` AND h.match_id IS NOT NULL)"
+)
+
+if 'last_ranked_at' in qc_players_added:  # one-time backfill of the new column
+	db.loop.run_until_complete(db.execute(f"UPDATE `qc_players` SET `last_ranked_at`={LAST_RANKED_AT}"))
+
 db.ensure_table(dict(
 	tname="qc_matches",
 	columns=[
@@ -68,7 +86,11 @@ db.ensure_table(dict(
 		dict(cname="beta_score", ctype=db.types.int),
 		dict(cname="maps", ctype=db.types.str)
 	],
-	primary_keys=["match_id"]
+	primary_keys=["match_id"],
+	indexes=[
+		dict(columns=["channel_id", "queue_id", "match_id"]),
+		dict(columns=["channel_id", "at"])
+	]
 ))
 
 db.ensure_table(dict(
@@ -87,7 +109,10 @@ db.ensure_table(dict(
 		dict(cname="nick", ctype=db.types.str),
 		dict(cname="team", ctype=db.types.bool)
 	],
-	primary_keys=["match_id", "user_id"]
+	primary_keys=["match_id", "user_id"],
+	indexes=[
+		dict(columns=["channel_id", "user_id", "match_id"])
+	]
 ))
 
 db.ensure_table(dict(
@@ -99,9 +124,49 @@ db.ensure_table(dict(
 ))
 
 
+class MatchIds:
+	"""
+	Hands out match ids from a block reserved in qc_match_id_counter with a single atomic increment,
+	the next block is reserved by the next() call which finds the current one used up.
+	Ids left in the block on shutdown are skipped, so the ids are unique but may have gaps.
+	"""
+
+	BLOCK = 16
+
+	def __init__(self):
+		self.next_id = 0
+		self.end = 0  # the current block is [next_id, end)
+		self.lock = asyncio.Lock()
+
+	def reset(self):
+		self.next_id = self.end = 0
+
+	async def reserve(self):
+		async with self.lock:
+			if self.next_id < self.end:
+				return
+			end = await db.increment('qc_match_id_counter', 'next_id', self.BLOCK)
+			self.next_id, self.end = end - self.BLOCK, end
+
+	async def block(self, count):
+		""" Reserve count consecutive ids apart from the current block, return the first one """
+		end = await db.increment('qc_match_id_counter', 'next_id', count)
+		return end - count
+
+	async def next(self):
+		while self.next_id >= self.end:
+			await self.reserve()
+		match_id = self.next_id
+		self.next_id += 1
+		return match_id
+
+
+match_ids = MatchIds()
+
+
 async def check_match_id_counter():
 	"""
-	Set to current max match_id+1 if not persist or less
+	Set to current max match_id+1 if not persist or less, then reserve the first block of ids
 	"""
 	m = await db.select_one(('match_id',), 'qc_matches', order_by='match_id', limit=1)
 	next_known_match = m['match_id']+1 if m else 0
@@ -110,129 +175,131 @@ async def check_match_id_counter():
 		await db.insert('qc_match_id_counter', dict(next_id=next_known_match))
 	elif next_known_match > counter['next_id']:
 		await db.update('qc_match_id_counter', dict(next_id=next_known_match))
+	match_ids.reset()
+	await match_ids.reserve()
 
 
 async def next_match():
-	""" Increase match_id counter, return current match_id """
-	counter = await db.select_one(('next_id',), 'qc_match_id_counter')
-	await db.update('qc_match_id_counter', dict(next_id=counter['next_id']+1))
-	return counter['next_id']
+	""" Return the next match_id, usually without touching the database """
+	return await match_ids.next()
 
 
 async def register_match_unranked(ctx, m):
-	await db.insert('qc_matches', dict(
+	nicks = {p.id: get_nick(p) for p in m.players}
+	match = dict(
 		match_id=m.id, channel_id=m.qc.id, queue_id=m.queue.cfg.p_key, queue_name=m.queue.name,
 		alpha_name=m.teams[0].name, beta_name=m.teams[1].name,
 		at=int(time.time()), ranked=0, winner=None, maps="\n".join(m.maps)
-	))
-
-	await db.insert_many('qc_players', (
-		dict(channel_id=m.qc.id, user_id=p.id)
-		for p in m.players
-	), on_dublicate="ignore")
-
-	for p in m.players:
-		nick = get_nick(p)
-		await db.update(
-			"qc_players",
-			dict(nick=nick),
-			keys=dict(channel_id=m.qc.id, user_id=p.id)
-		)
+	)
 
-		if p in m.teams[0]:
-			team = 0
-		elif p in m.teams[1]:
-			team = 1
-		else:
-			team = None
+	async with db.transaction() as tx:
+		await tx.insert('qc_matches', match)
 
-		await db.insert(
-			'qc_player_matches',
-			dict(match_id=m.id, channel_id=m.qc.id, user_id=p.id, nick=nick, team=team)
-		)
+		await tx.insert_many('qc_players', (
+			dict(channel_id=m.qc.id, user_id=p.id)
+			for p in m.players
+		), on_dublicate="ignore")
+
+		await tx.update_many('qc_players', (
+			dict(nick=nicks[p.id], channel_id=m.qc.id, user_id=p.id)
+			for p in m.players
+		), keys=('channel_id', 'user_id'))
+
+		await tx.insert_many('qc_player_matches', (
+			dict(match_id=m.id, channel_id=m.qc.id, user_id=p.id, nick=nicks[p.id], team=_player_team(m, p))
+			for p in m.players
+		))
+		await rollups.add_match(tx, match, [p.id for p in m.players])
+
+	players_cache.update(m.qc.id, (dict(user_id=p.id, nick=nicks[p.id]) for p in m.players))
+
+
+def _player_team(m, p):
+	if p in m.teams[0]:
+		return 0
+	elif p in m.teams[1]:
+		return 1
+	return None
 
 
 async def register_match_ranked(ctx, m):
-	await db.insert('qc_matches', dict(
+	before = [
+		await m.qc.rating.get_players((p.id for p in m.teams[0])),
+		await m.qc.rating.get_players((p.id for p in m.teams[1])),
+	]
+	after = m.qc.rating.rate_match(*before, m.winner, m.scores)
+
+	after = iter_to_dict((*after[0], *after[1]), key='user_id')
+	before = iter_to_dict((*before[0], *before[1]), key='user_id')
+	nicks = {p.id: get_nick(p) for p in m.players}
+	now = int(time.time())
+
+	match = dict(
 		match_id=m.id, channel_id=m.qc.id, queue_id=m.queue.cfg.p_key, queue_name=m.queue.name,
 		alpha_name=m.teams[0].name, beta_name=m.teams[1].name,
-		at=int(time.time()), ranked=1, winner=m.winner,
+		at=now, ranked=1, winner=m.winner,
 		alpha_score=m.scores[0], beta_score=m.scores[1], maps="\n".join(m.maps)
-	))
+	)
 
-	for channel_id in {m.qc.id, m.qc.rating.channel_id}:
-		await db.insert_many('qc_players', (
-			dict(channel_id=channel_id, user_id=p.id, nick=get_nick(p))
-			for p in m.players
-		), on_dublicate="ignore")
+	# Write everything in a single transaction, so a failure can not leave ratings half-applied
+	async with db.transaction() as tx:
+		await tx.insert('qc_matches', match)
 
-	results = [[
-		await m.qc.rating.get_players((p.id for p in m.teams[0])),
-		await m.qc.rating.get_players((p.id for p in m.teams[1])),
-	]]
-
-	if m.winner is None:  # draw
-		after = m.qc.rating.rate(winners=results[0][0], losers=results[0][1], draw=True)
-		results.append(after)
-	else:  # process actual scores
-		n = 0
-		while n < m.scores[0] or n < m.scores[1]:
-			if n < m.scores[0]:
-				after = m.qc.rating.rate(winners=results[-1][0], losers=results[-1][1], draw=False)
-				results.append(after)
-			if n < m.scores[1]:
-				after = m.qc.rating.rate(winners=results[-1][1], losers=results[-1][0], draw=False)
-				results.append(after[::-1])
-			n += 1
-
-	after = iter_to_dict((*results[-1][0], *results[-1][1]), key='user_id')
-	before = iter_to_dict((*results[0][0], *results[0][1]), key='user_id')
-
-	for p in m.players:
-		nick = get_nick(p)
-		team = 0 if p in m.teams[0] else 1
-
-		await db.update(
-			"qc_players",
+		for channel_id in {m.qc.id, m.qc.rating.channel_id}:
+			await tx.insert_many('qc_players', (
+				dict(channel_id=channel_id, user_id=p.id, nick=nicks[p.id])
+				for p in m.players
+			), on_dublicate="ignore")
+
+		await tx.update_many("qc_players", (
 			dict(
-				nick=nick,
+				nick=nicks[p.id],
 				rating=after[p.id]['rating'],
 				deviation=after[p.id]['deviation'],
 				wins=after[p.id]['wins'],
 				losses=after[p.id]['losses'],
 				draws=after[p.id]['draws'],
-				streak=after[p.id]['streak']
-			),
-			keys=dict(channel_id=m.qc.rating.channel_id, user_id=p.id)
-		)
+				streak=after[p.id]['streak'],
+				last_ranked_at=now,
+				channel_id=m.qc.rating.channel_id,
+				user_id=p.id
+			) for p in m.players
+		), keys=('channel_id', 'user_id'))
+
+		await tx.insert_many('qc_player_matches', (
+			dict(match_id=m.id, channel_id=m.qc.id, user_id=p.id, nick=nicks[p.id], team=0 if p in m.teams[0] else 1)
+			for p in m.players
+		))
+		await rollups.add_match(tx, match, [p.id for p in m.players])
 
-		await db.insert(
-			'qc_player_matches',
-			dict(match_id=m.id, channel_id=m.qc.id, user_id=p.id, nick=nick, team=team)
-		)
-		await db.insert('qc_rating_history', dict(
-			channel_id=m.qc.rating.channel_id,
-			user_id=p.id,
-			at=int(time.time()),
-			rating_before=before[p.id]['rating'],
-			rating_change=after[p.id]['rating']-before[p.id]['rating'],
-			deviation_before=before[p.id]['deviation'],
-			deviation_change=after[p.id]['deviation']-before[p.id]['deviation'],
-			match_id=m.id,
-			reason=m.queue.name
+		await tx.insert_many('qc_rating_history', (
+			dict(
+				channel_id=m.qc.rating.channel_id,
+				user_id=p.id,
+				at=now,
+				rating_before=before[p.id]['rating'],
+				rating_change=after[p.id]['rating']-before[p.id]['rating'],
+				deviation_before=before[p.id]['deviation'],
+				deviation_change=after[p.id]['deviation']-before[p.id]['deviation'],
+				match_id=m.id,
+				reason=m.queue.name
+			) for p in m.players
 		))
 
+	players_cache.update(m.qc.rating.channel_id, ({**after[p.id], 'nick': nicks[p.id]} for p in m.players))
 	await m.qc.update_rating_roles(*m.players)
 	await m.print_rating_results(ctx, before, after)
 
 
 async def undo_match(ctx, match_id):
-	match = await db.select_one(('ranked', 'winner'), 'qc_matches', where=dict(match_id=match_id, channel_id=ctx.qc.id))
+	match = await db.select_one(
+		('ranked', *rollups.MATCH_COLUMNS), 'qc_matches', where=dict(match_id=match_id, channel_id=ctx.qc.id)
+	)
 	if not match:
 		return False
 
+	p_matches = await db.select(('user_id', 'team'), 'qc_player_matches', where=dict(match_id=match_id))
 	if match['ranked']:
-		p_matches = await db.select(('user_id', 'team'), 'qc_player_matches', where=dict(match_id=match_id))
 		p_history = iter_to_dict(
 			await db.select(
 				('user_id', 'rating_change', 'deviation_change'), 'qc_rating_history', where=dict(match_id=match_id)
@@ -246,7 +313,6 @@ async def undo_match(ctx, match_id):
 			new = stats[p['user_id']]
 			changes = p_history[p['user_id']]
 
-			print(match['winner'])
 			if match['winner'] is None:
 				new['draws'] = max((new['draws'] - 1, 0))
 			elif match['winner'] == p['team']:
@@ -257,13 +323,24 @@ async def undo_match(ctx, match_id):
 			new['rating'] = max((new['rating']-changes['rating_change'], 0))
 			new['deviation'] = max((new['deviation']-changes['deviation_change'], 0))
 
-			await db.update("qc_players", new, keys=dict(channel_id=ctx.qc.rating.channel_id, user_id=p['user_id']))
-		await db.delete("qc_rating_history", where=dict(match_id=match_id))
+	async with db.transaction() as tx:
+		if match['ranked']:
+			await tx.update_many("qc_players", (
+				{**stats[p['user_id']], 'channel_id': ctx.qc.rating.channel_id} for p in p_matches
+			), keys=('channel_id', 'user_id'))
+			await tx.delete("qc_rating_history", where=dict(match_id=match_id))
+			where, args = build_where(dict(
+				channel_id=ctx.qc.rating.channel_id, user_id__in=[p['user_id'] for p in p_matches]
+			))
+			await tx.execute(f"UPDATE `qc_players` SET `last_ranked_at`={LAST_RANKED_AT}" + where, args)
+		await tx.delete('qc_player_matches', where=dict(match_id=match_id))
+		await tx.delete('qc_matches', where=dict(match_id=match_id))
+		await rollups.remove_match(tx, match, [p['user_id'] for p in p_matches])
+
+	if match['ranked']:
+		players_cache.update(ctx.qc.rating.channel_id, stats.values())
 		members = (ctx.channel.guild.get_member(p['user_id']) for p in p_matches)
 		await ctx.qc.update_rating_roles(*(m for m in members if m is not None))
-
-	await db.delete('qc_player_matches', where=dict(match_id=match_id))
-	await db.delete('qc_matches', where=dict(match_id=match_id))
 	return True
 
 
@@ -273,6 +350,8 @@ async def reset_channel(channel_id):
 	await db.delete("qc_rating_history", where=where)
 	await db.delete("qc_matches", where=where)
 	await db.delete("qc_player_matches", where=where)
+	await rollups.reset(channel_id)
+	players_cache.invalidate(channel_id)
 
 
 async def reset_player(channel_id, user_id):
@@ -280,6 +359,8 @@ async def reset_player(channel_id, user_id):
 	await db.delete("qc_players", where=where)
 	await db.delete("qc_rating_history", where=where)
 	await db.delete("qc_player_matches", where=where)
+	await rollups.reset(channel_id, user_id)
+	players_cache.remove(channel_id, user_id)
 
 
 async def replace_player(channel_id, user_id1, user_id2, new_nick):
@@ -288,12 +369,14 @@ async def replace_player(channel_id, user_id1, user_id2, new_nick):
 	await db.update("qc_players", {'user_id': user_id2, 'nick': new_nick}, where)
 	await db.update("qc_rating_history", {'user_id': user_id2}, where)
 	await db.update("qc_player_matches", {'user_id': user_id2}, where)
+	await rollups.rebuild(channel_id)
+	players_cache.invalidate(channel_id)
 
 
 async def qc_stats(channel_id):
 	data = await db.fetchall(
-		"SELECT `queue_name`, COUNT(*) as count FROM `qc_matches` WHERE `channel_id`=%s " +
-		"GROUP BY `queue_name` ORDER BY count DESC",
+		"SELECT `queue_name`, `matches` AS count FROM `qc_queue_stats` " +
+		"WHERE `channel_id`=%s AND `matches`>0 ORDER BY `matches` DESC",
 		(channel_id,)
 	)
 	stats = dict(total=sum((i['count'] for i in data)))
@@ -303,10 +386,8 @@ async def qc_stats(channel_id):
 
 async def user_stats(channel_id, user_id):
 	data = await db.fetchall(
-		"SELECT `queue_name`, COUNT(*) as count FROM `qc_player_matches` AS pm " +
-		"JOIN `qc_matches` AS m ON pm.match_id=m.match_id " +
-		"WHERE pm.channel_id=%s AND user_id=%s " +
-		"GROUP BY m.queue_name ORDER BY count DESC",
+		"SELECT `queue_name`, `matches` AS count FROM `qc_player_queue_stats` " +
+		"WHERE `channel_id`=%s AND `user_id`=%s AND `matches`>0 ORDER BY `matches` DESC",
 		(channel_id, user_id)
 	)
 	stats = dict(total=sum((i['count'] for i in data)))
@@ -315,39 +396,34 @@ async def user_stats(channel_id, user_id):
 
 
 async def top(channel_id, time_gap=None):
-	total = await db.fetchone(
-		"SELECT COUNT(*) as count FROM `qc_matches` WHERE channel_id=%s" + (f" AND at>{time_gap} " if time_gap else ""),
-		(channel_id, )
-	)
-
+	""" Most active players, time_gap is rounded down to the start of its day """
+	if time_gap:
+		total_table, players_table = "qc_daily_stats", "qc_player_daily_stats"
+		where, args = build_where({'channel_id': channel_id, 'day__gte': time_gap // rollups.DAY})
+		p_where, p_args = build_where({'s.channel_id': channel_id, 's.day__gte': time_gap // rollups.DAY})
+	else:
+		total_table, players_table = "qc_queue_stats", "qc_player_queue_stats"
+		where, args = build_where({'channel_id': channel_id})
+		p_where, p_args = build_where({'s.channel_id': channel_id})
+
+	total = await db.fetchone(f"SELECT SUM(`matches`) as count FROM `{total_table}`" + where, args)
 	data = await db.fetchall(
-		"SELECT p.nick as nick, COUNT(*) as count FROM `qc_player_matches` AS pm " +
-		"JOIN `qc_players` AS p ON pm.user_id=p.user_id AND pm.channel_id=p.channel_id " +
-		"JOIN `qc_matches` AS m ON pm.match_id=m.match_id " +
-		"WHERE pm.channel_id=%s " +
-		(f"AND m.at>{time_gap} " if time_gap else "") +
-		"GROUP BY p.user_id ORDER BY count DESC LIMIT 10",
-		(channel_id, )
+		f"SELECT p.nick as nick, SUM(s.matches) as count FROM `{players_table}` AS s " +
+		"JOIN `qc_players` AS p ON s.user_id=p.user_id AND s.channel_id=p.channel_id" +
+		p_where +
+		" GROUP BY s.user_id, p.nick HAVING count > 0 ORDER BY count DESC LIMIT 10",
+		p_args
 	)
-	stats = dict(total=total['count'])
-	stats['players'] = data
+	stats = dict(total=int(total['count'] or 0))
+	stats['players'] = [dict(nick=i['nick'], count=int(i['count'])) for i in data]
 	return stats
 
 
 async def last_games(channel_id):
-	#  get last played ranked match for all players
-	data = await db.fetchall(
-		"SELECT tmp.at, p.* " +
-		"FROM `qc_players` AS p " +
-		"LEFT JOIN (" +
-		"  SELECT MAX(h.at) AS at, h.user_id FROM `qc_rating_history` AS h" +
-		"    WHERE h.channel_id=%s AND h.match_id IS NOT NULL" +
-		"    GROUP BY h.user_id" +
-		") AS tmp ON p.user_id=tmp.user_id " +
-		"WHERE p.channel_id=%s",
-		(channel_id, channel_id)
+	""" Players of the rating channel with the time of their last ranked match """
+	return await db.select(
+		('user_id', 'rating', 'deviation', 'last_ranked_at'), 'qc_players', where=dict(channel_id=channel_id)
 	)
-	return data
 
 
 class StatsJobs:
@@ -369,17 +445,30 @@ class StatsJobs:
 		d += datetime.timedelta(days=1)
 		return d
 
-	@staticmethod
-	async def apply_rating_decays():
+	DECAY_CONCURRENCY = 8  # channels decayed at the same time
+
+	async def apply_rating_decays(self):
 		log.info("--- Applying weekly deviation decays ---")
-		for qc in bot.queue_channels.values():
-			await qc.apply_rating_decay()
-			await asyncio.sleep(1)
-
-	async def think(self, frame_time):
-		if frame_time > self.next_decay_at:
-			self.next_decay_at = int(self.next_monday().timestamp())
-			asyncio.create_task(self.apply_rating_decays())
+		semaphore = asyncio.Semaphore(self.DECAY_CONCURRENCY)
+
+		async def apply(qc):
+			async with semaphore:
+				try:
+					await qc.apply_rating_decay()
+				except Exception as e:
+					log.error(f"Failed to apply rating decay on channel {qc.id}: {e}")
+
+		at = time.perf_counter()
+		await asyncio.gather(*(apply(qc) for qc in list(bot.queue_channels.values())))
+		log.info(f"--- Rating decays applied in {time.perf_counter() - at:.1f}s ---")
+
+	def schedule(self):
+		bot.scheduler.set(('rating_decay', ), self.next_decay_at, self.decay)
+
+	async def decay(self, frame_time):
+		self.next_decay_at = int(self.next_monday().timestamp())
+		self.schedule()
+		asyncio.create_task(self.apply_rating_decays())
 
 
 jobs = StatsJobs()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Closed-form TrueSkill update for a match between two teams without partial play.
+With two teams the factor graph of the trueskill library has no loops, so its result is exactly
+the truncated Gaussian update below, computed for all the team members at once.
+"""
+from math import sqrt
+from statistics import NormalDist
+
+import numpy as np
+
+_normal = NormalDist()
+
+
+def draw_margin(draw_probability, size, beta):
+	return _normal.inv_cdf((draw_probability + 1) / 2.0) * sqrt(size) * beta
+
+
+def v_w_win(t, e):
+	x = t - e
+	cdf = _normal.cdf(x)
+	v = _normal.pdf(x) / cdf if cdf else -x
+	w = v * (v + x)
+	if not 0 < w < 1:
+		raise FloatingPointError(f"Truncated gaussian update is out of range: w={w}.")
+	return v, w
+
+
+def v_w_draw(t, e):
+	abs_t = abs(t)
+	a, b = e - abs_t, -e - abs_t
+	denom = _normal.cdf(a) - _normal.cdf(b)
+	if not denom:
+		raise FloatingPointError("Draw probability of the match is too small.")
+	v = (_normal.pdf(b) - _normal.pdf(a)) / denom
+	w = v ** 2 + (a * _normal.pdf(a) - b * _normal.pdf(b)) / denom
+	if not 0 < w < 1:
+		raise FloatingPointError(f"Truncated gaussian update is out of range: w={w}.")
+	return (-v if t < 0 else v), w
+
+
+def rate(winners, losers, beta, tau, draw_probability, draw=False):
+	"""
+	winners and losers are sequences of (mu, sigma), return the new (mu, sigma) arrays for both teams.
+	Raises FloatingPointError when the update is numerically unstable, the library copes with these cases.
+	"""
+	mu0, sigma0 = (np.asarray(i, dtype=np.float64) for i in zip(*winners))
+	mu1, sigma1 = (np.asarray(i, dtype=np.float64) for i in zip(*losers))
+
+	var0 = sigma0 ** 2 + tau ** 2
+	var1 = sigma1 ** 2 + tau ** 2
+	c2 = var0.sum() + var1.sum() + (len(mu0) + len(mu1)) * beta ** 2
+	c = sqrt(c2)
+	t = (mu0.sum() - mu1.sum()) / c
+	e = draw_margin(draw_probability, len(mu0) + len(mu1), beta) / c
+
+	v, w = v_w_draw(t, e) if draw else v_w_win(t, e)
+
+	return (
+		(mu0 + var0 / c * v, np.sqrt(var0 * (1 - var0 / c2 * w))),
+		(mu1 - var1 / c * v, np.sqrt(var1 * (1 - var1 / c2 * w)))
+	)
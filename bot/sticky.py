@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import traceback
+
+from nextcord import DiscordException
+from core.client import dc
+from core.console import log
+from core.utils import find
+
+import bot
+
+
+class StickyEmbeds:
+	"""
+	Keeps the queue embeds of a channel below the other messages.
+	Driven by on_message: once a message lands below an embed, the channel gets a single
+	task which waits for the burst of messages to settle and re-posts the buried embeds.
+	The embeds message ids live in QueueChannel.queue_embeds.
+	"""
+
+	DEBOUNCE = 3  # seconds to wait for more messages before re-posting
+
+	def __init__(self):
+		self.last_message = dict()  # {channel_id: id of the newest message which is not a queue embed}
+		self.tasks = dict()  # {channel_id: Task()}
+		self.posting = set()  # channel ids with a re-post in progress
+
+	@staticmethod
+	def embeds(qc, channel_id):
+		""" Return {queue_name: message_id} of the queue embeds posted in the channel """
+		embeds = dict()
+		for key, message_id in qc.queue_embeds.items():
+			queue_name, key_channel_id = key.rsplit('_', 1)
+			if key_channel_id == str(channel_id):
+				embeds[queue_name] = message_id
+		return embeds
+
+	def buried(self, qc, channel_id):
+		""" Return names of the queues which embeds are not at the bottom of the channel """
+		last_message = self.last_message.get(channel_id, 0)
+		return [name for name, message_id in self.embeds(qc, channel_id).items() if message_id < last_message]
+
+	def on_message(self, message):
+		if (qc := bot.queue_channels.get(message.channel.id)) is None or not len(qc.queue_embeds):
+			return
+
+		embeds = self.embeds(qc, message.channel.id)
+		if not len(embeds) or message.id in embeds.values():
+			return
+		# the gateway event of a re-posted embed may arrive before channel.send() returns and its id is saved,
+		# counting it as a foreign message would bury the other embeds of the channel on every re-post
+		if message.channel.id in self.posting and message.author.id == dc.user.id:
+			return
+
+		self.last_message[message.channel.id] = max(message.id, self.last_message.get(message.channel.id, 0))
+		if message.channel.id not in self.tasks:
+			self.tasks[message.channel.id] = asyncio.create_task(self.run(qc, message.channel))
+
+	async def run(self, qc, channel):
+		try:
+			while True:
+				await asyncio.sleep(self.DEBOUNCE)
+				if not len(buried := self.buried(qc, channel.id)):
+					break
+				for queue_name in buried:
+					await self.repost(qc, channel, queue_name)
+		except Exception as e:
+			log.error(f"Error keeping queue embeds at the bottom of {channel.id}: {str(e)}\n{traceback.format_exc()}")
+		finally:
+			self.tasks.pop(channel.id, None)
+
+	async def repost(self, qc, channel, queue_name):
+		""" Post the queue embed again and delete the old message """
+		channel_key = f"{queue_name}_{channel.id}"
+		if (q := find(lambda i: i.name.lower() == queue_name.lower(), qc.queues)) is None:
+			return
+
+		old_message_id = qc.queue_embeds.get(channel_key)
+		embed, view = bot.commands.queues.render_queue_embed(q, queue_name)
+		self.posting.add(channel.id)
+		try:
+			new_message = await channel.send(embed=embed, view=view)
+		finally:
+			self.posting.discard(channel.id)
+		qc.queue_embeds[channel_key] = new_message.id
+		qc.queue_views[queue_name] = view
+		dc.add_view(view, message_id=new_message.id)
+
+		if old_message_id:
+			bot.editor.forget(old_message_id)
+			try:
+				await channel.get_partial_message(old_message_id).delete()
+			except DiscordException:
+				pass
+
+	def cancel(self, channel_id):
+		if (task := self.tasks.pop(channel_id, None)) is not None:
+			task.cancel()
+		self.last_message.pop(channel_id, None)
+
+
+sticky = StickyEmbeds()
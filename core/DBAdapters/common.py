@@ -7,6 +7,110 @@ def peek(it):
 	return first, chain([first], it)
 
 
+operators = {
+	'eq': "{} = %s",
+	'ne': "{} <> %s",
+	'lt': "{} < %s",
+	'lte': "{} <= %s",
+	'gt': "{} > %s",
+	'gte': "{} >= %s"
+}
+
+
+def quote(column):
+	""" `column` or `table`.`column` """
+	return ".".join((f"`{i}`" for i in column.split(".")))
+
+
+def build_where(where):
+	"""
+	Build the WHERE clause and its args from a dict of conditions joined with AND.
+	Keys are column names with an optional operator suffix:
+	col, col__ne, col__lt, col__lte, col__gt, col__gte: comparison with the value,
+	col__in: value is an iterable, an empty one matches nothing,
+	col__between: value is a (low, high) pair,
+	col__isnull: value is a bool.
+	"""
+	if not where:
+		return "", []
+
+	conditions, args = [], []
+	for key, value in where.items():
+		column, _, op = key.partition("__")
+		column = quote(column)
+		if op in ('', 'eq', 'ne', 'lt', 'lte', 'gt', 'gte'):
+			conditions.append(operators[op or 'eq'].format(column))
+			args.append(value)
+		elif op == 'in':
+			value = list(value)
+			if len(value):
+				conditions.append("{} IN ({})".format(column, ", ".join(("%s" for i in value))))
+				args.extend(value)
+			else:
+				conditions.append("0 = 1")
+		elif op == 'between':
+			conditions.append(f"{column} BETWEEN %s AND %s")
+			args.extend(value)
+		elif op == 'isnull':
+			conditions.append(f"{column} IS NULL" if value else f"{column} IS NOT NULL")
+		else:
+			raise ValueError(f"Unknown operator in condition '{key}'.")
+
+	return " WHERE " + " AND ".join(conditions), args
+
+
+def build_order(order_by, order_asc=False):
+	"""
+	Return [(column, asc)] from a column name or a list of column names and (column, asc) pairs,
+	the columns without a direction use order_asc.
+	"""
+	if not order_by:
+		return []
+	if isinstance(order_by, str):
+		order_by = [order_by]
+	return [(i, order_asc) if isinstance(i, str) else (i[0], i[1]) for i in order_by]
+
+
+def build_select(columns, table, where=None, order_by=None, order_asc=False, limit=None, after=None):
+	"""
+	Build a SELECT request and its args.
+	after is the keyset pagination: the values of the order_by columns of the last row of the previous page,
+	only the rows which come after it in the requested order are returned.
+	"""
+	conditions, args = build_where(where)
+	order = build_order(order_by, order_asc)
+
+	if after is not None:
+		after = list(after)
+		if len(after) != len(order):
+			raise ValueError("Keyset pagination requires a value for every order_by column.")
+		# (c1 > v1) OR (c1 = v1 AND c2 > v2) OR ..., works with mixed directions on both databases
+		keyset = []
+		for n, (column, asc) in enumerate(order):
+			keyset.append("(" + " AND ".join(
+				[f"{quote(c)} = %s" for c, _ in order[:n]] + [f"{quote(column)} {'>' if asc else '<'} %s"]
+			) + ")")
+			args.extend(list(after[:n]) + [after[n]])
+		keyset = "(" + " OR ".join(keyset) + ")"
+		conditions = (conditions + " AND " + keyset) if conditions else " WHERE " + keyset
+
+	request = "SELECT {columns} FROM `{table}`{where}{order}{limit}".format(
+		columns=', '.join(columns),
+		table=table,
+		where=conditions,
+		order=(" ORDER BY " + ", ".join((f"{c} {'ASC' if asc else 'DESC'}" for c, asc in order))) if order else "",
+		limit=" LIMIT %s" if limit else ""
+	)
+	if limit:
+		args.append(int(limit))
+	return request, args
+
+
+def index_name(tname, index):
+	""" Index names are unique per database in sqlite, so the default one includes the table name """
+	return index['iname'] or "{}__{}".format(tname, "_".join(index['columns']))
+
+
 class DatabaseError(Exception):
 	"""Exception raised for errors that are related to the
 	database."""
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import aiomysql
+from contextlib import asynccontextmanager
 from pymysql import err as mysqlErr
 from .common import *
 
@@ -22,9 +23,10 @@ reference_options = dict(
 	SET_DEFAULT='SET DEFAULT'
 )
 
-table_blank = dict(tname=None, columns=[], primary_keys=[], foreign_keys=[])
+table_blank = dict(tname=None, columns=[], primary_keys=[], foreign_keys=[], indexes=[])
 column_blank = dict(cname=None, ctype=Types.str, notnull=False, unique=False, autoincrement=False, default=None)
 fkey_blank = dict(cname=None, refTable=None, refColumn=None, on_delete=None, on_update=None)
+index_blank = dict(iname=None, columns=[], unique=False)
 
 
 class Adapter:
@@ -93,6 +95,21 @@ class Adapter:
 				except mysqlErr.Error as e:
 					self.wrap_exc(e)
 
+	async def stream(self, request, args=None, size=1000):
+		""" Yield the result rows in lists of up to size rows, read from an unbuffered server-side cursor """
+		async with self.pool.acquire() as conn:
+			async for rows in self._stream(conn, request, args, size):
+				yield rows
+
+	async def _stream(self, conn, request, args, size):
+		async with conn.cursor(aiomysql.SSDictCursor) as cur:
+			try:
+				await cur.execute(request, args)
+				while len(rows := await cur.fetchmany(size)):
+					yield rows
+			except mysqlErr.Error as e:
+				self.wrap_exc(e)
+
 	@staticmethod
 	def _mysql_column(kwargs):
 		return "`{cname}` {ctype}{notnull}{unique}{autoincrement}{default}".format(
@@ -146,9 +163,40 @@ class Adapter:
 		)
 
 		await self.execute(request)
+		for index in table['indexes']:
+			await self.create_index(table['tname'], index)
+
+	async def create_index(self, tname, index):
+		index = {**index_blank, **index}
+		await self.execute("CREATE {unique}INDEX `{iname}` ON {tname} ({columns})".format(
+			unique="UNIQUE " if index['unique'] else "",
+			iname=index_name(tname, index),
+			tname=tname,
+			columns=", ".join((f"`{i}`" for i in index['columns']))
+		))
+
+	async def _ensure_indexes(self, table):
+		""" Create the missing indexes and recreate the ones which columns differ, undeclared indexes are kept """
+		rows = await self.fetchall("\n".join((
+			"SELECT INDEX_NAME, COLUMN_NAME, NON_UNIQUE FROM INFORMATION_SCHEMA.STATISTICS",
+			"WHERE TABLE_NAME = %s AND TABLE_SCHEMA = %s ORDER BY INDEX_NAME, SEQ_IN_INDEX"
+		)), (table['tname'], self.dbName))
+		existing = dict()  # {index_name: ([columns], unique)}
+		for row in rows:
+			existing.setdefault(row['INDEX_NAME'], ([], not row['NON_UNIQUE']))[0].append(row['COLUMN_NAME'])
+
+		for index in table['indexes']:
+			index = {**index_blank, **index}
+			iname = index_name(table['tname'], index)
+			if iname in existing.keys():
+				if existing[iname] == (list(index['columns']), bool(index['unique'])):
+					continue
+				await self.execute("DROP INDEX `{}` ON {}".format(iname, table['tname']))
+			await self.create_index(table['tname'], index)
 
 	def ensure_table(self, table):
-		self.loop.run_until_complete(self._ensure_table(table))
+		""" Create the table or add the missing columns and indexes, return the names of the added columns """
+		return self.loop.run_until_complete(self._ensure_table(table))
 
 	async def _ensure_table(self, table):
 		table = {**table_blank, **table}
@@ -161,12 +209,14 @@ class Adapter:
 		# Create table if not exist
 		if not len(columns):
 			await self.create_table(table)
-			return
+			return []
 
 		# Create columns if not exist
+		added = []
 		for col in table['columns']:
 			col = {**column_blank, **col}
 			if col['cname'] not in columns.keys():
+				added.append(col['cname'])
 				await self.execute("ALTER TABLE {tname} ADD COLUMN {column_sql}".format(
 					tname=table['tname'],
 					column_sql=self._mysql_column({**column_blank, **col})
@@ -182,10 +232,13 @@ class Adapter:
 					"Column '{}' types are mismatching, {} and {}".format(col['cname'], col['ctype'], columns[col['cname']])
 				))
 
-	async def select(self, columns, table, where=None, order_by=None, order_asc=False, limit=None, one=False):
-		conditions = " WHERE " + " AND ".join(("`{}`=%s".format(k) for k in where.keys())) if where else ''
-		args = list(where.values()) if where else ()
+		await self._ensure_indexes(table)
+		return added
 
+	async def select(
+		self, columns, table, where=None, order_by=None, order_asc=False, limit=None, one=False, after=None
+	):
+		""" See build_where() for the conditions syntax and build_select() for ordering and keyset pagination """
 		# fix queries where there are some restricted words, for example in MySQL 8 'rank' is restricted
 		sql_restricted_words = [
 				'rank',
@@ -193,14 +246,7 @@ class Adapter:
 		]
 		columns = [f"`{col}`" if col in sql_restricted_words else col for col in columns]
 
-		request = "SELECT {columns} FROM `{table}`{where}{order}{limit}".format(
-			columns=', '.join(columns),
-			table=table,
-			where=conditions,
-			order=" ORDER BY "+order_by+(" ASC" if order_asc else " DESC") if order_by else "",
-			limit=(" LIMIT " + str(limit)) if limit else ""
-		)
-
+		request, args = build_select(columns, table, where, order_by, order_asc, limit, after)
 		if one:
 			return await self.fetchone(request, args)
 		else:
@@ -210,8 +256,7 @@ class Adapter:
 		return await self.select(*args, **kwargs, one=True)
 
 	async def delete(self, table, where=None):
-		conditions = " WHERE " + " AND ".join(("`{}`=%s".format(k) for k in where.keys())) if where else ''
-		args = list(where.values()) if where else ()
+		conditions, args = build_where(where)
 		await self.execute("DELETE FROM {}{}".format(table, conditions), args)
 
 	async def insert(self, table, d, on_dublicate=None):
@@ -232,6 +277,52 @@ class Adapter:
 		request = self._mysql_insert(first.keys(), table, on_dublicate)
 		await self.executemany(request, (list(d.values()) for d in it))
 
+	async def update_many(self, table, it, keys):
+		""" Update rows found by the keys columns, every dict must contain the keys values as well """
+		try:
+			first, it = peek(iter(it))
+		except StopIteration:
+			return
+
+		columns = [k for k in first.keys() if k not in keys]
+		request = self._mysql_update(table, columns, keys)
+		await self.executemany(request, ([d[c] for c in columns] + [d[k] for k in keys] for d in it))
+
+	async def add_many(self, table, it, keys):
+		""" Insert the rows, or add their values to the existing rows with the same keys columns """
+		try:
+			first, it = peek(iter(it))
+		except StopIteration:
+			return
+
+		columns = list(first.keys())
+		request = self._mysql_insert(columns, table, None) + " ON DUPLICATE KEY UPDATE " + ", ".join((
+			"`{0}`=`{0}`+VALUES(`{0}`)".format(c) for c in columns if c not in keys
+		))
+		await self.executemany(request, ([d[c] for c in columns] for d in it))
+
+	async def increment(self, table, column, step=1, where=None):
+		""" Atomically add step to the column and return the new value, a single round trip """
+		conditions, args = build_where(where)
+		# LAST_INSERT_ID(expr) makes the new value come back as the insert id of the statement
+		return await self.execute(
+			"UPDATE {table} SET `{column}` = LAST_INSERT_ID(`{column}` + %s){where}".format(
+				table=table, column=column, where=conditions
+			), [step] + args
+		)
+
+	@asynccontextmanager
+	async def transaction(self):
+		""" Run all queries inside the block on a single connection and commit them at once """
+		async with self.pool.acquire() as conn:
+			await conn.begin()
+			try:
+				yield Transaction(self, conn)
+			except BaseException:
+				await conn.rollback()
+				raise
+			await conn.commit()
+
 	async def close(self):
 		self.pool.close()
 		await self.pool.wait_closed()
@@ -252,3 +343,53 @@ class Adapter:
 
 		else:
 			raise DatabaseError() from e
+
+
+class Transaction(Adapter):
+	""" Adapter bound to a single connection with an open transaction """
+
+	def __init__(self, adapter, conn):
+		self.dbAddress = adapter.dbAddress
+		self.dbName = adapter.dbName
+		self.loop = adapter.loop
+		self.conn = conn
+
+	async def execute(self, *args):
+		async with self.conn.cursor() as cur:
+			try:
+				await cur.execute(*args)
+				return cur.lastrowid
+			except Exception as e:
+				self.wrap_exc(e)
+
+	async def executemany(self, *args):
+		async with self.conn.cursor() as cur:
+			try:
+				await cur.executemany(*args)
+			except mysqlErr.Error as e:
+				self.wrap_exc(e)
+
+	async def fetchone(self, *args):
+		async with self.conn.cursor() as cur:
+			try:
+				await cur.execute(*args)
+				return await cur.fetchone()
+			except mysqlErr.Error as e:
+				self.wrap_exc(e)
+
+	async def fetchall(self, *args):
+		async with self.conn.cursor() as cur:
+			try:
+				await cur.execute(*args)
+				return await cur.fetchall()
+			except mysqlErr.Error as e:
+				self.wrap_exc(e)
+
+	async def stream(self, request, args=None, size=1000):
+		async for rows in self._stream(self.conn, request, args, size):
+			yield rows
+
+	@asynccontextmanager
+	async def transaction(self):
+		""" Nested blocks are just a part of the outer transaction """
+		yield self
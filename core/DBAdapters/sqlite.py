@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+from asyncio import Lock
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from .common import *
+
+from core.console import log
+
+
+class Types:
+	bool = "BOOLEAN"
+	int = "INTEGER"
+	float = "REAL"
+	str = "VARCHAR(191)"
+	text = "VARCHAR(2000)"
+	dict = "TEXT"
+
+
+reference_options = dict(
+	RESTRICT='RESTRICT',
+	CASCADE='CASCADE',
+	SET_NULL='SET NULL',
+	SET_DEFAULT='SET DEFAULT'
+)
+
+table_blank = dict(tname=None, columns=[], primary_keys=[], foreign_keys=[], indexes=[])
+column_blank = dict(cname=None, ctype=Types.str, notnull=False, unique=False, autoincrement=False, default=None)
+fkey_blank = dict(cname=None, refTable=None, refColumn=None, on_delete=None, on_update=None)
+index_blank = dict(iname=None, columns=[], unique=False)
+
+
+def dict_factory(cursor, row):
+	return {col[0]: row[idx] for idx, col in enumerate(cursor.description)}
+
+
+class Adapter:
+	"""
+	SQLite adapter with the same interface as the MySQL one.
+	All the blocking sqlite3 calls are sent to a single dedicated thread,
+	which also owns the connection, so the event loop never waits on disk io.
+	"""
+	types = Types
+	errors = Errors
+
+	def __init__(self, db_address, loop):
+		self.dbAddress = db_address
+		self.loop = loop
+		if not len(db_address):
+			raise(ValueError('Bad database address string: ' + self.dbAddress))
+
+		self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+		# the connection is shared, so queries must wait while a transaction is open
+		self.lock = Lock()
+		try:
+			self.conn = self.executor.submit(self._connect).result()
+		except sqlite3.Error as e:
+			self.wrap_exc(e)
+
+	def _connect(self):
+		conn = sqlite3.connect(self.dbAddress, isolation_level=None, check_same_thread=False)
+		conn.row_factory = dict_factory
+		conn.execute("PRAGMA journal_mode=WAL")
+		conn.execute("PRAGMA synchronous=NORMAL")
+		return conn
+
+	@staticmethod
+	def _sql(request):
+		""" Convert MySQL-style placeholders to the sqlite ones """
+		return request.replace("%s", "?")
+
+	def _execute(self, request, args=()):
+		cur = self.conn.execute(self._sql(request), args or ())
+		return cur.lastrowid
+
+	def _executemany(self, request, args):
+		self.conn.executemany(self._sql(request), args)
+
+	def _fetchone(self, request, args=()):
+		return self.conn.execute(self._sql(request), args or ()).fetchone()
+
+	def _fetchall(self, request, args=()):
+		return self.conn.execute(self._sql(request), args or ()).fetchall()
+
+	def _cursor(self, request, args=()):
+		return self.conn.execute(self._sql(request), args or ())
+
+	async def _run(self, func, *args):
+		async with self.lock:
+			try:
+				return await self.loop.run_in_executor(self.executor, func, *args)
+			except sqlite3.Error as e:
+				self.wrap_exc(e)
+
+	async def execute(self, *args):
+		return await self._run(self._execute, *args)
+
+	async def executemany(self, request, args):
+		# materialize generators here, they must not be consumed from the db thread
+		await self._run(self._executemany, request, list(args))
+
+	async def fetchone(self, *args):
+		return await self._run(self._fetchone, *args)
+
+	async def fetchall(self, *args):
+		return await self._run(self._fetchall, *args)
+
+	async def stream(self, request, args=(), size=1000):
+		"""
+		Yield the result rows in lists of up to size rows.
+		Each chunk is a separate trip to the db thread, so other queries can run between the chunks.
+		"""
+		cur = await self._run(self._cursor, request, args)
+		try:
+			while len(rows := await self._run(cur.fetchmany, size)):
+				yield rows
+		finally:
+			await self.loop.run_in_executor(self.executor, cur.close)
+
+	@staticmethod
+	def _sqlite_column(kwargs):
+		# sqlite only allows AUTOINCREMENT on an INTEGER PRIMARY KEY column
+		if kwargs['autoincrement']:
+			return "`{cname}` INTEGER PRIMARY KEY AUTOINCREMENT".format(cname=kwargs['cname'])
+
+		return "`{cname}` {ctype}{notnull}{unique}{default}".format(
+			cname=kwargs['cname'],
+			ctype=kwargs['ctype'],
+			notnull=" NOT NULL" if kwargs['notnull'] else "",
+			unique=" UNIQUE" if kwargs['unique'] else "",
+			default=" DEFAULT '{}'".format(kwargs['default']) if kwargs['default'] is not None else ""
+		)
+
+	@staticmethod
+	def _sqlite_references(kwargs):
+		return "REFERENCES {refTable}({refColumn}){on_delete}{on_update}".format(
+			refTable=kwargs['refTable'],
+			refColumn=kwargs['refColumn'],
+			on_delete=" ON DELETE " + reference_options[kwargs['on_delete']] if kwargs['on_delete'] else '',
+			on_update=" ON UPDATE " + reference_options[kwargs['on_update']] if kwargs['on_update'] else ''
+		)
+
+	@staticmethod
+	def _sqlite_insert(columns, table, on_dublicate):
+		return "{action} INTO {table} ({columns}) VALUES({values})".format(
+			action="INSERT OR REPLACE" if on_dublicate == 'replace' else (
+				"INSERT OR IGNORE" if on_dublicate == 'ignore' else "INSERT"
+			),
+			table=table,
+			columns=", ".join((f"`{i}`" for i in columns)),
+			values=", ".join(('%s' for i in range(len(columns))))
+		)
+
+	@staticmethod
+	def _sqlite_update(table, columns, keys):
+		where = " WHERE {}".format(" AND ".join(["`{}`=%s".format(i) for i in keys])) if len(keys) else ""
+		return "UPDATE {table} SET {columns}{where}".format(
+			table=table,
+			columns=",".join(["`{}`=%s".format(i) for i in columns]),
+			where=where
+		)
+
+	async def create_table(self, table):
+		table = {**table_blank, **table}
+
+		columns = [{**column_blank, **col} for col in table['columns']]
+		# the autoincrement column is the primary key itself, see _sqlite_column()
+		if any((col['autoincrement'] for col in columns)):
+			pkeys = ''
+		else:
+			pkeys = ", PRIMARY KEY(" + ", ".join(table['primary_keys']) + ')' if len(table['primary_keys']) else ''
+		fkeys = [
+			"FOREIGN KEY ({cname}) ".format(cname=fkey['cname']) + self._sqlite_references({**fkey_blank, **fkey})
+			for fkey in table['foreign_keys']
+		]
+
+		request = "CREATE TABLE {tname} ({tdeskr})".format(
+			tname=table['tname'],
+			tdeskr=", ".join(([self._sqlite_column(col) for col in columns] + fkeys)) + pkeys
+		)
+
+		await self.execute(request)
+		for index in table['indexes']:
+			await self.create_index(table['tname'], index)
+
+	async def create_index(self, tname, index):
+		index = {**index_blank, **index}
+		await self.execute("CREATE {unique}INDEX `{iname}` ON `{tname}` ({columns})".format(
+			unique="UNIQUE " if index['unique'] else "",
+			iname=index_name(tname, index),
+			tname=tname,
+			columns=", ".join((f"`{i}`" for i in index['columns']))
+		))
+
+	async def _ensure_indexes(self, table):
+		""" Create the missing indexes and recreate the ones which columns differ, undeclared indexes are kept """
+		existing = dict()  # {index_name: ([columns], unique)}
+		for row in await self.fetchall("PRAGMA index_list(`{}`)".format(table['tname'])):
+			columns = await self.fetchall("PRAGMA index_info(`{}`)".format(row['name']))
+			existing[row['name']] = ([i['name'] for i in sorted(columns, key=lambda i: i['seqno'])], bool(row['unique']))
+
+		for index in table['indexes']:
+			index = {**index_blank, **index}
+			iname = index_name(table['tname'], index)
+			if iname in existing.keys():
+				if existing[iname] == (list(index['columns']), bool(index['unique'])):
+					continue
+				await self.execute("DROP INDEX `{}`".format(iname))
+			await self.create_index(table['tname'], index)
+
+	def ensure_table(self, table):
+		""" Create the table or add the missing columns and indexes, return the names of the added columns """
+		return self.loop.run_until_complete(self._ensure_table(table))
+
+	async def _ensure_table(self, table):
+		table = {**table_blank, **table}
+		columns = await self.fetchall("PRAGMA table_info(`{}`)".format(table['tname']))
+		columns = {i['name']: i['type'].lower() for i in columns}
+
+		# Create table if not exist
+		if not len(columns):
+			await self.create_table(table)
+			return []
+
+		# Create columns if not exist
+		added = []
+		for col in table['columns']:
+			col = {**column_blank, **col}
+			if col['cname'] not in columns.keys():
+				added.append(col['cname'])
+				column_sql = self._sqlite_column(col)
+				# sqlite can not add a foreign key to an existing table, only a column with a reference
+				for fkey in (fkey for fkey in table['foreign_keys'] if fkey['cname'] == col['cname']):
+					column_sql += " " + self._sqlite_references({**fkey_blank, **fkey})
+				await self.execute("ALTER TABLE {tname} ADD COLUMN {column_sql}".format(
+					tname=table['tname'],
+					column_sql=column_sql
+				))
+			elif not col['autoincrement'] and not col['ctype'].lower().startswith(columns[col['cname']].split('(')[0]):
+				raise(TypeError(
+					"Column '{}' types are mismatching, {} and {}".format(col['cname'], col['ctype'], columns[col['cname']])
+				))
+
+		await self._ensure_indexes(table)
+		return added
+
+	async def select(
+		self, columns, table, where=None, order_by=None, order_asc=False, limit=None, one=False, after=None
+	):
+		""" See build_where() for the conditions syntax and build_select() for ordering and keyset pagination """
+		# keep the same quoting of the restricted words as the MySQL adapter does
+		sql_restricted_words = [
+				'rank',
+				'role',
+		]
+		columns = [f"`{col}`" if col in sql_restricted_words else col for col in columns]
+
+		request, args = build_select(columns, table, where, order_by, order_asc, limit, after)
+		if one:
+			return await self.fetchone(request, args)
+		else:
+			return await self.fetchall(request, args)
+
+	async def select_one(self, *args, **kwargs):
+		return await self.select(*args, **kwargs, one=True)
+
+	async def delete(self, table, where=None):
+		conditions, args = build_where(where)
+		await self.execute("DELETE FROM {}{}".format(table, conditions), args)
+
+	async def insert(self, table, d, on_dublicate=None):
+		request = self._sqlite_insert(d.keys(), table, on_dublicate)
+		return await self.execute(request, list(d.values()))
+
+	async def update(self, table, d, keys=None):
+		keys = keys or {}
+		request = self._sqlite_update(table, d.keys(), keys.keys())
+		await self.execute(request, list(d.values()) + list(keys.values()))
+
+	async def insert_many(self, table, it, on_dublicate=None):
+		try:
+			first, it = peek(iter(it))
+		except StopIteration:
+			return
+
+		request = self._sqlite_insert(first.keys(), table, on_dublicate)
+		await self.executemany(request, (list(d.values()) for d in it))
+
+	async def update_many(self, table, it, keys):
+		""" Update rows found by the keys columns, every dict must contain the keys values as well """
+		try:
+			first, it = peek(iter(it))
+		except StopIteration:
+			return
+
+		columns = [k for k in first.keys() if k not in keys]
+		request = self._sqlite_update(table, columns, keys)
+		await self.executemany(request, ([d[c] for c in columns] + [d[k] for k in keys] for d in it))
+
+	async def add_many(self, table, it, keys):
+		""" Insert the rows, or add their values to the existing rows with the same keys columns """
+		try:
+			first, it = peek(iter(it))
+		except StopIteration:
+			return
+
+		columns = list(first.keys())
+		request = self._sqlite_insert(columns, table, None) + " ON CONFLICT ({keys}) DO UPDATE SET {values}".format(
+			keys=", ".join((f"`{k}`" for k in keys)),
+			values=", ".join(("`{0}`=`{0}`+excluded.`{0}`".format(c) for c in columns if c not in keys))
+		)
+		await self.executemany(request, ([d[c] for c in columns] for d in it))
+
+	async def increment(self, table, column, step=1, where=None):
+		""" Atomically add step to the column and return the new value """
+		conditions, args = build_where(where)
+		async with self.transaction() as tx:
+			await tx.execute(
+				"UPDATE {table} SET `{column}` = `{column}` + %s{where}".format(table=table, column=column, where=conditions),
+				[step] + args
+			)
+			row = await tx.fetchone("SELECT `{column}` FROM {table}{where}".format(
+				table=table, column=column, where=conditions
+			), args)
+		return row[column] if row else None
+
+	@asynccontextmanager
+	async def transaction(self):
+		""" Run all queries inside the block in a single transaction and commit them at once """
+		async with self.lock:
+			tx = Transaction(self)
+			await tx.execute("BEGIN IMMEDIATE")
+			try:
+				yield tx
+			except BaseException:
+				await tx.execute("ROLLBACK")
+				raise
+			await tx.execute("COMMIT")
+
+	async def close(self):
+		await self._run(self.conn.close)
+		self.executor.shutdown(wait=True)
+
+	@staticmethod
+	def wrap_exc(e):
+		if e.__class__ in [sqlite3.InternalError, sqlite3.OperationalError]:
+			raise OperationalError() from e
+
+		elif e.__class__ == sqlite3.DataError:
+			raise DataError() from e
+
+		elif e.__class__ == sqlite3.IntegrityError:
+			raise IntegrityError() from e
+
+		elif e.__class__ == sqlite3.ProgrammingError:
+			raise ProgrammingError() from e
+
+		else:
+			raise DatabaseError() from e
+
+
+class Transaction(Adapter):
+	""" Adapter that runs queries while the parent adapter lock is held by the transaction """
+
+	def __init__(self, adapter):
+		self.dbAddress = adapter.dbAddress
+		self.loop = adapter.loop
+		self.executor = adapter.executor
+		self.conn = adapter.conn
+
+	async def _run(self, func, *args):
+		try:
+			return await self.loop.run_in_executor(self.executor, func, *args)
+		except sqlite3.Error as e:
+			self.wrap_exc(e)
+
+	@asynccontextmanager
+	async def transaction(self):
+		""" Nested blocks are just a part of the outer transaction """
+		yield self
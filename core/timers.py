@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from heapq import heappush, heappop, heapify
+from itertools import count
+
+
+class DeadlineHeap:
+	"""
+	Priority queue of deadlines with a unique key per entry.
+	Setting an existing key or removing one only invalidates its old heap entry,
+	the stale entries are skipped when they reach the top (lazy deletion),
+	so set/remove are O(log n) and peeking the next deadline is amortized O(1).
+	"""
+
+	def __init__(self):
+		self._heap = []  # [at, seq, key, value]
+		self._entries = dict()  # {key: entry}
+		self._seq = count()  # preserves insertion order for equal deadlines
+
+	def __len__(self):
+		return len(self._entries)
+
+	def __contains__(self, key):
+		return key in self._entries
+
+	def __iter__(self):
+		return iter(self._entries.keys())
+
+	def get(self, key, default=None):
+		""" Return (at, value) of the key """
+		if (entry := self._entries.get(key)) is None:
+			return default
+		return entry[0], entry[3]
+
+	def items(self):
+		""" Iterate over (key, at, value) in no particular order """
+		return ((entry[2], entry[0], entry[3]) for entry in self._entries.values())
+
+	def set(self, key, at, value=None):
+		""" Add or move the deadline of the key, return True if it became the earliest one """
+		if (old := self._entries.pop(key, None)) is not None:
+			old[2] = old[3] = None  # mark stale
+		entry = [at, next(self._seq), key, value]
+		self._entries[key] = entry
+		heappush(self._heap, entry)
+		self._compact()
+		return self._heap[0] is entry
+
+	def remove(self, key):
+		""" Remove the key if present, return its (at, value) """
+		if (entry := self._entries.pop(key, None)) is None:
+			return None
+		result = entry[0], entry[3]
+		entry[2] = entry[3] = None
+		self._compact()
+		return result
+
+	def clear(self):
+		self._heap.clear()
+		self._entries.clear()
+
+	def _clean_top(self):
+		while self._heap and self._heap[0][2] is None:
+			heappop(self._heap)
+
+	def _compact(self):
+		# keep the stale entries from piling up when keys are moved a lot without reaching the top
+		if len(self._heap) > 64 and len(self._heap) > 2 * len(self._entries):
+			self._heap = [entry for entry in self._heap if entry[2] is not None]
+			heapify(self._heap)
+
+	def peek(self):
+		""" Return (at, key, value) of the earliest deadline or None """
+		self._clean_top()
+		if not self._heap:
+			return None
+		at, _, key, value = self._heap[0]
+		return at, key, value
+
+	def pop(self):
+		""" Remove and return (at, key, value) of the earliest deadline or None """
+		self._clean_top()
+		if not self._heap:
+			return None
+		at, _, key, value = heappop(self._heap)
+		self._entries.pop(key)
+		return at, key, value
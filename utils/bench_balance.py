@@ -0,0 +1,52 @@
+"""
+Benchmark the team balancer used by the matchmaking pick_teams mode.
+Prints the rating difference and the wall time for various players counts.
+The splits are verified against a bruteforce search on the small sizes, the big ones are heuristic.
+
+Usage: python utils/bench_balance.py
+"""
+import os
+import random
+import time
+from importlib.machinery import SourceFileLoader
+from itertools import combinations
+
+# load the module directly, importing the bot package requires a configured environment
+balance = SourceFileLoader(
+	"balance", os.path.join(os.path.dirname(__file__), "..", "bot", "match", "balance.py")
+).load_module()
+
+SIZES = [4, 6, 8, 10, 12, 16, 20, 24, 26, 32, 48, 64, 100, 150, 200]
+ROUNDS = 20
+BRUTEFORCE_LIMIT = 16  # verify the exact solver against itertools.combinations up to this size
+SEED = 1
+
+
+def bruteforce(values, team_len):
+	total = sum(values)
+	return min(abs(2 * sum(values[i] for i in team) - total) for team in combinations(range(len(values)), team_len))
+
+
+def main():
+	rnd = random.Random(SEED)
+	print("{:>7} {:>10} {:>10} {:>12}".format("players", "avg diff", "max diff", "avg time ms"))
+	for size in SIZES:
+		diffs, elapsed = [], 0
+		for i in range(ROUNDS):
+			values = [int(rnd.gauss(1500, 300)) for n in range(size)]
+			at = time.perf_counter()
+			team, diff = balance.balance(values, size // 2)
+			elapsed += time.perf_counter() - at
+
+			assert len(team) == size // 2 and len(set(team)) == len(team)
+			if size <= BRUTEFORCE_LIMIT:
+				assert diff == bruteforce(values, size // 2), "exact solver is not optimal"
+			diffs.append(diff)
+
+		print("{:>7} {:>10.1f} {:>10} {:>12.2f}".format(
+			size, sum(diffs) / ROUNDS, max(diffs), elapsed / ROUNDS * 1000
+		))
+
+
+if __name__ == "__main__":
+	main()
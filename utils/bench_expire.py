@@ -0,0 +1,90 @@
+"""
+Micro-benchmark of the expire timer storage with lots of pending expiries.
+Compares the old approach (sort all tasks on every set/cancel) with core.timers.DeadlineHeap.
+
+Usage: python utils/bench_expire.py [pending]
+"""
+import os
+import sys
+import random
+import time
+from importlib.machinery import SourceFileLoader
+
+# load the module directly, importing the core package requires a configured environment
+timers = SourceFileLoader(
+	"timers", os.path.join(os.path.dirname(__file__), "..", "core", "timers.py")
+).load_module()
+
+PENDING = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+SORTED_OPS = 50  # the sorting approach is too slow to run as many operations
+SEED = 1
+
+
+class SortedTimer:
+	""" The previous ExpireTimer storage """
+
+	def __init__(self):
+		self.tasks = dict()
+		self.next = None
+
+	def _define_next(self):
+		if len(self.tasks):
+			self.next = sorted(self.tasks.items(), key=lambda task: task[1])[0]
+		else:
+			self.next = None
+
+	def set(self, key, at):
+		self.tasks[key] = at
+		self._define_next()
+
+	def cancel(self, key):
+		if key in self.tasks.keys():
+			self.tasks.pop(key)
+			if self.next and self.next[0] == key:
+				self._define_next()
+
+
+def per_op(func, ops):
+	at = time.perf_counter()
+	for op in ops:
+		func(*op)
+	return (time.perf_counter() - at) / len(ops) * 1000000
+
+
+def main():
+	rnd = random.Random(SEED)
+	now = int(time.time())
+	keys = [f"{rnd.randrange(10**6)}_{i}" for i in range(PENDING)]
+	deadlines = [now + rnd.randrange(60, 60*60*12) for i in range(PENDING)]
+	ops = [(rnd.choice(keys), now + rnd.randrange(60, 60*60*12)) for i in range(PENDING)]
+
+	old = SortedTimer()
+	old.tasks = dict(zip(keys, deadlines))
+	old._define_next()
+
+	heap = timers.DeadlineHeap()
+	at = time.perf_counter()
+	for key, deadline in zip(keys, deadlines):
+		heap.set(key, deadline)
+	fill = time.perf_counter() - at
+
+	print(f"{PENDING} pending expiries, heap filled in {fill*1000:.1f} ms")
+	print("{:>12} {:>14} {:>14}".format("operation", "sort us/op", "heap us/op"))
+	print("{:>12} {:>14.2f} {:>14.2f}".format(
+		"set", per_op(old.set, ops[:SORTED_OPS]), per_op(heap.set, ops)
+	))
+	print("{:>12} {:>14.2f} {:>14.2f}".format(
+		"peek", per_op(lambda: old.next, [()] * PENDING), per_op(heap.peek, [()] * PENDING)
+	))
+
+	# cancel the earliest ones, the worst case of the sorting approach
+	old_earliest = [(key, ) for key, at in sorted(old.tasks.items(), key=lambda task: task[1])]
+	earliest = [(key, ) for at, key in sorted((at, key) for key, at, value in heap.items())]
+	print("{:>12} {:>14.2f} {:>14.2f}".format(
+		"cancel", per_op(old.cancel, old_earliest[:SORTED_OPS]), per_op(heap.remove, earliest)
+	))
+	print(f"heap size after cancelling all: {len(heap)} keys, {len(heap._heap)} entries")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,69 @@
+"""
+Verify the closed-form two-team TrueSkill update against the trueskill library and compare their speed.
+Prints the largest mu and sigma differences and the average update time for various team sizes.
+
+Usage: python utils/bench_trueskill.py (requires numpy and trueskill)
+"""
+import os
+import random
+import time
+from importlib.machinery import SourceFileLoader
+
+import trueskill
+
+# load the module directly, importing the bot package requires a configured environment
+two_team_trueskill = SourceFileLoader(
+	"two_team_trueskill", os.path.join(os.path.dirname(__file__), "..", "bot", "stats", "two_team_trueskill.py")
+).load_module()
+
+SIZES = [1, 2, 3, 4, 5, 6, 8, 12]
+ROUNDS = 500
+TOLERANCE = 1e-3  # the library approximates erfc, ratings are rounded to integers anyway
+SEED = 1
+# the same environment TrueSkillRating creates with the default queue settings
+INIT_RP, INIT_DEVIATION = 1500, 300
+
+
+def main():
+	rnd = random.Random(SEED)
+	env = trueskill.TrueSkill(mu=INIT_RP, sigma=INIT_DEVIATION, beta=int(INIT_DEVIATION/2), tau=int(INIT_DEVIATION/100))
+	print("{:>5} {:>12} {:>12} {:>10} {:>10} {:>8}".format(
+		"team", "max d mu", "max d sigma", "lib us", "fast us", "fallback"
+	))
+	for size in SIZES:
+		d_mu, d_sigma, lib_time, fast_time, fallback = 0, 0, 0, 0, 0
+		for i in range(ROUNDS):
+			teams = [
+				[(rnd.gauss(INIT_RP, 400), rnd.uniform(30, INIT_DEVIATION)) for n in range(size)]
+				for t in range(2)
+			]
+			draw = rnd.random() < 0.2
+
+			at = time.perf_counter()
+			expected = env.rate(
+				[[env.create_rating(mu, sigma) for mu, sigma in team] for team in teams], ranks=[0, 0] if draw else [0, 1]
+			)
+			lib_time += time.perf_counter() - at
+
+			at = time.perf_counter()
+			try:
+				result = two_team_trueskill.rate(
+					*teams, beta=env.beta, tau=env.tau, draw_probability=env.draw_probability, draw=draw
+				)
+			except FloatingPointError:
+				fallback += 1
+				continue
+			fast_time += time.perf_counter() - at
+
+			for (mu, sigma), team in zip(result, expected):
+				d_mu = max(d_mu, *(abs(m - r.mu) for m, r in zip(mu, team)))
+				d_sigma = max(d_sigma, *(abs(s - r.sigma) for s, r in zip(sigma, team)))
+
+		print("{:>5} {:>12.2e} {:>12.2e} {:>10.1f} {:>10.1f} {:>8}".format(
+			size, d_mu, d_sigma, lib_time / ROUNDS * 1e6, fast_time / max(1, ROUNDS - fallback) * 1e6, fallback
+		))
+		assert d_mu < TOLERANCE and d_sigma < TOLERANCE, "closed-form update differs from the library"
+
+
+if __name__ == '__main__':
+	main()